@@ -0,0 +1,101 @@
+"""
+Shared bulk writer for the high-volume loaders (Financial, StockPrice).
+
+``bulk_upsert`` takes plain row tuples rather than model instances:
+
+- PostgreSQL: rows are streamed with psycopg COPY into a temporary staging table,
+  then merged with one ``INSERT ... SELECT ... ON CONFLICT`` statement (its test
+  only runs when the suite is pointed at PostgreSQL).
+- SQLite (and anything else that speaks ``ON CONFLICT``): batched ``executemany``
+  of ``INSERT ... ON CONFLICT`` inside a single transaction.
+
+Conflicting rows are skipped, or with ``update_fields`` overwritten, which mirrors
+``bulk_create(ignore_conflicts=True)`` / ``bulk_create(update_conflicts=True)``.
+``auto_now`` / ``auto_now_add`` columns not passed in are filled with the current
+time. See scripts/benchmark_bulk_write.py for rows/sec against ``bulk_create``.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+EXECUTEMANY_BATCH = 2000
+
+
+def _columns(model, fields):
+    """Model fields for ``fields`` (names or attnames like ``company_id``), plus unlisted auto timestamps."""
+    opts = model._meta
+    resolved = [opts.get_field(f) for f in fields]
+    auto = [
+        f for f in opts.concrete_fields
+        if (getattr(f, "auto_now", False) or getattr(f, "auto_now_add", False)) and f not in resolved
+    ]
+    return resolved, auto
+
+
+def _conflict_clause(unique_columns, update_columns, table):
+    target = ", ".join(unique_columns)
+    if not update_columns:
+        return f"ON CONFLICT ({target}) DO NOTHING"
+    sets = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+    # Null-safe inequality; SQLite only accepts IS DISTINCT FROM from 3.39.
+    distinct = "IS NOT" if connection.vendor == "sqlite" else "IS DISTINCT FROM"
+    changed = " OR ".join(f"{table}.{c} {distinct} EXCLUDED.{c}" for c in update_columns)
+    return f"ON CONFLICT ({target}) DO UPDATE SET {sets} WHERE {changed}"
+
+
+def bulk_upsert(model, fields, rows, unique_fields, update_fields=None):
+    """
+    Insert ``rows`` (tuples ordered like ``fields``) into ``model``'s table.
+
+    On a conflict over ``unique_fields`` the existing row is kept, or, if
+    ``update_fields`` is given, those columns are overwritten when they differ.
+    Returns the number of rows inserted or updated.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    resolved, auto = _columns(model, fields)
+    columns = [f.column for f in resolved + auto]
+    if auto:
+        now = timezone.now()
+        rows = [(*row, *([now] * len(auto))) for row in rows]
+
+    opts = model._meta
+    quote = connection.ops.quote_name
+    table = quote(opts.db_table)
+    unique_columns = [quote(opts.get_field(f).column) for f in unique_fields]
+    update_columns = [quote(opts.get_field(f).column) for f in (update_fields or ())]
+    column_list = ", ".join(quote(c) for c in columns)
+    conflict = _conflict_clause(unique_columns, update_columns, table)
+
+    if connection.vendor == "postgresql":
+        return _copy_merge(table, column_list, rows, conflict)
+
+    # executemany needs values in the backend's representation (dates as text on SQLite, etc.)
+    fields_all = resolved + auto
+    prepped = [
+        tuple(f.get_db_prep_save(v, connection) for f, v in zip(fields_all, row))
+        for row in rows
+    ]
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO {table} ({column_list}) VALUES ({placeholders}) {conflict}"
+    written = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(prepped), EXECUTEMANY_BATCH):
+            cursor.executemany(sql, prepped[start:start + EXECUTEMANY_BATCH])
+            written += max(cursor.rowcount, 0)
+    return written
+
+
+def _copy_merge(table, column_list, rows, conflict):
+    stage = "bulk_upsert_stage"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+        cursor.execute(
+            f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {column_list} FROM {table} WITH NO DATA"
+        )
+        # Django's CursorWrapper -> the underlying psycopg cursor, for the COPY protocol.
+        with cursor.cursor.copy(f"COPY {stage} ({column_list}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+        cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {stage} {conflict}")
+        return cursor.rowcount
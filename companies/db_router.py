@@ -0,0 +1,116 @@
+"""
+Optional read replica.
+
+With ``REPLICA_DATABASE_URL`` set, settings add a ``replica`` database. Views wrapped
+in ``read_replica`` (company page, search, sitemap, screener, discussion lists) send
+their ORM reads, and the screener's raw SQL, to it; everything else, and every
+write, uses ``default``.
+
+Read-after-write is kept on the primary in two ways:
+
+- a write inside a replica view pins the rest of that request to ``default``;
+- ``PrimaryPinMiddleware`` sets a short-lived cookie after any request that wrote
+  (posting a message, logging in, following), so the same browser's next reads
+  don't race replication lag.
+
+Without a replica configured the router is a no-op.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+DEFAULT = "default"
+REPLICA = "replica"
+PIN_COOKIE = "db_primary"
+
+
+class _RequestState:
+    __slots__ = ("replica", "wrote")
+
+    def __init__(self, replica=False):
+        self.replica = replica
+        self.wrote = False
+
+
+_state = ContextVar("db_route_state", default=None)
+
+
+def replica_configured():
+    # A test mirror (or a misconfigured URL) names the primary's own database: nothing to route.
+    return (
+        REPLICA in settings.DATABASES
+        and connections[REPLICA].settings_dict["NAME"] != connections[DEFAULT].settings_dict["NAME"]
+    )
+
+
+def read_alias():
+    """Database alias reads should use right now."""
+    state = _state.get()
+    if state is not None and state.replica and replica_configured():
+        return REPLICA
+    return DEFAULT
+
+
+def read_connection():
+    """Connection for raw read-only SQL (``connection`` is always the primary)."""
+    return connections[read_alias()]
+
+
+def read_replica(view):
+    """Route a read-only view's queries to the replica, unless the client is pinned to the primary."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        outer = _state.get()
+        state = _RequestState(replica=PIN_COOKIE not in request.COOKIES)
+        token = _state.set(state)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.reset(token)
+            if outer is not None and state.wrote:
+                outer.wrote = True
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        return alias if alias == REPLICA else None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.replica = False
+            state.wrote = True
+        return DEFAULT
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication.
+        return db != REPLICA
+
+
+class PrimaryPinMiddleware:
+    """After a request that wrote, keep the client's reads on the primary for REPLICA_PIN_SECONDS."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _RequestState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and replica_configured() and settings.REPLICA_PIN_SECONDS:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
@@ -0,0 +1,379 @@
+"""
+Storage backends for statement values.
+
+``settings.FINANCIAL_STORAGE`` selects where ingest writes and the statement and
+snapshot builders read:
+
+- "rows":   one ``Financial`` row per (company, period, statement, metric).
+- "packed": one ``PackedFinancial`` record per (company, statement) holding a
+            metric x period int64 matrix plus its metric-id and period index
+            arrays. This drops the per-row overhead, ``created_at`` and the
+            four-column unique index, which dominate the rows layout.
+
+Callers go through ``financial_rows`` / ``store_financials`` / ``upsert_financials`` /
+``has_financials`` and see the same ``(company_id, statement, metric_id, period_end_date, value)``
+rows either way. ``manage.py pack_financials`` converts existing rows and reports
+the size of both layouts. The SQL screener can't read packed values, so in packed
+mode it is limited to ``CompanyMetricSnapshot`` (``SQLValidator.allowed_tables``).
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.db.models.functions import Length
+
+from companies.bulk_write import bulk_upsert
+from companies.models import Financial, PackedFinancial
+
+# Empty matrix cell. Ingest rejects values this large (MAX_ABS_VALUE), so it can't collide.
+MISSING = np.iinfo(np.int64).min
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+# Column order of the row tuples handed to bulk_upsert
+ROW_FIELDS = ["company_id", "period_end_date", "statement", "metric_id", "value"]
+UNIQUE_FIELDS = ["company", "period_end_date", "statement", "metric"]
+
+
+def packed_storage():
+    return settings.FINANCIAL_STORAGE == "packed"
+
+
+def pack(cells):
+    """Encode [(metric_id, period_end_date, value), ...] as PackedFinancial field values."""
+    if not cells:
+        return {"metric_ids": b"", "periods": b"", "values": b""}
+    metrics, dates, values = zip(*cells)
+    metric_ids, rows = np.unique(np.array(metrics, dtype=np.int32), return_inverse=True)
+    periods, cols = np.unique(np.array(dates, dtype="datetime64[D]"), return_inverse=True)
+    matrix = np.full((len(metric_ids), len(periods)), MISSING, dtype=np.int64)
+    matrix[rows, cols] = values
+    return {
+        "metric_ids": metric_ids.tobytes(),
+        "periods": (periods - _EPOCH).astype(np.int32).tobytes(),
+        "values": matrix.tobytes(),
+    }
+
+
+def unpack(metric_ids, periods, values, only_metrics=None):
+    """Decode packed fields back into [(metric_id, period_end_date, value), ...]."""
+    metric_ids = np.frombuffer(metric_ids, dtype=np.int32)
+    periods = np.frombuffer(periods, dtype=np.int32)
+    matrix = np.frombuffer(values, dtype=np.int64).reshape(len(metric_ids), len(periods))
+    present = matrix != MISSING
+    if only_metrics is not None:
+        present &= np.isin(metric_ids, list(only_metrics))[:, None]
+    rows, cols = np.nonzero(present)
+    dates = (_EPOCH + periods.astype("timedelta64[D]"))[cols].tolist()
+    return list(zip(metric_ids[rows].tolist(), dates, matrix[rows, cols].tolist()))
+
+
+def financial_rows(company_ids, metric_ids=None):
+    """(company_id, statement, metric_id, period_end_date, value) for the given companies, from either layout."""
+    if not packed_storage():
+        qs = Financial.objects.filter(company_id__in=company_ids)
+        if metric_ids is not None:
+            qs = qs.filter(metric_id__in=metric_ids)
+        return list(qs.values_list("company_id", "statement", "metric_id", "period_end_date", "value"))
+
+    out = []
+    records = PackedFinancial.objects.filter(company_id__in=company_ids).values_list(
+        "company_id", "statement", "metric_ids", "periods", "values"
+    )
+    for company_id, statement, *fields in records:
+        out.extend((company_id, statement, *cell) for cell in unpack(*fields, only_metrics=metric_ids))
+    return out
+
+
+def has_financials(company):
+    if packed_storage():
+        return company.packed_financials.exists()
+    return company.financials.exists()
+
+
+def _merge_packed(company_ids, cells):
+    """
+    Add {(company_id, statement): [(metric_id, date, value), ...]} to the packed store.
+    Cells already stored win, matching ``bulk_create(ignore_conflicts=True)`` on rows.
+    """
+    existing = PackedFinancial.objects.filter(company_id__in=company_ids).values_list(
+        "company_id", "statement", "metric_ids", "periods", "values"
+    )
+    merged = defaultdict(dict)
+    for key, new in cells.items():
+        merged[key].update(((m, d), v) for m, d, v in new)
+    for company_id, statement, *fields in existing:
+        if (company_id, statement) in merged:
+            merged[company_id, statement].update(((m, d), v) for m, d, v in unpack(*fields))
+
+    with transaction.atomic():
+        for (company_id, statement), values in merged.items():
+            PackedFinancial.objects.update_or_create(
+                company_id=company_id,
+                statement=statement,
+                defaults=pack([(m, d, v) for (m, d), v in values.items()]),
+            )
+
+
+def store_financials(entries):
+    """Persist unsaved Financial instances to the configured layout, keeping values already stored."""
+    if not packed_storage():
+        bulk_upsert(
+            Financial, ROW_FIELDS,
+            ((e.company_id, e.period_end_date, e.statement, e.metric_id, int(e.value)) for e in entries),
+            unique_fields=UNIQUE_FIELDS,
+        )
+        return
+    cells = defaultdict(list)
+    for e in entries:
+        cells[e.company_id, e.statement].append((e.metric_id, e.period_end_date, int(e.value)))
+    _merge_packed({c for c, _ in cells}, cells)
+
+
+def _dedupe(entries):
+    """{(statement, metric_id, period_end_date): value}; the first entry for a cell wins, as with ignore_conflicts."""
+    cells = {}
+    for e in entries:
+        cells.setdefault((e.statement, e.metric_id, e.period_end_date), int(e.value))
+    return cells
+
+
+def _diff(existing, incoming, delete_missing):
+    """
+    Compare {(statement, metric_id, date): value} maps. Returns (changed cells, counts, stale keys)
+    where stale keys are the stored cells of metrics missing from the incoming statements.
+    """
+    changed = {k: v for k, v in incoming.items() if existing.get(k) != v}
+    inserted = sum(1 for k in changed if k not in existing)
+    stale = []
+    if delete_missing:
+        sent = {(st, m) for st, m, _ in incoming}
+        statements = {st for st, _ in sent}
+        stale = [k for k in existing if k[0] in statements and k[:2] not in sent]
+    counts = {
+        "inserted": inserted,
+        "updated": len(changed) - inserted,
+        "unchanged": len(incoming) - len(changed),
+        "deleted": len(stale),
+    }
+    return changed, counts, stale
+
+
+def upsert_financials(company, entries, delete_missing=False, dry_run=False):
+    """
+    Write only the cells of unsaved Financial ``entries`` that differ from what's stored
+    for ``company``: new cells are inserted and restated values updated in place. With
+    ``delete_missing``, metrics no longer present in a statement being written are removed.
+    Returns {"inserted", "updated", "unchanged", "deleted"} cell counts.
+    """
+    incoming = _dedupe(entries)
+    if packed_storage():
+        return _upsert_packed(company, incoming, delete_missing, dry_run)
+
+    existing = {
+        (st, m, d): v
+        for st, m, d, v in Financial.objects.filter(company=company).values_list(
+            "statement", "metric_id", "period_end_date", "value"
+        )
+    }
+    changed, counts, stale = _diff(existing, incoming, delete_missing)
+    if dry_run:
+        return counts
+
+    with transaction.atomic():
+        bulk_upsert(
+            Financial, ROW_FIELDS,
+            ((company.pk, d, st, m, v) for (st, m, d), v in changed.items()),
+            unique_fields=UNIQUE_FIELDS,
+            update_fields=["value"],
+        )
+        stale_metrics = defaultdict(set)
+        for st, m, _ in stale:
+            stale_metrics[st].add(m)
+        for st, metric_ids in stale_metrics.items():
+            Financial.objects.filter(company=company, statement=st, metric_id__in=metric_ids).delete()
+    return counts
+
+
+def _upsert_packed(company, incoming, delete_missing, dry_run):
+    existing = {
+        (statement, m, d): v
+        for statement, *fields in company.packed_financials.values_list("statement", "metric_ids", "periods", "values")
+        for m, d, v in unpack(*fields)
+    }
+    changed, counts, stale = _diff(existing, incoming, delete_missing)
+    if dry_run or not (changed or stale):
+        return counts
+
+    cells = {**existing, **changed}
+    for key in stale:
+        del cells[key]
+    touched = {st for st, _, _ in [*changed, *stale]}
+    by_statement = defaultdict(list)
+    for (st, m, d), v in cells.items():
+        if st in touched:
+            by_statement[st].append((m, d, v))
+    with transaction.atomic():
+        for st in touched:
+            PackedFinancial.objects.update_or_create(company=company, statement=st, defaults=pack(by_statement[st]))
+    return counts
+
+
+def merge_metrics(mapping, company_ids):
+    """
+    Re-point the given companies' cells from alias metric ids to canonical ones ({alias_id: canonical_id}).
+    Where a company already has the canonical cell, that value is kept and the alias cell dropped.
+    Returns (cells moved, cells dropped, ids of companies changed).
+    """
+    if packed_storage():
+        return _merge_packed_metrics(mapping, company_ids)
+
+    moved = dropped = 0
+    with transaction.atomic():
+        changed = set(
+            Financial.objects.filter(company_id__in=company_ids, metric_id__in=list(mapping))
+            .values_list("company_id", flat=True).distinct()
+        )
+        for alias_id, canonical_id in mapping.items():
+            alias_cells = Financial.objects.filter(company_id__in=changed, metric_id=alias_id)
+            taken = Financial.objects.filter(
+                company_id=OuterRef("company_id"),
+                period_end_date=OuterRef("period_end_date"),
+                statement=OuterRef("statement"),
+                metric_id=canonical_id,
+            )
+            moved += alias_cells.exclude(Exists(taken)).update(metric_id=canonical_id)
+            dropped += alias_cells.delete()[0]
+    return moved, dropped, changed
+
+
+def _merge_packed_metrics(mapping, company_ids):
+    moved = dropped = 0
+    changed = set()
+    with transaction.atomic():
+        for record in PackedFinancial.objects.filter(company_id__in=company_ids):
+            cells = unpack(record.metric_ids, record.periods, record.values)
+            if not any(m in mapping for m, _, _ in cells):
+                continue
+            merged = {(m, d): v for m, d, v in cells if m not in mapping}
+            for m, d, v in cells:
+                if m in mapping:
+                    if (mapping[m], d) in merged:
+                        dropped += 1
+                    else:
+                        merged[mapping[m], d] = v
+                        moved += 1
+            for field, value in pack([(m, d, v) for (m, d), v in merged.items()]).items():
+                setattr(record, field, value)
+            record.save(update_fields=["metric_ids", "periods", "values"])
+            changed.add(record.company_id)
+    return moved, dropped, changed
+
+
+def delete_metrics(metric_ids, company_ids, dry_run=False):
+    """
+    Delete the given companies' cells for ``metric_ids`` from the configured layout.
+    Returns the number of cells deleted (or, with ``dry_run``, that would be).
+    """
+    metric_ids = set(metric_ids)
+    if not packed_storage():
+        cells = Financial.objects.filter(company_id__in=company_ids, metric_id__in=metric_ids)
+        return cells.count() if dry_run else cells.delete()[0]
+
+    deleted = 0
+    with transaction.atomic():
+        for record in PackedFinancial.objects.filter(company_id__in=company_ids):
+            cells = unpack(record.metric_ids, record.periods, record.values)
+            kept = [cell for cell in cells if cell[0] not in metric_ids]
+            if len(kept) == len(cells):
+                continue
+            deleted += len(cells) - len(kept)
+            if dry_run:
+                continue
+            for field, value in pack(kept).items():
+                setattr(record, field, value)
+            record.save(update_fields=["metric_ids", "periods", "values"])
+    return deleted
+
+
+def pack_companies(company_ids, delete_rows=False):
+    """Copy the companies' Financial rows into the packed store; returns the number of values packed."""
+    cells = defaultdict(list)
+    rows = Financial.objects.filter(company_id__in=company_ids).values_list(
+        "company_id", "statement", "metric_id", "period_end_date", "value"
+    )
+    for company_id, statement, metric_id, period_end_date, value in rows:
+        cells[company_id, statement].append((metric_id, period_end_date, value))
+    with transaction.atomic():
+        _merge_packed(company_ids, cells)
+        if delete_rows:
+            Financial.objects.filter(company_id__in=company_ids).delete()
+    return sum(len(v) for v in cells.values())
+
+
+def relation_sizes(table):
+    """
+    {"table_bytes", "index_bytes", "total_bytes"} on disk for a table (summed over its
+    partitions on Postgres); values are None if the backend can't tell us.
+    """
+    if connection.vendor == "postgresql":
+        sql = (
+            "SELECT SUM(pg_table_size(r.oid)), SUM(pg_indexes_size(r.oid)) FROM ("
+            "SELECT to_regclass(%s) AS oid UNION ALL "
+            "SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s)) r"
+        )
+        params = [table, table]
+    elif connection.vendor == "sqlite":
+        # dbstat is only present when SQLite is compiled with SQLITE_ENABLE_DBSTAT_VTAB.
+        sql = (
+            "SELECT SUM(CASE WHEN m.type = 'table' THEN d.pgsize ELSE 0 END), "
+            "SUM(CASE WHEN m.type = 'index' THEN d.pgsize ELSE 0 END) "
+            "FROM dbstat d JOIN sqlite_master m ON m.name = d.name WHERE m.tbl_name = %s"
+        )
+        params = [table]
+    else:
+        sql = None
+    sizes = (None, None)
+    if sql:
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                sizes = cursor.fetchone()
+        except DatabaseError:
+            pass
+    table_bytes, index_bytes = (int(v) if v is not None else None for v in sizes)
+    total = None if table_bytes is None else table_bytes + (index_bytes or 0)
+    return {"table_bytes": table_bytes, "index_bytes": index_bytes, "total_bytes": total}
+
+
+def _table_bytes(table):
+    """On-disk size of a table plus its indexes, or None if the backend can't tell us."""
+    return relation_sizes(table)["total_bytes"]
+
+
+def storage_report():
+    """Counts and sizes of both layouts, plus the packed payload the current rows would need."""
+    shapes = (
+        Financial.objects.values("company_id", "statement")
+        .annotate(m=Count("metric_id", distinct=True), p=Count("period_end_date", distinct=True))
+        .values_list("m", "p")
+    )
+    projected = sum(4 * m + 4 * p + 8 * m * p for m, p in shapes)
+    packed = PackedFinancial.objects.aggregate(
+        records=Count("pk"),
+        payload=Sum(Length("metric_ids") + Length("periods") + Length("values")),
+    )
+    return {
+        "rows": {
+            "records": Financial.objects.count(),
+            "table_bytes": _table_bytes(Financial._meta.db_table),
+            "projected_packed_payload_bytes": projected,
+        },
+        "packed": {
+            "records": packed["records"],
+            "payload_bytes": packed["payload"] or 0,
+            "table_bytes": _table_bytes(PackedFinancial._meta.db_table),
+        },
+    }
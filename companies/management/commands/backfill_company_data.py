@@ -248,7 +248,8 @@ class Command(BaseCommand):
                 if changes:
                     self.stdout.write(f"[{i}/{total}] {company.ticker}: {', '.join(changes)}")
                     if not dry_run and update_fields:
-                        company.save(update_fields=update_fields)
+                        # updated_at is the page cache version; include it so the page is re-rendered
+                        company.save(update_fields=update_fields + ['updated_at'])
                     updated += 1
                 else:
                     self.stdout.write(f"[{i}/{total}] {company.ticker}: no changes needed")
@@ -3,7 +3,65 @@ from pathlib import Path
 
 from django.core.management.base import BaseCommand
 
-from companies.models import Company, Financial
+from companies.financial_store import financial_rows
+from companies.metric_names import metric_ids
+from companies.models import Company
+
+
+def revenue_prune_candidates(max_revenue, large_cap_guard, allow_large_cap=False, batch_size=500):
+    """
+    Companies whose latest IS revenue is below ``max_revenue``, read from whichever
+    financial layout is configured (rows or packed).
+    Returns (rows, excluded_large_cap, missing_revenue); also used by storage_report.
+    """
+    companies = list(Company.objects.all().only("id", "ticker", "exchange", "name", "market_cap").order_by("id"))
+    # Resolve once so the batch reads filter on metric_id without a join
+    revenue_metric_ids = metric_ids(["Revenue", "Total Revenues"])
+
+    latest = {}  # company_id -> (period_end_date, value)
+    for start in range(0, len(companies), batch_size):
+        batch = [c.id for c in companies[start:start + batch_size]]
+        for company_id, statement, _, period_end_date, value in financial_rows(batch, metric_ids=revenue_metric_ids):
+            if statement == "IS" and (company_id not in latest or period_end_date > latest[company_id][0]):
+                latest[company_id] = (period_end_date, value)
+
+    rows = []
+    excluded_large_cap = []
+    missing_revenue = 0
+
+    for company in companies:
+        if company.id not in latest:
+            missing_revenue += 1
+            continue
+
+        period_end_date, value = latest[company.id]
+        if value is None or value >= max_revenue:
+            continue
+
+        market_cap = company.market_cap
+        if (
+            not allow_large_cap
+            and market_cap is not None
+            and market_cap >= large_cap_guard
+        ):
+            excluded_large_cap.append(
+                (company.ticker, company.exchange, company.name, value, market_cap)
+            )
+            continue
+
+        rows.append(
+            {
+                "company_id": company.id,
+                "ticker": company.ticker,
+                "exchange": company.exchange,
+                "name": company.name,
+                "latest_revenue": value,
+                "period_end_date": period_end_date,
+                "market_cap": market_cap,
+            }
+        )
+
+    return rows, excluded_large_cap, missing_revenue
 
 
 class Command(BaseCommand):
@@ -46,52 +104,9 @@ class Command(BaseCommand):
         allow_large_cap = bool(options["allow_large_cap"])
         out_path = Path(options["out"])
 
-        companies = Company.objects.all().only("id", "ticker", "exchange", "name", "market_cap")
-
-        rows = []
-        excluded_large_cap = []
-        missing_revenue = 0
-
-        for company in companies:
-            latest = (
-                Financial.objects.filter(
-                    company=company,
-                    statement="IS",
-                    metric__name__in=["Revenue", "Total Revenues"],
-                )
-                .order_by("-period_end_date")
-                .values("value", "period_end_date")
-                .first()
-            )
-            if not latest:
-                missing_revenue += 1
-                continue
-
-            value = latest["value"]
-            if value is None or value >= max_revenue:
-                continue
-
-            market_cap = company.market_cap
-            if (
-                not allow_large_cap
-                and market_cap is not None
-                and market_cap >= large_cap_guard
-            ):
-                excluded_large_cap.append(
-                    (company.ticker, company.exchange, company.name, value, market_cap)
-                )
-                continue
-
-            rows.append(
-                {
-                    "ticker": company.ticker,
-                    "exchange": company.exchange,
-                    "name": company.name,
-                    "latest_revenue": value,
-                    "period_end_date": latest["period_end_date"],
-                    "market_cap": market_cap,
-                }
-            )
+        rows, excluded_large_cap, missing_revenue = revenue_prune_candidates(
+            max_revenue, large_cap_guard, allow_large_cap
+        )
 
         # De-dupe in-memory by ticker/exchange to prevent accidental duplicate rows.
         deduped = {}
@@ -103,6 +118,7 @@ class Command(BaseCommand):
         with out_path.open("w", newline="", encoding="utf-8") as f:
             writer = csv.DictWriter(
                 f,
+                extrasaction="ignore",
                 fieldnames=[
                     "ticker",
                     "exchange",
@@ -0,0 +1,91 @@
+"""
+Merge stored FinancialMetric spelling variants into their canonical metric
+(METRIC_ALIASES / canonical_metric_name in companies.metric_taxonomy), the same
+mapping save_cached_financials applies at ingest.
+
+Cells are moved per company batch, like prune_financial_metrics, so each statement
+uses the leading company_id column of the unique index. Where a company already
+has the canonical cell, that value wins. Affected companies' stored statements and
+snapshots are rebuilt, then the alias metrics are deleted.
+"""
+from django.core.management.base import BaseCommand
+
+from companies.financial_store import merge_metrics
+from companies.metric_names import bump_metric_names_version, metric_ids, metric_names
+from companies.metric_taxonomy import canonical_metric_name
+from companies.models import Company, FinancialMetric
+from companies.snapshots import rebuild_metric_snapshots
+from companies.statements import rebuild_statement_tables
+
+
+class Command(BaseCommand):
+    help = "Merge FinancialMetric spelling variants into one canonical metric per line item."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the aliases that would be merged without changing anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of companies to process per batch (default: 100)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+
+        names = metric_names()
+        aliases = {
+            metric_id: canonical_metric_name(name)
+            for metric_id, name in names.items()
+            if canonical_metric_name(name) != name
+        }
+        if not aliases:
+            self.stdout.write("No metric aliases found in DB.")
+            return
+
+        for metric_id, canonical in sorted(aliases.items(), key=lambda kv: kv[1]):
+            self.stdout.write(f"  {names[metric_id]!r} -> {canonical!r}")
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f"DRY RUN — {len(aliases)} metrics would be merged"))
+            return
+
+        canonical_names = sorted(set(aliases.values()))
+        FinancialMetric.objects.bulk_create(
+            [FinancialMetric(name=n) for n in canonical_names], ignore_conflicts=True
+        )
+        bump_metric_names_version()
+        canonical_ids = dict(zip(canonical_names, metric_ids(canonical_names)))
+        mapping = {alias_id: canonical_ids[name] for alias_id, name in aliases.items()}
+
+        company_ids = list(Company.objects.values_list('id', flat=True).order_by('id'))
+        total = len(company_ids)
+        moved = dropped = 0
+        changed = set()
+        for start in range(0, total, batch_size):
+            batch_moved, batch_dropped, batch_changed = merge_metrics(mapping, company_ids[start:start + batch_size])
+            moved += batch_moved
+            dropped += batch_dropped
+            changed |= batch_changed
+            self.stdout.write(
+                f"  [{min(start + batch_size, total)}/{total} companies] moved {moved}, "
+                f"dropped {dropped} duplicate cells so far"
+            )
+
+        self.stdout.write(f"Rebuilding statements and snapshots for {len(changed)} companies...")
+        changed = sorted(changed)
+        for start in range(0, len(changed), batch_size):
+            batch = changed[start:start + batch_size]
+            for company in Company.objects.filter(pk__in=batch):
+                rebuild_statement_tables(company)
+            rebuild_metric_snapshots(batch)
+
+        FinancialMetric.objects.filter(pk__in=list(mapping)).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"\nMerged {len(mapping)} alias metrics into {len(canonical_names)} canonical metrics: "
+            f"{moved} cells moved, {dropped} duplicates dropped."
+        ))
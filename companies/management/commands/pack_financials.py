@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from companies.financial_store import pack_companies, storage_report
+from companies.models import Company
+
+
+def _fmt_bytes(n):
+    return "n/a" if n is None else f"{n / 1024 / 1024:.2f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert Financial rows into the packed per-(company, statement) layout "
+        "(PackedFinancial) and report the size of both layouts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ticker',
+            type=str,
+            help='Only pack a specific ticker',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of companies packed per batch (default: 200)',
+        )
+        parser.add_argument(
+            '--delete-rows',
+            action='store_true',
+            help='Delete the Financial rows once packed (only with FINANCIAL_STORAGE=packed, where the screener no longer reads them)',
+        )
+        parser.add_argument(
+            '--report',
+            action='store_true',
+            help='Only print the size report, do not convert anything',
+        )
+
+    def handle(self, *args, **options):
+        if not options['report']:
+            self._pack(options)
+        self._report()
+
+    def _pack(self, options):
+        delete_rows = options['delete_rows']
+        batch_size = options['batch_size']
+        if delete_rows and settings.FINANCIAL_STORAGE != "packed":
+            self.stderr.write(self.style.ERROR(
+                "Refusing to --delete-rows while FINANCIAL_STORAGE is not 'packed': pages would lose their data."
+            ))
+            return
+
+        companies = Company.objects.filter(financials__isnull=False).distinct().order_by('id')
+        if options.get('ticker'):
+            companies = companies.filter(ticker=options['ticker'])
+        company_ids = list(companies.values_list('id', flat=True))
+        total = len(company_ids)
+        self.stdout.write(f"Packing financials for {total} companies...")
+
+        packed = 0
+        for start in range(0, total, batch_size):
+            packed += pack_companies(company_ids[start:start + batch_size], delete_rows=delete_rows)
+            self.stdout.write(f"[{min(start + batch_size, total)}/{total}] {packed} values packed so far")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Packed {packed} values for {total} companies."))
+        if settings.FINANCIAL_STORAGE != "packed":
+            self.stdout.write("Set FINANCIAL_STORAGE=packed to read and write the packed layout.")
+
+    def _report(self):
+        report = storage_report()
+        rows, packed = report["rows"], report["packed"]
+        self.stdout.write(f"Storage mode: {settings.FINANCIAL_STORAGE}")
+        self.stdout.write(
+            f"  rows:   {rows['records']} Financial rows, table + indexes {_fmt_bytes(rows['table_bytes'])}; "
+            f"as packed matrices ~{_fmt_bytes(rows['projected_packed_payload_bytes'])}"
+        )
+        self.stdout.write(
+            f"  packed: {packed['records']} PackedFinancial records, payload {_fmt_bytes(packed['payload_bytes'])}, "
+            f"table + indexes {_fmt_bytes(packed['table_bytes'])}"
+        )
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from companies.models import Company
+from companies.price_store import pack_price_rows, prune_price_rows
+
+
+class Command(BaseCommand):
+    help = "Pack existing StockPrice rows into per-company, per-year price blocks (PriceBlock)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ticker',
+            type=str,
+            help='Only pack a specific ticker',
+        )
+        parser.add_argument(
+            '--prune-rows',
+            action='store_true',
+            help='Afterwards delete rows outside the PRICE_ROW_DAYS window',
+        )
+
+    def handle(self, *args, **options):
+        prune = options['prune_rows']
+        if prune and settings.PRICE_ROW_DAYS is None:
+            self.stdout.write("PRICE_ROW_DAYS is unset (keep every row); nothing will be pruned.")
+
+        companies = Company.objects.filter(prices__isnull=False).distinct().order_by('id')
+        if options.get('ticker'):
+            companies = companies.filter(ticker=options['ticker'])
+        company_ids = list(companies.values_list('id', flat=True))
+        total = len(company_ids)
+        self.stdout.write(f"Packing prices for {total} companies...")
+
+        packed = pruned = 0
+        for i, company_id in enumerate(company_ids, 1):
+            packed += pack_price_rows(company_id)
+            if prune:
+                pruned += prune_price_rows([company_id])
+            if i % 100 == 0 or i == total:
+                self.stdout.write(f"[{i}/{total}] {packed} bars packed, {pruned} rows pruned")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Packed {packed} bars for {total} companies."))
@@ -0,0 +1,259 @@
+"""
+Move companies_financial onto a table HASH-partitioned by company_id (PostgreSQL only).
+
+Per-company reads, the per-company batch deletes in prune_financial_metrics and
+VACUUM then only touch one small partition instead of the 4.5M-row heap.
+
+The migration runs online:
+  1. create companies_financial_p (same columns) with N hash partitions,
+     the unique constraint and the company/metric foreign keys, plus a trigger
+     that logs the id of every row written to companies_financial from then on;
+  2. copy rows in batches of companies, one transaction each, up to the id
+     high-water mark taken at the start (re-runnable: ON CONFLICT DO NOTHING);
+  3. replay the logged rows onto the copy, repeating while writes keep arriving;
+  4. in one transaction that blocks writers but not readers: replay what was
+     logged since the last pass, drop the trigger, give the new table its own id
+     sequence, and swap names. Writers wait for as long as replaying the rows
+     written during step 3 takes, not for a scan of the table. The old table is
+     kept as companies_financial_unpartitioned until --drop-old.
+
+Model, ORM queries, uniq_company_period_statement_metric and the screener's raw
+SQL are unchanged: they all address companies_financial by name. Other backends
+(SQLite in development) keep the single table.
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+TABLE = "companies_financial"
+NEW = "companies_financial_p"
+OLD = "companies_financial_unpartitioned"
+UNIQUE = "uniq_company_period_statement_metric"
+CHANGES = "companies_financial_changes"
+COLUMNS = "id, company_id, period_end_date, statement, metric_id, value, created_at"
+# Stop the unlocked replay passes once a pass has at most this many rows left for the locked one.
+LOCKED_REPLAY_ROWS = 1000
+MAX_REPLAY_PASSES = 10
+
+
+def setup_sql(partitions):
+    sql = [f"CREATE TABLE {NEW} (LIKE {TABLE}) PARTITION BY HASH (company_id)"]
+    sql += [
+        f"CREATE TABLE {NEW}_{i} PARTITION OF {NEW} FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+        for i in range(partitions)
+    ]
+    sql += [
+        # Partitioned keys must include company_id; id leads so lookups by pk stay indexed.
+        f"ALTER TABLE {NEW} ADD CONSTRAINT {NEW}_pkey PRIMARY KEY (id, company_id)",
+        f"ALTER TABLE {NEW} ADD CONSTRAINT {UNIQUE}_p UNIQUE (company_id, period_end_date, statement, metric_id)",
+        f"ALTER TABLE {NEW} ADD CONSTRAINT {NEW}_company_fk FOREIGN KEY (company_id) "
+        f"REFERENCES companies_company (id) DEFERRABLE INITIALLY DEFERRED",
+        f"ALTER TABLE {NEW} ADD CONSTRAINT {NEW}_metric_fk FOREIGN KEY (metric_id) "
+        f"REFERENCES companies_financialmetric (id) DEFERRABLE INITIALLY DEFERRED",
+        # Change log for the catch-up: ids of rows inserted, updated (old and new id) or deleted.
+        f"CREATE TABLE {CHANGES} (seq bigserial PRIMARY KEY, id integer NOT NULL)",
+        f"CREATE FUNCTION {CHANGES}_log() RETURNS trigger AS $$ BEGIN "
+        f"IF TG_OP <> 'INSERT' THEN INSERT INTO {CHANGES} (id) VALUES (OLD.id); END IF; "
+        f"IF TG_OP <> 'DELETE' THEN INSERT INTO {CHANGES} (id) VALUES (NEW.id); END IF; "
+        f"RETURN NULL; END $$ LANGUAGE plpgsql",
+        f"CREATE TRIGGER {CHANGES}_log AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {CHANGES}_log()",
+    ]
+    return sql
+
+
+def copy_sql():
+    """Copy one batch; params are (company_ids, high_water_id)."""
+    return (
+        f"INSERT INTO {NEW} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE} "
+        f"WHERE company_id = ANY(%s) AND id <= %s ON CONFLICT DO NOTHING"
+    )
+
+
+def replay_sql(marks):
+    """Re-copy logged rows; ``marks`` is the placeholder list for one chunk of ids."""
+    return [
+        f"DELETE FROM {NEW} WHERE id IN ({marks})",
+        f"INSERT INTO {NEW} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE} WHERE id IN ({marks})",
+    ]
+
+
+def catch_up(cursor, chunk_size=1000):
+    """
+    Drain the change log and make the copy match the live table for the rows it
+    names: their copies are deleted, then whatever the live table holds under those
+    ids now is inserted. All deletes run before any insert, so a key that moved to
+    another id (a delete and reinsert, or metric merges rewriting metric_id) can't
+    collide with a stale copy. Work is proportional to the rows written since the
+    last pass. Returns the number of rows replayed.
+    """
+    cursor.execute(f"DELETE FROM {CHANGES} RETURNING id")
+    ids = sorted({i for (i,) in cursor.fetchall()})
+    chunks = [ids[start:start + chunk_size] for start in range(0, len(ids), chunk_size)]
+    for step in range(2):  # every delete, then every insert
+        for chunk in chunks:
+            cursor.execute(replay_sql(", ".join(["%s"] * len(chunk)))[step], chunk)
+    return len(ids)
+
+
+def lock_sql():
+    """Readers keep going; writers wait until the swap commits."""
+    return f"LOCK TABLE {TABLE} IN SHARE ROW EXCLUSIVE MODE"
+
+
+def swap_sql():
+    """Run under lock_sql() after the last catch_up(): retire the change log and swap names."""
+    return [
+        f"DROP TRIGGER {CHANGES}_log ON {TABLE}",
+        f"DROP FUNCTION {CHANGES}_log()",
+        f"DROP TABLE {CHANGES}",
+        f"CREATE SEQUENCE {NEW}_id_seq OWNED BY {NEW}.id",
+        f"SELECT setval('{NEW}_id_seq', COALESCE((SELECT MAX(id) FROM {NEW}), 0) + 1, false)",
+        f"ALTER TABLE {NEW} ALTER COLUMN id SET DEFAULT nextval('{NEW}_id_seq')",
+        f"ALTER TABLE {TABLE} RENAME TO {OLD}",
+        f"ALTER TABLE {OLD} RENAME CONSTRAINT {UNIQUE} TO {UNIQUE}_unpartitioned",
+        f"ALTER TABLE {NEW} RENAME TO {TABLE}",
+        f"ALTER TABLE {TABLE} RENAME CONSTRAINT {UNIQUE}_p TO {UNIQUE}",
+    ]
+
+
+class Command(BaseCommand):
+    help = "Migrate companies_financial to a hash-partitioned table on PostgreSQL, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=16,
+            help='Number of hash partitions on company_id (default: 16)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of companies copied per transaction (default: 200)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the SQL that would run without executing it',
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Show whether the table is partitioned and the estimated rows per partition',
+        )
+        parser.add_argument(
+            '--drop-old',
+            action='store_true',
+            help=f'Drop {OLD} left behind by a completed migration',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self._print_plan(options['partitions'])
+            return
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write(
+                f"Partitioning needs PostgreSQL; {connection.vendor} keeps the single {TABLE} table."
+            )
+            return
+
+        if options['status']:
+            self._status()
+        elif options['drop_old']:
+            self._drop_old()
+        elif self._is_partitioned():
+            self.stdout.write(f"{TABLE} is already partitioned.")
+            self._status()
+        else:
+            self._migrate(options['partitions'], options['batch_size'])
+
+    def _print_plan(self, partitions):
+        for statement in setup_sql(partitions):
+            self.stdout.write(statement + ";")
+        self.stdout.write(f"-- per batch of companies, up to the id high-water mark:\n{copy_sql()};")
+        replay = [f"DELETE FROM {CHANGES} RETURNING id", *replay_sql("...")]
+        self.stdout.write("-- replay logged rows until few are left:\n" + ";\n".join(replay) + ";")
+        self.stdout.write(f"-- then in one transaction:\n{lock_sql()};\n" + ";\n".join(replay) + ";")
+        for statement in swap_sql():
+            self.stdout.write(statement + ";")
+
+    def _fetch(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _is_partitioned(self):
+        return bool(self._fetch(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [TABLE]
+        ))
+
+    def _status(self):
+        if not self._is_partitioned():
+            self.stdout.write(f"{TABLE} is not partitioned.")
+            return
+        rows = self._fetch(
+            "SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            [TABLE],
+        )
+        self.stdout.write(f"{TABLE}: {len(rows)} partitions")
+        for name, estimate, size in rows:
+            self.stdout.write(f"  {name}: ~{max(estimate, 0)} rows, {size / 1024 / 1024:.1f} MB")
+
+    def _drop_old(self):
+        if not self._fetch("SELECT to_regclass(%s)", [OLD])[0][0]:
+            self.stdout.write(f"No {OLD} table to drop.")
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {OLD}")
+        self.stdout.write(self.style.SUCCESS(f"Dropped {OLD}."))
+
+    def _migrate(self, partitions, batch_size):
+        if self._fetch("SELECT to_regclass(%s)", [OLD])[0][0]:
+            self.stderr.write(self.style.ERROR(f"{OLD} exists from an earlier run; drop it first (--drop-old)."))
+            return
+
+        if self._fetch("SELECT to_regclass(%s)", [NEW])[0][0]:
+            self.stdout.write(f"Resuming: {NEW} already exists.")
+        else:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for statement in setup_sql(partitions):
+                    cursor.execute(statement)
+            self.stdout.write(f"Created {NEW} with {partitions} hash partitions on company_id.")
+
+        high_water = self._fetch(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE}")[0][0]
+        company_ids = [c for (c,) in self._fetch("SELECT id FROM companies_company ORDER BY id")]
+        total = len(company_ids)
+        self.stdout.write(f"Copying rows with id <= {high_water} for {total} companies...")
+
+        copied = 0
+        for start in range(0, total, batch_size):
+            batch = company_ids[start:start + batch_size]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(copy_sql(), [batch, high_water])
+                copied += cursor.rowcount
+            self.stdout.write(f"  [{min(start + batch_size, total)}/{total} companies] {copied} rows copied so far")
+
+        for _ in range(MAX_REPLAY_PASSES):
+            with transaction.atomic(), connection.cursor() as cursor:
+                replayed = catch_up(cursor)
+            self.stdout.write(f"  replayed {replayed} rows written during the copy")
+            if replayed <= LOCKED_REPLAY_ROWS:
+                break
+
+        self.stdout.write(f"Locking {TABLE} against writes for the final replay and swap...")
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(lock_sql())
+            replayed = catch_up(cursor)
+            for statement in swap_sql():
+                cursor.execute(statement)
+        self.stdout.write(f"  replayed {replayed} rows under the lock")
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {TABLE}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {TABLE} is now partitioned; the previous table is kept as {OLD} "
+            f"(remove it with --drop-old once verified)."
+        ))
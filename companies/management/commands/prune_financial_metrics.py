@@ -1,44 +1,19 @@
 """
-Delete Financial rows for metrics that are never displayed (FISCAL_METRICS_DROP).
+Delete stored values for metrics that are never displayed (ACTION_DROP in companies.metric_taxonomy),
+from Financial rows or, with FINANCIAL_STORAGE=packed, the PackedFinancial matrices.
 Deletes per company_id to leverage the leading column of the unique constraint index,
 avoiding a full table scan on a 4.5M-row table with no metric_id index.
+Once the table is hash-partitioned on company_id (partition_financials), each batch
+only touches the partitions holding its companies.
 """
 from django.core.management.base import BaseCommand
-from companies.models import Company, Financial, FinancialMetric
-
-
-# Keep this in sync with FISCAL_METRICS_DROP in companies/views.py
-# and METRICS_NEVER_DISPLAYED in save_cached_financials.py.
-METRICS_TO_PRUNE = {
-    "Total Revenues % Chg.",
-    "Total Revenues %Chg",
-    "Operating Margin",
-    "Interest Expense",
-    "Interest Expense, Total",
-    "Interest And Invest. Income",
-    "Interest And Investment Income",
-    "Interest and Investment Income",
-    "Gross Profit Margin",
-    "Earnings From Continuing Operations",
-    "Net Income to Common Excl. Extra Items",
-    "Net Income to Common Incl Extra Items",
-    "Total Shares Outstanding",
-    "EBT, Excl. Unusual Items",
-    "Basic EPS",
-    "Diluted EPS",
-    "EPS",
-    "EPS Diluted",
-    "Basic Weighted Average Shares Outstanding",
-    "Diluted Weighted Average Shares Outstanding",
-    "EBITDA",
-    "Effective Tax Rate",
-    "Gross Property Plant And Equipment",
-    "Accumulated Depreciation",
-}
+from companies.financial_store import delete_metrics, packed_storage
+from companies.metric_taxonomy import ACTION_DROP, metric_table
+from companies.models import Company
 
 
 class Command(BaseCommand):
-    help = "Delete Financial rows for metrics that are never displayed."
+    help = "Delete stored financial values for metrics that are never displayed."
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -61,9 +36,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("DRY RUN — no deletions will be made"))
 
         # Resolve metric IDs once
-        metric_ids = list(
-            FinancialMetric.objects.filter(name__in=METRICS_TO_PRUNE).values_list('id', flat=True)
-        )
+        metric_ids = metric_table().ids_with(ACTION_DROP)
         if not metric_ids:
             self.stdout.write("No matching metrics found in DB.")
             return
@@ -76,23 +49,15 @@ class Command(BaseCommand):
 
         for batch_start in range(0, total_companies, batch_size):
             batch = company_ids[batch_start:batch_start + batch_size]
-            if dry_run:
-                count = Financial.objects.filter(
-                    company_id__in=batch,
-                    metric_id__in=metric_ids,
-                ).count()
-                total_deleted += count
-            else:
-                deleted, _ = Financial.objects.filter(
-                    company_id__in=batch,
-                    metric_id__in=metric_ids,
-                ).delete()
-                total_deleted += deleted
+            total_deleted += delete_metrics(metric_ids, batch, dry_run=dry_run)
 
             done = min(batch_start + batch_size, total_companies)
             self.stdout.write(f"  [{done}/{total_companies} companies] {'would delete' if dry_run else 'deleted'} {total_deleted} rows so far")
 
         action = "Would delete" if dry_run else "Deleted"
-        self.stdout.write(self.style.SUCCESS(f"\n{action} {total_deleted} Financial rows across {total_companies} companies."))
-        if not dry_run:
-            self.stdout.write("Run VACUUM ANALYZE on companies_financial to reclaim space.")
+        layout = "PackedFinancial cells" if packed_storage() else "Financial rows"
+        self.stdout.write(self.style.SUCCESS(f"\n{action} {total_deleted} {layout} across {total_companies} companies."))
+        if not dry_run and not packed_storage():
+            self.stdout.write(
+                "Run VACUUM ANALYZE on companies_financial (or its partitions, if partitioned) to reclaim space."
+            )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from companies.models import Company
+from companies.snapshots import rebuild_metric_snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed per-period ratios (CompanyMetricSnapshot) from stored financials."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ticker',
+            type=str,
+            help='Only rebuild a specific ticker',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only build companies that have no snapshots yet',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of companies computed per batch (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        ticker = options.get('ticker')
+        missing_only = options.get('missing_only', False)
+        batch_size = options['batch_size']
+
+        companies = Company.objects.all().order_by('id')
+        if ticker:
+            companies = companies.filter(ticker=ticker)
+        if missing_only:
+            companies = companies.filter(metric_snapshots__isnull=True).distinct()
+
+        company_ids = list(companies.values_list('id', flat=True))
+        total = len(company_ids)
+        self.stdout.write(f"Rebuilding metric snapshots for {total} companies...")
+
+        written = 0
+        for start in range(0, total, batch_size):
+            written += rebuild_metric_snapshots(company_ids[start:start + batch_size])
+            self.stdout.write(f"[{min(start + batch_size, total)}/{total}] {written} snapshots so far")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Wrote {written} snapshots for {total} companies."))
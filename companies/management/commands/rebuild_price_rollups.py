@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from companies.models import Company
+from companies.price_store import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the weekly and monthly price rollups (PriceRollup) from stored daily prices."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ticker',
+            type=str,
+            help='Only rebuild a specific ticker',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only build companies that have no rollups yet',
+        )
+
+    def handle(self, *args, **options):
+        ticker = options.get('ticker')
+        missing_only = options.get('missing_only', False)
+
+        companies = Company.objects.all().order_by('id')
+        if ticker:
+            companies = companies.filter(ticker=ticker)
+        if missing_only:
+            companies = companies.filter(price_rollups__isnull=True).distinct()
+
+        company_ids = list(companies.values_list('id', flat=True))
+        total = len(company_ids)
+        self.stdout.write(f"Rebuilding price rollups for {total} companies...")
+
+        written = 0
+        for i, company_id in enumerate(company_ids, 1):
+            written += rebuild_rollups(company_id)
+            if i % 100 == 0 or i == total:
+                self.stdout.write(f"[{i}/{total}] {written} bars so far")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Wrote {written} weekly/monthly bars for {total} companies."))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from companies.models import Company
+from companies.statements import rebuild_statement_tables
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored pre-pivoted IS/BS/CF tables served by the company detail page."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ticker',
+            type=str,
+            help='Only rebuild a specific ticker',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only build companies that have no stored statements yet',
+        )
+
+    def handle(self, *args, **options):
+        ticker = options.get('ticker')
+        missing_only = options.get('missing_only', False)
+
+        companies = Company.objects.all().order_by('id')
+        if ticker:
+            companies = companies.filter(ticker=ticker)
+        if missing_only:
+            companies = companies.filter(statements__isnull=True)
+
+        total = companies.count()
+        self.stdout.write(f"Rebuilding statements for {total} companies...")
+
+        failed = 0
+        for i, company in enumerate(companies.iterator(), 1):
+            try:
+                rebuild_statement_tables(company)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(self.style.ERROR(f"[{i}/{total}] {company.ticker}: failed - {e}"))
+                continue
+            if i % 100 == 0 or i == total:
+                self.stdout.write(f"[{i}/{total}] done")
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Rebuilt: {total - failed}, Failed: {failed}"))
@@ -1,9 +1,16 @@
 from django.core.management.base import BaseCommand
 from django.db.models import Count
 from companies.models import Company, Financial, FinancialMetric
+from companies.financial_store import has_financials, packed_storage, store_financials, upsert_financials
+from companies.metric_names import bump_metric_names_version
+from companies.metric_taxonomy import NEVER_DISPLAYED, canonical_metric_name
+from companies.snapshots import rebuild_metric_snapshots
+from companies.statements import rebuild_statement_tables
 from companies.utils import end_of_month, normalize_exchange
 import json
 import re
+import time
+from collections import Counter
 
 
 # Set to True to re-process companies that already exist in the database
@@ -106,36 +113,6 @@ DEFAULT_FILES = [
 # Safety bound for obviously corrupt values.
 MAX_ABS_VALUE = 1e14
 
-# Metrics that are never rendered to users — dropped by the display pipeline in views.py.
-# Keep this in sync with FISCAL_METRICS_DROP in companies/views.py.
-# These are skipped at import time to avoid storing data we'll never show.
-METRICS_NEVER_DISPLAYED = {
-    "Total Revenues % Chg.",
-    "Total Revenues %Chg",
-    "Operating Margin",
-    "Interest Expense",
-    "Interest Expense, Total",
-    "Interest And Invest. Income",
-    "Interest And Investment Income",
-    "Interest and Investment Income",
-    "Gross Profit Margin",
-    "Earnings From Continuing Operations",
-    "Net Income to Common Excl. Extra Items",
-    "Net Income to Common Incl Extra Items",
-    "Total Shares Outstanding",
-    "EBT, Excl. Unusual Items",
-    "Basic EPS",
-    "Diluted EPS",
-    "EPS",
-    "EPS Diluted",
-    "Basic Weighted Average Shares Outstanding",
-    "Diluted Weighted Average Shares Outstanding",
-    "EBITDA",
-    "Effective Tax Rate",
-    "Gross Property Plant And Equipment",
-    "Accumulated Depreciation",
-}
-
 
 class Command(BaseCommand):
     help = "Load financials from cached_financials_uk.json and data/all_us_financials.json."
@@ -169,9 +146,22 @@ class Command(BaseCommand):
             help=(
                 'Filter companies by this exact exchange value (e.g. LSE, AIM, NMS). '
                 'Bypasses EXCHANGE_ALIASES lookup and targets the exact DB row. '
-                'Also enables overwrite (ignores existing financials check).'
+                'Also enables overwrite (ignores existing financials check and implies --upsert).'
             )
         )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help=(
+                'Process companies that already have financials: diff against stored values and '
+                'write only new or restated cells'
+            ),
+        )
+        parser.add_argument(
+            '--delete-missing',
+            action='store_true',
+            help='With --upsert, remove stored metrics that are absent from a statement in the payload',
+        )
         parser.add_argument(
             '--dry-run',
             action='store_true',
@@ -206,6 +196,13 @@ class Command(BaseCommand):
         target_exchange = normalize_exchange(options.get('target_exchange'))
         limit = options.get('limit')
         allow_ticker_fallback = options.get('allow_ticker_fallback')
+        self.upsert = options.get('upsert') or bool(target_exchange)
+        self.delete_missing = options.get('delete_missing')
+        if self.delete_missing and not self.upsert:
+            self.stderr.write(self.style.ERROR("--delete-missing requires --upsert"))
+            return
+        self.cell_counts = Counter()
+        started = time.monotonic()
 
         if dry_run:
             self.stdout.write(self.style.WARNING("DRY RUN - no changes will be made"))
@@ -247,6 +244,14 @@ class Command(BaseCommand):
             f"Done. Companies created: {created_companies}, "
             f"Companies updated: {updated_companies}, Failed: {failed}"
         ))
+        if self.upsert:
+            elapsed = time.monotonic() - started
+            processed = sum(self.cell_counts[k] for k in ("inserted", "updated", "unchanged"))
+            self.stdout.write(
+                f"Rows inserted: {self.cell_counts['inserted']}, updated: {self.cell_counts['updated']}, "
+                f"unchanged: {self.cell_counts['unchanged']}, deleted: {self.cell_counts['deleted']} "
+                f"({processed / elapsed if elapsed else 0:,.0f} rows/s over {elapsed:.1f}s)"
+            )
 
     def _preload_metrics(self, data, tickers_to_process, dry_run):
         # Preload metrics once per file to avoid burning the sequence with
@@ -259,8 +264,9 @@ class Command(BaseCommand):
             for statement in ['IS', 'BS', 'CF']:
                 for row in ticker_data.get(statement, [])[1:]:
                     if row and row[0] and row[0] not in ['Income Statement', 'Balance Sheet', 'Cash Flow']:
-                        if row[0] not in METRICS_NEVER_DISPLAYED:
-                            raw_metric_names.add(row[0])
+                        if row[0] not in NEVER_DISPLAYED:
+                            # Spelling variants are stored under one canonical metric.
+                            raw_metric_names.add(canonical_metric_name(row[0]))
 
         if not raw_metric_names:
             return {}
@@ -269,6 +275,7 @@ class Command(BaseCommand):
             FinancialMetric.objects.bulk_create(
                 [FinancialMetric(name=n) for n in raw_metric_names], ignore_conflicts=True
             )
+            bump_metric_names_version()
             metric_qs = FinancialMetric.objects.filter(name__in=raw_metric_names)
             return {m.name: m for m in metric_qs}
 
@@ -339,7 +346,7 @@ class Command(BaseCommand):
                     self.stderr.write(self.style.ERROR(f"  Failed to create company {ticker}: {e}"))
                     failed += 1
                     continue
-            elif not target_exchange and not OVERWRITE and company.financials.exists():
+            elif not self.upsert and not OVERWRITE and has_financials(company):
                 self.stdout.write(f"  Already has financials, skipping")
                 continue
             entries = []
@@ -366,9 +373,9 @@ class Command(BaseCommand):
                     metric_name = row[0]
                     if not metric_name or metric_name in ['Income Statement', 'Balance Sheet', 'Cash Flow']:
                         continue
-                    if metric_name in METRICS_NEVER_DISPLAYED:
+                    if metric_name in NEVER_DISPLAYED:
                         continue
-                    metric_obj = metric_map.get(metric_name)
+                    metric_obj = metric_map.get(canonical_metric_name(metric_name))
                     if not metric_obj:
                         continue
 
@@ -423,11 +430,27 @@ class Command(BaseCommand):
                             value=value,
                         ))
 
-            if entries:
+            if entries and self.upsert:
+                counts = upsert_financials(
+                    company, entries, delete_missing=self.delete_missing, dry_run=dry_run,
+                )
+                self.cell_counts.update(counts)
+                summary = ", ".join(f"{k} {v}" for k, v in counts.items())
+                if dry_run:
+                    self.stdout.write(f"  Would write: {summary}")
+                else:
+                    if counts["inserted"] or counts["updated"] or counts["deleted"]:
+                        rebuild_statement_tables(company)
+                        rebuild_metric_snapshots([company.pk])
+                        updated_companies += 1
+                    self.stdout.write(self.style.SUCCESS(f"  Upserted financial entries: {summary}"))
+            elif entries:
                 if dry_run:
                     self.stdout.write(f"  Would create {len(entries)} financial entries")
                 else:
-                    Financial.objects.bulk_create(entries, ignore_conflicts=True)
+                    store_financials(entries)
+                    rebuild_statement_tables(company)
+                    rebuild_metric_snapshots([company.pk])
                     self.stdout.write(self.style.SUCCESS(f"  Created {len(entries)} financial entries"))
                     updated_companies += 1
             else:
@@ -453,7 +476,8 @@ class Command(BaseCommand):
         return out
 
     def _pick_best_company(self, queryset):
-        rows = list(queryset.annotate(fin_count=Count("financials")))
+        relation = "packed_financials" if packed_storage() else "financials"
+        rows = list(queryset.annotate(fin_count=Count(relation)))
         if not rows:
             return None
         if len(rows) == 1:
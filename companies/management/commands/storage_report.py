@@ -0,0 +1,298 @@
+"""
+Where the bytes go: row counts and on-disk sizes per table, and the Financial /
+StockPrice footprint broken down per statement, metric, exchange and company.
+
+Sizes come from pg_table_size / pg_indexes_size (summed over partitions) on
+Postgres and the dbstat virtual table on SQLite. Per-statement, per-metric and
+per-company bytes are estimates: row counts times the table's average bytes per
+row, plus packed payload where the packed layouts are in use.
+
+The prune rules mirror prune_financial_metrics (ACTION_DROP metrics),
+build_revenue_prune_candidates (low-revenue companies) and, with
+--price-row-days, pruning daily StockPrice rows to a trailing window.
+"""
+import json
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import Length
+
+from companies.financial_store import relation_sizes
+from companies.management.commands.build_revenue_prune_candidates import revenue_prune_candidates
+from companies.metric_names import metric_names
+from companies.metric_taxonomy import ACTION_DROP, metric_table
+from companies.models import Company, Financial, PackedFinancial, PriceBlock, StockPrice
+
+
+def _mb(n):
+    return "n/a" if n is None else f"{n / 1024 / 1024:.2f} MB"
+
+
+def _row_count(table):
+    """(rows, estimated) — planner estimate on Postgres, where COUNT(*) means a full scan."""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT SUM(GREATEST(c.reltuples, 0))::bigint FROM pg_class c WHERE c.oid = to_regclass(%s) "
+                "OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))",
+                [table, table],
+            )
+            return cursor.fetchone()[0] or 0, True
+        cursor.execute(f"SELECT COUNT(*) FROM {quote(table)}")
+        return cursor.fetchone()[0], False
+
+
+def _child_tables():
+    """Partitions (and other inheritance children) on Postgres; their rows and bytes are counted in the parent."""
+    if connection.vendor != "postgresql":
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid")
+        return {name for (name,) in cursor.fetchall()}
+
+
+def table_stats():
+    """One entry per table in the database, largest first; partitions are folded into their parent."""
+    tables = []
+    children = _child_tables()
+    for name in connection.introspection.table_names():
+        if name in children:
+            continue
+        rows, estimated = _row_count(name)
+        tables.append({"table": name, "rows": rows, "rows_estimated": estimated, **relation_sizes(name)})
+    return sorted(tables, key=lambda t: (t["total_bytes"] or 0, t["rows"]), reverse=True)
+
+
+def _bytes_per_row(tables, model):
+    entry = next((t for t in tables if t["table"] == model._meta.db_table), None)
+    if not entry or not entry["rows"] or entry["total_bytes"] is None:
+        return None
+    return entry["total_bytes"] / entry["rows"]
+
+
+def _estimate(rows, per_row):
+    return None if per_row is None else int(rows * per_row)
+
+
+def build_report(top=20, max_revenue=500_000, large_cap_guard=5_000_000_000, price_row_days=None):
+    tables = table_stats()
+    fin_row = _bytes_per_row(tables, Financial)
+    price_row = _bytes_per_row(tables, StockPrice)
+
+    fin_by_company = Counter(dict(
+        Financial.objects.values("company_id").annotate(n=Count("pk")).values_list("company_id", "n").order_by()
+    ))
+    price_by_company = Counter(dict(
+        StockPrice.objects.values("company_id").annotate(n=Count("pk")).values_list("company_id", "n").order_by()
+    ))
+    packed_payload = Length("metric_ids") + Length("periods") + Length("values")
+    packed_by_company = Counter(dict(
+        PackedFinancial.objects.values("company_id").annotate(b=Sum(packed_payload))
+        .values_list("company_id", "b").order_by()
+    ))
+    blocks_by_company = Counter(dict(
+        PriceBlock.objects.values("company_id")
+        .annotate(b=Sum(Length("days") + Length("ohlc") + Length("volume")))
+        .values_list("company_id", "b").order_by()
+    ))
+
+    def company_bytes(company_id):
+        return (
+            (_estimate(fin_by_company[company_id], fin_row) or 0)
+            + (_estimate(price_by_company[company_id], price_row) or 0)
+            + packed_by_company[company_id] + blocks_by_company[company_id]
+        )
+
+    companies = {
+        c["id"]: c for c in Company.objects.values("id", "ticker", "exchange", "name")
+    }
+    company_ids = set(fin_by_company) | set(price_by_company) | set(packed_by_company) | set(blocks_by_company)
+    ranked = sorted(company_ids, key=company_bytes, reverse=True)
+
+    exchanges = defaultdict(lambda: {"companies": 0, "financial_rows": 0, "price_rows": 0, "bytes": 0})
+    for company_id, company in companies.items():
+        entry = exchanges[company["exchange"] or "(none)"]
+        entry["companies"] += 1
+        entry["financial_rows"] += fin_by_company[company_id]
+        entry["price_rows"] += price_by_company[company_id]
+        entry["bytes"] += company_bytes(company_id)
+
+    statements = {
+        st: {"statement": st, "rows": n, "bytes": _estimate(n, fin_row)}
+        for st, n in Financial.objects.values("statement").annotate(n=Count("pk")).values_list("statement", "n").order_by()
+    }
+    for st, payload in (
+        PackedFinancial.objects.values("statement").annotate(b=Sum(packed_payload))
+        .values_list("statement", "b").order_by()
+    ):
+        entry = statements.setdefault(st, {"statement": st, "rows": 0, "bytes": 0})
+        entry["bytes"] = (entry["bytes"] or 0) + (payload or 0)
+
+    names = metric_names()
+    fin_by_metric = Counter(dict(
+        Financial.objects.values("metric_id").annotate(n=Count("pk")).values_list("metric_id", "n").order_by()
+    ))
+
+    return {
+        "database": connection.vendor,
+        "tables": tables,
+        "statements": sorted(statements.values(), key=lambda s: s["rows"], reverse=True),
+        "metrics": {
+            "distinct": len(fin_by_metric),
+            "top": [
+                {"metric_id": m, "name": names.get(m, ""), "rows": n, "bytes": _estimate(n, fin_row)}
+                for m, n in fin_by_metric.most_common(top)
+            ],
+        },
+        "exchanges": sorted(
+            ({"exchange": ex, **v} for ex, v in exchanges.items()), key=lambda e: e["bytes"], reverse=True
+        ),
+        "companies": [
+            {
+                "ticker": companies[c]["ticker"] if c in companies else "",
+                "exchange": companies[c]["exchange"] if c in companies else "",
+                "financial_rows": fin_by_company[c],
+                "price_rows": price_by_company[c],
+                "bytes": company_bytes(c),
+            }
+            for c in ranked[:top]
+        ],
+        "prune_rules": prune_rules(
+            fin_by_company, price_by_company, fin_by_metric, fin_row, price_row, company_bytes,
+            max_revenue, large_cap_guard, price_row_days,
+        ),
+    }
+
+
+def prune_rules(fin_by_company, price_by_company, fin_by_metric, fin_row, price_row, company_bytes,
+                max_revenue, large_cap_guard, price_row_days):
+    """Estimated rows and bytes each candidate prune rule would free."""
+    rules = []
+
+    drop_ids = metric_table().ids_with(ACTION_DROP)
+    rows = sum(fin_by_metric[m] for m in drop_ids)
+    rules.append({
+        "rule": "drop_metrics",
+        "description": f"prune_financial_metrics: delete {len(drop_ids)} never-displayed metrics",
+        "companies": None,
+        "rows": rows,
+        "bytes": _estimate(rows, fin_row),
+    })
+
+    candidates, _, _ = revenue_prune_candidates(max_revenue, large_cap_guard)
+    ids = {row["company_id"] for row in candidates}
+    rules.append({
+        "rule": "low_revenue_companies",
+        "description": (
+            f"build_revenue_prune_candidates: companies with latest revenue < {max_revenue:,} "
+            f"(market cap guard {large_cap_guard:,})"
+        ),
+        "companies": len(ids),
+        "rows": sum(fin_by_company[c] + price_by_company[c] for c in ids),
+        "bytes": sum(company_bytes(c) for c in ids),
+    })
+
+    if price_row_days is not None:
+        cutoff = date.today() - timedelta(days=price_row_days)
+        rows = StockPrice.objects.filter(date__lt=cutoff).count()
+        rules.append({
+            "rule": "price_row_window",
+            "description": f"PRICE_ROW_DAYS={price_row_days}: StockPrice rows before {cutoff} (history kept in PriceBlock)",
+            "companies": None,
+            "rows": rows,
+            "bytes": _estimate(rows, price_row),
+        })
+    return rules
+
+
+def format_text(report):
+    lines = [f"Database: {report['database']}", "", "Tables (largest first):"]
+    lines.append(f"  {'table':<36} {'rows':>12} {'data':>12} {'indexes':>12} {'total':>12}")
+    for t in report["tables"]:
+        rows = f"~{t['rows']:,}" if t["rows_estimated"] else f"{t['rows']:,}"
+        lines.append(
+            f"  {t['table']:<36} {rows:>12} {_mb(t['table_bytes']):>12} "
+            f"{_mb(t['index_bytes']):>12} {_mb(t['total_bytes']):>12}"
+        )
+
+    lines += ["", "Financials per statement:"]
+    for s in report["statements"]:
+        lines.append(f"  {s['statement']:<4} {s['rows']:>12,} rows  {_mb(s['bytes']):>12}")
+
+    metrics = report["metrics"]
+    lines += ["", f"Top metrics by rows ({metrics['distinct']} distinct):"]
+    for m in metrics["top"]:
+        lines.append(f"  {m['rows']:>10,}  {_mb(m['bytes']):>12}  {m['name'] or m['metric_id']}")
+
+    lines += ["", "Per exchange:"]
+    for e in report["exchanges"]:
+        lines.append(
+            f"  {e['exchange']:<10} {e['companies']:>6} companies {e['financial_rows']:>12,} financial rows "
+            f"{e['price_rows']:>12,} price rows  {_mb(e['bytes']):>12}"
+        )
+
+    lines += ["", "Top companies by footprint:"]
+    for c in report["companies"]:
+        lines.append(
+            f"  {c['exchange'] + ':' + c['ticker']:<16} {c['financial_rows']:>10,} financial rows "
+            f"{c['price_rows']:>10,} price rows  {_mb(c['bytes']):>12}"
+        )
+
+    lines += ["", "Candidate prune rules (estimated savings):"]
+    for r in report["prune_rules"]:
+        scope = f"{r['companies']} companies, " if r["companies"] is not None else ""
+        lines.append(f"  {r['rule']}: {scope}{r['rows']:,} rows, {_mb(r['bytes'])}")
+        lines.append(f"      {r['description']}")
+    return "\n".join(lines)
+
+
+class Command(BaseCommand):
+    help = "Report row counts and storage per table, statement, metric, exchange and company, with prune savings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=['text', 'json'],
+            default='text',
+            help='Output format (default: text)',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help='Number of metrics and companies to list (default: 20)',
+        )
+        parser.add_argument(
+            '--max-revenue',
+            type=int,
+            default=500_000,
+            help='Revenue threshold for the low-revenue prune rule (default: 500000)',
+        )
+        parser.add_argument(
+            '--large-cap-guard',
+            type=int,
+            default=5_000_000_000,
+            help='Companies at/above this market cap are kept by the low-revenue rule (default: 5000000000)',
+        )
+        parser.add_argument(
+            '--price-row-days',
+            type=int,
+            default=None,
+            help='Also estimate pruning StockPrice rows older than N days',
+        )
+
+    def handle(self, *args, **options):
+        report = build_report(
+            top=options['top'],
+            max_revenue=options['max_revenue'],
+            large_cap_guard=options['large_cap_guard'],
+            price_row_days=options['price_row_days'],
+        )
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(format_text(report))
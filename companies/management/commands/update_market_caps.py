@@ -54,7 +54,7 @@ class Command(BaseCommand):
                     company.shares_outstanding = shares_outstanding
 
                 if changes:
-                    company.save(update_fields=['market_cap', 'shares_outstanding'])
+                    company.save(update_fields=['market_cap', 'shares_outstanding', 'updated_at'])
                     self.stdout.write(f"[{i}/{total}] {company.ticker}: {', '.join(changes)}")
                     updated += 1
                 else:
@@ -1,12 +1,44 @@
 from django.core.management.base import BaseCommand
-from companies.models import Company, StockPrice
+from companies.models import Company
+from companies.price_frames import frame_arrays
+from companies.price_store import latest_price_date, latest_price_dates, store_price_batch, store_prices
 from companies.utils import yfinance_symbol
 import yfinance as yf
 import pandas as pd
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
+import threading
 import time
 
 
+class RateLimiter:
+    """Spaces calls at least ``interval`` seconds apart across all worker threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next)
+            self._next = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def split_download(df, symbols):
+    """{symbol: frame} from a multi-symbol yf.download (columns grouped by ticker)."""
+    if df is None or df.empty:
+        return {}
+    if not isinstance(df.columns, pd.MultiIndex):
+        return {symbols[0]: df} if len(symbols) == 1 else {}
+    present = set(df.columns.get_level_values(0))
+    return {symbol: df[symbol] for symbol in symbols if symbol in present}
+
+
 class Command(BaseCommand):
     help = "Fetch historical stock prices from yfinance and save to database."
 
@@ -38,6 +70,23 @@ class Command(BaseCommand):
             default=3,
             help='Number of retries for failed requests (default: 3)'
         )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Download many symbols per yfinance call, concurrently, and write each batch in bulk'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Symbols per yfinance download in --batch mode (default: 100)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Concurrent downloads in --batch mode; --delay spaces their starts (default: 4)'
+        )
 
     def handle(self, *args, **options):
         ticker_filter = options.get('ticker')
@@ -53,11 +102,16 @@ class Command(BaseCommand):
                 return
         elif missing_only:
             # Only companies with no price data
-            companies = Company.objects.filter(prices__isnull=True).distinct()
+            companies = Company.objects.filter(prices__isnull=True, price_blocks__isnull=True).distinct()
             self.stdout.write(f"Found {companies.count()} companies with no price data")
         else:
             companies = Company.objects.all()
 
+        if options['batch']:
+            self.update_batched(companies, full_refresh, options['batch_size'], options['workers'])
+            return
+
+        companies = list(companies)
         for i, company in enumerate(companies):
             self.stdout.write(f"Processing {company.ticker}...")
 
@@ -68,16 +122,16 @@ class Command(BaseCommand):
                 self.stderr.write(self.style.ERROR(f"  {company.ticker}: failed - {e}"))
 
             # Rate limiting delay (skip for last item)
-            if self.delay > 0 and i < len(list(companies)) - 1:
+            if self.delay > 0 and i < len(companies) - 1:
                 time.sleep(self.delay)
 
     def fetch_prices(self, company, full_refresh):
         yf_full = yfinance_symbol(company.ticker, company.exchange)
 
         # Check if we need to fetch
-        last_price = StockPrice.objects.filter(company=company).order_by('-date').first()
-        if last_price and not full_refresh:
-            start_date = last_price.date + timedelta(days=1)
+        last_date = latest_price_date(company.pk)
+        if last_date and not full_refresh:
+            start_date = last_date + timedelta(days=1)
             if start_date >= date.today():
                 self.stdout.write(f"  {company.ticker}: already up to date")
                 return
@@ -114,20 +168,104 @@ class Command(BaseCommand):
         if isinstance(df.columns, pd.MultiIndex):
             df.columns = df.columns.get_level_values(0)
 
-        # Prepare records
-        records = []
-        for idx, row in df.iterrows():
-            price_date = idx.date() if hasattr(idx, 'date') else idx
-            records.append(StockPrice(
-                company=company,
-                date=price_date,
-                open=row['Open'],
-                high=row['High'],
-                low=row['Low'],
-                close=row['Close'],
-                volume=int(row['Volume'])
-            ))
-
-        # Bulk insert, ignore conflicts (duplicates)
-        StockPrice.objects.bulk_create(records, ignore_conflicts=True)
-        self.stdout.write(f"  {company.ticker}: added {len(records)} price records")
+        dates, ohlc, volume = frame_arrays(df)
+
+        # Existing days are kept (same as the old ignore_conflicts insert)
+        store_prices(company.pk, dates, ohlc, volume)
+        self.stdout.write(f"  {company.ticker}: added {len(dates)} price records")
+
+    def update_batched(self, companies, full_refresh, batch_size, workers):
+        """
+        Group companies by the first missing day (one grouped latest-date query), fetch
+        each group in multi-symbol downloads on a worker pool sharing a rate limiter,
+        and store every download's bars in one transaction.
+        """
+        companies = list(companies.only('id', 'ticker', 'exchange'))
+        latest = {} if full_refresh else latest_price_dates([c.pk for c in companies])
+        today = date.today()
+
+        groups = defaultdict(lambda: defaultdict(list))  # start -> symbol -> [company, ...]
+        up_to_date = 0
+        for company in companies:
+            last_date = latest.get(company.pk)
+            start = last_date + timedelta(days=1) if last_date else None
+            if start and start >= today:
+                up_to_date += 1
+                continue
+            groups[start][yfinance_symbol(company.ticker, company.exchange)].append(company)
+
+        chunks = []
+        for start, by_symbol in groups.items():
+            symbols = sorted(by_symbol)
+            chunks += [(start, symbols[i:i + batch_size]) for i in range(0, len(symbols), batch_size)]
+        self.stdout.write(
+            f"{len(companies)} companies: {up_to_date} up to date, "
+            f"{len(companies) - up_to_date} to fetch in {len(chunks)} downloads"
+        )
+
+        limiter = RateLimiter(self.delay)
+        stored = failed = no_data = bars = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = {
+                pool.submit(self.download_chunk, symbols, start, today, limiter): (start, symbols)
+                for start, symbols in chunks
+            }
+            # Writes stay on this thread (and its DB connection); workers only download.
+            for future in as_completed(futures):
+                start, symbols = futures[future]
+                chunk_companies = sum(len(groups[start][symbol]) for symbol in symbols)
+                try:
+                    frames = future.result()
+                except Exception as e:
+                    failed += chunk_companies
+                    self.stderr.write(self.style.ERROR(f"  download of {len(symbols)} symbols failed - {e}"))
+                    continue
+                # A bad batch (unstorable prices, DB error) is skipped like a failed ticker in the
+                # sequential path; store_price_batch's transaction leaves nothing half-written.
+                try:
+                    batch = {}
+                    for symbol, frame in frames.items():
+                        arrays = frame_arrays(frame)
+                        if not len(arrays[0]):
+                            continue
+                        for company in groups[start][symbol]:
+                            batch[company.pk] = arrays
+                    store_price_batch(batch)
+                except Exception as e:
+                    failed += chunk_companies
+                    self.stderr.write(self.style.ERROR(f"  storing {len(symbols)} symbols from {symbols[0]} failed - {e}"))
+                    continue
+                # Symbols the download returned no bars for (delisted, or nothing new yet).
+                no_data += chunk_companies - len(batch)
+                stored += len(batch)
+                bars += sum(len(dates) for dates, _, _ in batch.values())
+                self.stdout.write(
+                    f"  [{stored + failed + no_data}/{len(companies) - up_to_date}] stored {len(batch)} companies"
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {bars} price records for {stored} companies, {no_data} with no data, {failed} failed, "
+            f"{up_to_date} up to date, in {time.monotonic() - started:.1f}s."
+        ))
+
+    def download_chunk(self, symbols, start, end, limiter):
+        """One rate-limited multi-symbol download with retries; returns {symbol: frame}."""
+        for attempt in range(self.retries):
+            limiter.wait()
+            try:
+                if start:
+                    df = yf.download(
+                        symbols, start=start.isoformat(), end=end.isoformat(), group_by='ticker',
+                        progress=False, auto_adjust=True, threads=False,
+                    )
+                else:
+                    df = yf.download(
+                        symbols, period="max", group_by='ticker', progress=False, auto_adjust=True, threads=False,
+                    )
+                return split_download(df, symbols)
+            except Exception:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep((attempt + 1) * 2)  # Exponential backoff
+        return {}
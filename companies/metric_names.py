@@ -0,0 +1,79 @@
+"""
+Per-process FinancialMetric id <-> name dictionary.
+
+FinancialMetric is small (a few thousand rows) and effectively append-only, so hot
+read paths select ``metric_id`` and resolve names here instead of joining
+companies_financialmetric for every Financial row.
+
+The dictionary reloads when:
+- the version stamp in the cache changes: the signal handlers below bump it whenever
+  a metric is saved or deleted through the ORM (renames, merges, prunes), and
+  ``bump_metric_names_version()`` is called after ``bulk_create`` (which sends no
+  signals). The stamp is only seen by other processes if CACHES is a shared
+  backend; with the default per-process LocMemCache it is local, so
+- it is older than RELOAD_SECONDS, which bounds how long another process's rename
+  or delete goes unnoticed, or
+- it is asked about an id or name it doesn't know. That reloads once; ids and names
+  still missing afterwards are remembered as absent and don't reload again until the
+  next stamp change or expiry.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from companies.models import FinancialMetric
+
+VERSION_KEY = "financial-metric-names:version"
+RELOAD_SECONDS = 300
+
+_lock = threading.Lock()
+_names = {}
+_ids = {}
+_absent = set()  # ids and names missing after a reload
+_version = None
+_loaded_at = None
+
+
+def _reload(version, keep_absent=False):
+    global _names, _ids, _version, _loaded_at
+    with _lock:
+        names = dict(FinancialMetric.objects.values_list("id", "name"))
+        _names, _ids, _version, _loaded_at = names, {n: i for i, n in names.items()}, version, time.monotonic()
+        if not keep_absent:
+            _absent.clear()
+
+
+def _refresh(keys, known):
+    """Reload if stale, or once for keys neither loaded nor known to be absent."""
+    version = cache.get(VERSION_KEY)
+    if version != _version or _loaded_at is None or time.monotonic() - _loaded_at > RELOAD_SECONDS:
+        _reload(version)
+    elif any(k not in known() and k not in _absent for k in keys):
+        _reload(version, keep_absent=True)
+    _absent.update(k for k in keys if k not in known())
+
+
+def metric_names(ids=()):
+    """Return the id -> name dict, reloading it first if stale or missing any of ``ids``."""
+    _refresh(list(ids), lambda: _names)
+    return _names
+
+
+def metric_ids(names):
+    """Return the ids of the given metric names; names not in the database are skipped."""
+    names = list(names)
+    _refresh(names, lambda: _ids)
+    return [_ids[n] for n in names if n in _ids]
+
+
+def bump_metric_names_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+@receiver(post_save, sender=FinancialMetric)
+@receiver(post_delete, sender=FinancialMetric)
+def _financial_metric_changed(sender, **kwargs):
+    bump_metric_names_version()
@@ -0,0 +1,216 @@
+"""
+Single registry of the per-metric display rules, shared by the statement pipeline
+(companies.statements), ingest (save_cached_financials) and the pruner
+(prune_financial_metrics), plus the spelling aliases applied before storage.
+
+The rule lists are compiled once into METRIC_RULES (raw name -> action, target),
+and on demand into MetricTable, arrays indexed by FinancialMetric.id, so per-row
+checks on metric_id are a single array lookup.
+"""
+import numpy as np
+
+from companies.metric_names import metric_names
+
+SUM_METRICS = [
+    "Gross Profit",
+    "Operating Profit",
+    "Pre-Tax Income",
+    "Net Income",
+    "Total Current Assets",
+    "Total Assets",
+    "Total Current Liabilities",
+    "Total Liabilities",
+    "Shareholders' Equity",
+    "Total Shareholders' Equity",
+    "Total Common Equity",
+    "Total Common Shareholders' Equity",
+    "Liabilities & Equity",
+    "Total Liabilities And Equity",
+    "Total Liabilities and Shareholders' Equity",
+    "Cash From Operations",
+    "Cash From Investing",
+    "Cash From Financing",
+]
+
+# Fiscal data display transformations (display only, not stored)
+FISCAL_METRIC_RENAMES = {
+    "Total Revenues": "Revenue",
+    "Cost of Goods Sold, Total": "Cost of Goods Sold",
+    "Amort. of Goodwill & Intang. Assets": "Amortization",
+    "Amortization of Goodwill and Intangible Assets": "Amortization",
+    "Selling, General & Administrative Expenses": "SG&A",
+    "Selling General & Admin Expenses, Total": "SG&A",
+    "Other Operating Expenses, Total": "Other Operating Expenses",
+    "Net Interest Expenses": "Net Interest Expense",
+    "EBT, Incl. Unusual Items": "Profit Before Tax",
+    "Weighted Avg. Shares Outstanding": "Basic Avg. Shares Outstanding",
+    "Weighted Avg. Shares Outstanding Dil": "Diluted Avg. Shares Outstanding",
+    "Net Property Plant And Equipment": "Property, Plant & Equipment",
+    "Net Property, Plant & Equipment": "Property, Plant & Equipment",
+}
+
+FISCAL_METRICS_DROP = [
+    "Total Revenues % Chg.",
+    "Total Revenues %Chg",
+    "Operating Margin",
+    "Interest Expense",
+    "Interest Expense, Total",
+    "Interest And Invest. Income",
+    "Interest And Investment Income",
+    "Interest and Investment Income",
+    "Gross Profit Margin",
+    "Earnings From Continuing Operations",
+    "Net Income to Common Excl. Extra Items",
+    "Net Income to Common Incl Extra Items",
+    "Total Shares Outstanding",
+    "EBT, Excl. Unusual Items",
+    "Basic EPS",
+    "Diluted EPS",
+    "EPS",
+    "EPS Diluted",
+    "Basic Weighted Average Shares Outstanding",
+    "Diluted Weighted Average Shares Outstanding",
+    "EBITDA",
+    "Effective Tax Rate",
+    "Gross Property Plant And Equipment",
+    "Accumulated Depreciation",
+]
+
+# Metrics to combine into other metrics (source -> target)
+FISCAL_METRICS_COMBINE = {
+    "Provision for Bad Debts": "Other Operating Expenses",
+    # Equity investment income into Other Non Operating
+    "(Income) Loss on Equity Invest.": "Other Non Operating Income (Expenses)",
+    "Income (Loss) On Equity Invest.": "Other Non Operating Income (Expenses)",
+    "Income (Loss) on Equity Invest.": "Other Non Operating Income (Expenses)",
+}
+
+# Metrics that roll up into "Exceptional Items" (expandable)
+EXCEPTIONAL_ITEMS_METRICS = [
+    "Restructuring Charges",
+    "Merger & Related Restructuring Charges",
+    "Total Merger & Related Restructuring Charges",
+    "Impairment of Goodwill",
+    "Impairment of Oil, Gas & Mineral Properties",
+    "Gain (Loss) On Sale Of Assets",
+    "Gain (Loss) on Sale of Assets",
+    "Gain (Loss) on Sale of Assets, Total",
+    "Asset Writedown",
+    "Other Unusual Items",
+    "Legal Settlements",
+    "In Process R&D Expenses",
+    "Gain (Loss) On Sale Of Investments",
+    "Gain (Loss) on Sale of Investments",
+    "Gain (Loss) on Sale of Investments, Total",
+    "Gain (Loss) on Sale of Invest. & Securities",
+    "Gain (Loss) on Sale of Investment, Total",
+]
+
+# Source metric for Profit Before Tax, re-inserted after the exceptional items block
+FISCAL_PBT_METRIC = "EBT, Incl. Unusual Items"
+
+# Never rendered, so never stored at ingest and deleted by prune_financial_metrics
+NEVER_DISPLAYED = frozenset(FISCAL_METRICS_DROP)
+
+# Spellings of the same line item -> the one name stored. Applied at ingest (canonical_metric_name)
+# and to existing rows by merge_metric_aliases. Sign-flipped lines such as
+# "(Income) Loss on Equity Invest." are different items and stay in FISCAL_METRICS_COMBINE.
+METRIC_ALIASES = {
+    "Gain (Loss) On Sale Of Assets": "Gain (Loss) on Sale of Assets",
+    "Gain (Loss) on Sale of Assets, Total": "Gain (Loss) on Sale of Assets",
+    "Gain (Loss) On Sale Of Investments": "Gain (Loss) on Sale of Investments",
+    "Gain (Loss) on Sale of Investments, Total": "Gain (Loss) on Sale of Investments",
+    "Gain (Loss) on Sale of Investment, Total": "Gain (Loss) on Sale of Investments",
+    "Income (Loss) On Equity Invest.": "Income (Loss) on Equity Invest.",
+    "Total Merger & Related Restructuring Charges": "Merger & Related Restructuring Charges",
+    "Amortization of Goodwill and Intangible Assets": "Amort. of Goodwill & Intang. Assets",
+    "Selling General & Admin Expenses, Total": "Selling, General & Administrative Expenses",
+    "Net Property Plant And Equipment": "Net Property, Plant & Equipment",
+}
+
+SUM_ROWS = frozenset(SUM_METRICS)
+
+ACTION_KEEP = 0
+ACTION_DROP = 1
+ACTION_COMBINE = 2
+ACTION_EXCEPTIONAL = 3
+ACTION_PBT = 4
+
+
+def _compile_rules():
+    """Raw metric name -> (action, target). Later rules win: combine > exceptional > PBT > drop."""
+    rules = {}
+    for name in FISCAL_METRICS_DROP:
+        rules[name] = (ACTION_DROP, None)
+    rules[FISCAL_PBT_METRIC] = (ACTION_PBT, None)
+    for name in EXCEPTIONAL_ITEMS_METRICS:
+        rules[name] = (ACTION_EXCEPTIONAL, None)
+    for name, target in FISCAL_METRICS_COMBINE.items():
+        rules[name] = (ACTION_COMBINE, target)
+    return rules
+
+
+METRIC_RULES = _compile_rules()
+
+
+def _fold(name):
+    return "".join(name.split()).casefold()
+
+
+def _compile_spellings():
+    """Case/whitespace-folded name -> canonical spelling, for every name the registry knows."""
+    known = [
+        *METRIC_ALIASES.values(), *METRIC_ALIASES, *SUM_METRICS, *FISCAL_METRIC_RENAMES,
+        *FISCAL_METRICS_DROP, *FISCAL_METRICS_COMBINE, *EXCEPTIONAL_ITEMS_METRICS, FISCAL_PBT_METRIC,
+    ]
+    spellings = {}
+    for name in known:
+        spellings.setdefault(_fold(name), METRIC_ALIASES.get(name, name))
+    return spellings
+
+
+_SPELLINGS = _compile_spellings()
+
+
+def canonical_metric_name(name):
+    """The stored name for a raw metric name: METRIC_ALIASES, then known names matched ignoring case and spacing."""
+    name = METRIC_ALIASES.get(name, name)
+    return _SPELLINGS.get(_fold(name), name)
+
+
+class MetricTable:
+    """
+    The rules compiled against the current FinancialMetric rows.
+
+    action:  int8 ACTION_* per metric id (ACTION_KEEP for unknown ids)
+    target:  display name per id (rename target, or the combine target for ACTION_COMBINE)
+    sum_row: whether the id's display row is rendered as a subtotal
+    """
+    __slots__ = ("action", "target", "sum_row")
+
+    def __init__(self, names):
+        size = max(names, default=0) + 1
+        self.action = np.zeros(size, dtype=np.int8)
+        self.target = np.full(size, None, dtype=object)
+        self.sum_row = np.zeros(size, dtype=bool)
+        for metric_id, name in names.items():
+            action, target = METRIC_RULES.get(name, (ACTION_KEEP, None))
+            self.action[metric_id] = action
+            self.target[metric_id] = target if action == ACTION_COMBINE else FISCAL_METRIC_RENAMES.get(name, name)
+            self.sum_row[metric_id] = self.target[metric_id] in SUM_ROWS
+
+    def ids_with(self, action):
+        return np.flatnonzero(self.action == action).tolist()
+
+
+_table = None
+_table_names = None
+
+
+def metric_table():
+    """The MetricTable for the current metric dictionary, recompiled whenever that reloads."""
+    global _table, _table_names
+    names = metric_names()
+    if names is not _table_names:
+        _table, _table_names = MetricTable(names), names
+    return _table
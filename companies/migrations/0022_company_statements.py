@@ -0,0 +1,22 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0021_value_bigint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyStatements',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statements', serialize=False, to='companies.company')),
+                ('tables', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
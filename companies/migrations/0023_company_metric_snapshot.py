@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0022_company_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyMetricSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_end_date', models.DateField()),
+                ('revenue', models.BigIntegerField(null=True)),
+                ('gross_profit', models.BigIntegerField(null=True)),
+                ('operating_income', models.BigIntegerField(null=True)),
+                ('net_income', models.BigIntegerField(null=True)),
+                ('operating_cash_flow', models.BigIntegerField(null=True)),
+                ('capex', models.BigIntegerField(null=True)),
+                ('free_cash_flow', models.BigIntegerField(null=True)),
+                ('total_assets', models.BigIntegerField(null=True)),
+                ('total_liabilities', models.BigIntegerField(null=True)),
+                ('total_equity', models.BigIntegerField(null=True)),
+                ('shares', models.BigIntegerField(null=True)),
+                ('gross_margin', models.FloatField(null=True)),
+                ('operating_margin', models.FloatField(null=True)),
+                ('net_margin', models.FloatField(null=True)),
+                ('fcf_margin', models.FloatField(null=True)),
+                ('revenue_growth', models.FloatField(null=True)),
+                ('roe', models.FloatField(null=True)),
+                ('roa', models.FloatField(null=True)),
+                ('liabilities_to_equity', models.FloatField(null=True)),
+                ('eps', models.FloatField(null=True)),
+                ('fcf_per_share', models.FloatField(null=True)),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='metric_snapshots', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'period_end_date'), name='uniq_snapshot_company_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0023_company_metric_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackedFinancial',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statement', models.CharField(choices=[('IS', 'Income Statement'), ('BS', 'Balance Sheet'), ('CF', 'Cash Flow')], max_length=2)),
+                ('metric_ids', models.BinaryField()),
+                ('periods', models.BinaryField()),
+                ('values', models.BinaryField()),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='packed_financials', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'statement'), name='uniq_packed_company_statement')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 02:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0024_packed_financial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBlock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.SmallIntegerField()),
+                ('days', models.BinaryField()),
+                ('ohlc', models.BinaryField()),
+                ('volume', models.BinaryField()),
+                ('decimals', models.SmallIntegerField()),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_blocks', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'year'), name='uniq_company_year_price_block')],
+            },
+        ),
+    ]
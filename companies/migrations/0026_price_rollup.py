@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('companies', '0025_price_block'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('freq', models.CharField(choices=[('W', 'Weekly'), ('M', 'Monthly')], max_length=1)),
+                ('period_start', models.DateField()),
+                ('last_date', models.DateField()),
+                ('open', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('high', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('low', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('close', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('volume', models.BigIntegerField()),
+                ('company', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_rollups', to='companies.company')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('company', 'freq', 'period_start'), name='uniq_company_freq_price_rollup')],
+            },
+        ),
+    ]
@@ -42,6 +42,13 @@ class Company(models.Model):
         """
         :param financials_dict: {'IS': [['', '2015', '2016', ...], ['Revenue', '43.1', '45.6', ...], ...], 'BS': ...}
         """
+        # Local imports: these modules import companies.models.
+        from companies.financial_store import store_financials
+        from companies.metric_names import bump_metric_names_version
+        from companies.metric_taxonomy import canonical_metric_name
+        from companies.snapshots import rebuild_metric_snapshots
+        from companies.statements import rebuild_statement_tables
+
         self.FYE_month = self.FYE_month or fye_month
         print(self.FYE_month)
         assert self.FYE_month
@@ -50,20 +57,21 @@ class Company(models.Model):
         ttm_is_fy = (financials_dict["IS"][1][-1] == financials_dict["IS"][1][-2] and
                      financials_dict["CF"][1][-1] == financials_dict["CF"][1][-2])
 
-        # Build metric lookup (bulk get-or-create)
+        # Build metric lookup (bulk get-or-create), storing spelling variants under one canonical name
         all_metric_names = {
-            line[0] for _, data in financials_dict.items() for line in data[1:] if line[0]
+            canonical_metric_name(line[0]) for _, data in financials_dict.items() for line in data[1:] if line[0]
         }
         FinancialMetric.objects.bulk_create(
             [FinancialMetric(name=n) for n in all_metric_names], ignore_conflicts=True
         )
+        bump_metric_names_version()
         metric_map = {m.name: m for m in FinancialMetric.objects.filter(name__in=all_metric_names)}
 
         entries = []
         for statement, data in financials_dict.items():
             years = data[0]
             for line in data[1:]:
-                metric_name = line[0]
+                metric_name = canonical_metric_name(line[0]) if line[0] else line[0]
                 metric_obj = metric_map.get(metric_name)
                 if not metric_obj:
                     continue
@@ -110,7 +118,9 @@ class Company(models.Model):
                     #     print(e)
 
 
-        Financial.objects.bulk_create(entries, ignore_conflicts=True)
+        store_financials(entries)
+        rebuild_statement_tables(self)
+        rebuild_metric_snapshots([self.pk])
 
 
 class Follow(models.Model):
@@ -233,6 +243,81 @@ class Financial(models.Model):
         return f"{self.company.ticker} {self.period_end_date} {self.metric.name} {self.value}"
 
 
+class CompanyStatements(models.Model):
+    """Pre-pivoted IS/BS/CF display tables, rebuilt whenever the company's financials are written."""
+    company = models.OneToOneField(Company, on_delete=models.CASCADE, primary_key=True, related_name="statements")
+    tables = models.JSONField(default=dict)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.company.ticker} statements ({self.built_at})"
+
+
+class PackedFinancial(models.Model):
+    """
+    Compact alternative to Financial rows (settings.FINANCIAL_STORAGE = "packed"):
+    one record per (company, statement) holding a metric x period int64 value matrix.
+    Encoding and the read/write adapter live in companies.financial_store.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="packed_financials", db_index=False)
+    statement = models.CharField(max_length=2, choices=Financial.STATEMENT_CHOICES)
+    metric_ids = models.BinaryField()  # int32[m]
+    periods = models.BinaryField()  # int32[p], days since 1970-01-01
+    values = models.BinaryField()  # int64[m, p] row-major; MISSING sentinel for empty cells
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["company", "statement"], name="uniq_packed_company_statement")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.company.ticker} {self.statement} (packed)"
+
+
+class CompanyMetricSnapshot(models.Model):
+    """
+    Derived figures and ratios per company and period, precomputed at ingest
+    (companies.snapshots) so the detail page and screener don't re-derive them
+    from companies_financial. Ratios are fractions (0.25 = 25%), NULL when undefined.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="metric_snapshots", db_index=False)
+    period_end_date = models.DateField()
+
+    revenue = models.BigIntegerField(null=True)
+    gross_profit = models.BigIntegerField(null=True)
+    operating_income = models.BigIntegerField(null=True)
+    net_income = models.BigIntegerField(null=True)
+    operating_cash_flow = models.BigIntegerField(null=True)
+    capex = models.BigIntegerField(null=True)
+    free_cash_flow = models.BigIntegerField(null=True)
+    total_assets = models.BigIntegerField(null=True)
+    total_liabilities = models.BigIntegerField(null=True)
+    total_equity = models.BigIntegerField(null=True)
+    shares = models.BigIntegerField(null=True)
+
+    gross_margin = models.FloatField(null=True)
+    operating_margin = models.FloatField(null=True)
+    net_margin = models.FloatField(null=True)
+    fcf_margin = models.FloatField(null=True)
+    revenue_growth = models.FloatField(null=True)
+    roe = models.FloatField(null=True)
+    roa = models.FloatField(null=True)
+    liabilities_to_equity = models.FloatField(null=True)
+    eps = models.FloatField(null=True)
+    fcf_per_share = models.FloatField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "period_end_date"],
+                name="uniq_snapshot_company_period"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.company.ticker} {self.period_end_date} snapshot"
+
+
 class StockPrice(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="prices")
     date = models.DateField()
@@ -256,6 +341,58 @@ class StockPrice(models.Model):
         return f"{self.company.ticker} {self.date} {self.close}"
 
 
+class PriceBlock(models.Model):
+    """
+    One company-year of daily OHLCV in packed arrays (companies.price_store):
+    day offsets from 1 January, OHLC as int32 scaled by 10**decimals, volume as int64.
+    Roughly a tenth of the size of the equivalent StockPrice rows.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="price_blocks", db_index=False)
+    year = models.SmallIntegerField()
+    days = models.BinaryField()  # uint16[n], sorted
+    ohlc = models.BinaryField()  # int32[4, n] row-major: open, high, low, close
+    volume = models.BinaryField()  # int64[n]
+    decimals = models.SmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["company", "year"], name="uniq_company_year_price_block")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.company.ticker} {self.year} prices"
+
+
+class PriceRollup(models.Model):
+    """
+    Weekly or monthly OHLCV bar resampled from the daily prices (companies.price_store),
+    kept current by update_prices. period_start is the Monday or the 1st; last_date is
+    the last trading day folded in, so the trailing bar may be partial.
+    """
+    FREQ_CHOICES = {
+        "W": "Weekly",
+        "M": "Monthly",
+    }
+
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="price_rollups", db_index=False)
+    freq = models.CharField(max_length=1, choices=FREQ_CHOICES)
+    period_start = models.DateField()
+    last_date = models.DateField()
+    open = models.DecimalField(max_digits=12, decimal_places=4)
+    high = models.DecimalField(max_digits=12, decimal_places=4)
+    low = models.DecimalField(max_digits=12, decimal_places=4)
+    close = models.DecimalField(max_digits=12, decimal_places=4)
+    volume = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["company", "freq", "period_start"], name="uniq_company_freq_price_rollup")
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.company.ticker} {self.freq} {self.period_start} {self.close}"
+
+
 class Note(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notes")
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="notes")
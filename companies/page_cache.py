@@ -0,0 +1,40 @@
+"""
+Versioned cache for the rendered company page.
+
+A company's data version is its `updated_at` stamp: any full `save()` bumps it via
+auto_now, and ingest commands bump it explicitly (`touch_companies`, or by including
+"updated_at" in `update_fields`). Cache keys embed the version, so a write simply
+orphans the old entries rather than having to find and delete them.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from companies.models import Company
+from companies.slug_cache import company_slugs
+
+
+def company_page_version(company):
+    return f"{company.updated_at.timestamp():.6f}"
+
+
+def company_page_key(company):
+    return f"company-page:{company.exchange}-{company.ticker}:{company_page_version(company)}"
+
+
+def get_cached_page(company):
+    if not settings.COMPANY_PAGE_CACHE_SECONDS:
+        return None
+    return cache.get(company_page_key(company))
+
+
+def set_cached_page(company, content):
+    if settings.COMPANY_PAGE_CACHE_SECONDS:
+        cache.set(company_page_key(company), content, settings.COMPANY_PAGE_CACHE_SECONDS)
+
+
+def touch_companies(company_ids):
+    """Bump the data version of the given companies, invalidating their cached pages."""
+    company_slugs.forget(company_ids)
+    return Company.objects.filter(pk__in=company_ids).update(updated_at=timezone.now())
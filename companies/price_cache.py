@@ -0,0 +1,134 @@
+"""
+Cache for the yfinance chart columns behind intraday_prices, keyed by (symbol, period).
+
+Freshness follows the market: while the company's exchange (LSE or US) is in
+session, entries are fresh for a minute or two for intraday periods and longer
+for daily and weekly bars; outside the session nothing changes, so they stay
+fresh until the next open.
+
+Past that point an entry is still served for PRICE_CACHE_STALE_SECONDS while one
+background refresh replaces it (stale-while-revalidate). Concurrent misses for
+the same key in a process wait on a single yfinance call, and a cache lock keeps
+other processes from starting duplicate refreshes.
+"""
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, time as dtime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+
+from companies.utils import normalize_exchange
+
+# (timezone, open, close) of the regular session, Monday to Friday. Holidays are not
+# modelled: on those days entries just expire on the in-session schedule.
+LONDON = (ZoneInfo("Europe/London"), dtime(8, 0), dtime(16, 30))
+NEW_YORK = (ZoneInfo("America/New_York"), dtime(9, 30), dtime(16, 0))
+SESSIONS = {"LSE": LONDON, "AIM": LONDON}
+
+# Seconds an entry stays fresh while the market is open (or settling after the close).
+OPEN_TTL = {"1d": 60, "5d": 120, "1m": 300, "6m": 900, "1y": 900, "5y": 3600, "max": 3600}
+DEFAULT_OPEN_TTL = 300
+
+# Quotes arrive delayed, so the session's last bars can land this long after the close.
+SETTLE = timedelta(minutes=20)
+
+WAIT_SECONDS = 30  # how long a waiter blocks on another request's fetch
+REFRESH_LOCK_SECONDS = 30
+
+_inflight = {}  # cache key -> Future of the fetch in progress in this process
+_inflight_lock = threading.Lock()
+
+
+def _session(exchange):
+    return SESSIONS.get(normalize_exchange(exchange), NEW_YORK)
+
+
+def market_open(exchange, now=None):
+    tz, open_at, close_at = _session(exchange)
+    local = (now or datetime.now(tz)).astimezone(tz)
+    return local.weekday() < 5 and open_at <= local.time() < close_at
+
+
+def next_open(exchange, now=None):
+    """Start of the next regular session strictly after ``now`` (an aware datetime)."""
+    tz, open_at, _ = _session(exchange)
+    local = (now or datetime.now(tz)).astimezone(tz)
+    day = local.date()
+    while True:
+        start = datetime.combine(day, open_at, tzinfo=tz)
+        if start > local and start.weekday() < 5:
+            return start
+        day += timedelta(days=1)
+
+
+def fresh_seconds(exchange, period, now=None):
+    """How long a payload fetched at ``now`` stays fresh."""
+    now = now or datetime.now(ZoneInfo("UTC"))
+    if market_open(exchange, now) or market_open(exchange, now - SETTLE):
+        return OPEN_TTL.get(period, DEFAULT_OPEN_TTL)
+    return max(int((next_open(exchange, now) - now).total_seconds()), DEFAULT_OPEN_TTL)
+
+
+def _key(symbol, period):
+    return f"price-columns:{symbol}:{period}"
+
+
+def _spawn(fn):
+    threading.Thread(target=fn, daemon=True).start()
+
+
+def _fetch(key, exchange, period, fetch):
+    """Run ``fetch`` once per key in this process; concurrent callers share its result."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result(timeout=WAIT_SECONDS)
+
+    try:
+        payload = fetch()
+        fresh = fresh_seconds(exchange, period)
+        cache.set(
+            key,
+            {"payload": payload, "fresh_until": time.time() + fresh},
+            fresh + settings.PRICE_CACHE_STALE_SECONDS,
+        )
+        future.set_result(payload)
+        return payload
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _revalidate(key, exchange, period, fetch):
+    if not cache.add(f"{key}:refreshing", 1, REFRESH_LOCK_SECONDS):
+        return
+
+    def run():
+        try:
+            _fetch(key, exchange, period, fetch)
+        except Exception:
+            pass  # keep serving the stale copy; the next request past the lock retries
+        finally:
+            cache.delete(f"{key}:refreshing")
+
+    _spawn(run)
+
+
+def cached_chart(symbol, exchange, period, fetch):
+    """Chart payload for (symbol, period); ``fetch()`` builds it from yfinance on a miss."""
+    key = _key(symbol, period)
+    entry = cache.get(key)
+    if entry is None:
+        return _fetch(key, exchange, period, fetch)
+    if entry["fresh_until"] <= time.time():
+        _revalidate(key, exchange, period, fetch)
+    return entry["payload"]
@@ -0,0 +1,129 @@
+"""
+Column-wise conversion of price data for the chart endpoint and the price loaders.
+
+yfinance frames and load_prices()/load_rollups() series go through numpy column
+arrays only: timestamps become epoch seconds or days in one conversion, and the
+chart columns and StockPrice insert tuples are built from ``tolist()`` columns.
+The columns are what the price cache stores and what ``?format=columnar`` serves;
+the default point-list payload (ISO dates, per-bar volume colours from one
+comparison) is expanded from them. Nothing walks a DataFrame row by row.
+scripts/benchmark_price_frames.py compares this with the old iterrows() code.
+"""
+import numpy as np
+
+OHLC_COLUMNS = ["Open", "High", "Low", "Close"]
+UP_COLOR = "#26a69a"
+DOWN_COLOR = "#ef5350"
+
+
+def _complete(df):
+    """Rows with all four prices; yfinance leaves some (e.g. the current bar) blank."""
+    return df.dropna(subset=OHLC_COLUMNS)
+
+
+def _ohlc(df):
+    return df[OHLC_COLUMNS].to_numpy(dtype=np.float64).T
+
+
+def _volume(df):
+    return df["Volume"].fillna(0).to_numpy(dtype=np.int64)
+
+
+def _local_days(index):
+    """Exchange-local calendar days of a (possibly tz-aware) DatetimeIndex as datetime64[D]."""
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    return index.values.astype("datetime64[D]")
+
+
+def frame_arrays(df):
+    """(dates datetime64[D], ohlc float[4, n], volume int[n]) from a yfinance OHLCV frame."""
+    df = _complete(df)
+    return _local_days(df.index), _ohlc(df), _volume(df)
+
+
+def _times(index, intraday):
+    """Unix seconds for intraday bars, days since 1970-01-01 otherwise."""
+    if not intraday:
+        return _local_days(index).astype(np.int64)
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.values.astype("datetime64[s]").astype(np.int64)
+
+
+def _columns(times, unit, ohlc, volume):
+    ohlc = np.asarray(ohlc, dtype=np.float64)
+    opens, highs, lows, closes = ohlc.tolist()
+    return {
+        "unit": unit,
+        "t": np.asarray(times, dtype=np.int64).tolist(),
+        "o": opens,
+        "h": highs,
+        "l": lows,
+        "c": closes,
+        "v": np.asarray(volume, dtype=np.int64).tolist(),
+    }
+
+
+def frame_columns(df, intraday=False):
+    """
+    Chart columns for a yfinance history() frame: "t" in "unit" ("s" for Unix seconds,
+    "d" for days since 1970-01-01), "o"/"h"/"l"/"c" prices and "v" volume.
+    """
+    df = _complete(df)
+    return _columns(_times(df.index, intraday), "s" if intraday else "d", _ohlc(df), _volume(df))
+
+
+def series_columns(series):
+    """Chart columns for a price_store series (load_prices, load_rollups or resample)."""
+    return _columns(
+        series["date"].astype(np.int64), "d",
+        [series["open"], series["high"], series["low"], series["close"]], series["volume"],
+    )
+
+
+def chart_payload(columns):
+    """{"price_data", "volume_data"} point lists for Lightweight Charts."""
+    t = np.asarray(columns["t"], dtype=np.int64)
+    times = (np.datetime_as_string(t.astype("datetime64[D]"), unit="D") if columns["unit"] == "d" else t).tolist()
+    up = np.asarray(columns["c"], dtype=np.float64) >= np.asarray(columns["o"], dtype=np.float64)
+    colors = np.where(up, UP_COLOR, DOWN_COLOR).tolist()
+    return {
+        "price_data": [
+            {"time": t, "open": o, "high": h, "low": l, "close": c}
+            for t, o, h, l, c in zip(times, columns["o"], columns["h"], columns["l"], columns["c"])
+        ],
+        "volume_data": [
+            {"time": t, "value": v, "color": color}
+            for t, v, color in zip(times, columns["v"], colors)
+        ],
+    }
+
+
+def columnar_payload(columns, delta=False):
+    """
+    The ?format=columnar response: the columns as they are, or with "t" delta-encoded
+    (first time, then gaps), which keeps long daily histories to one or two digits a bar.
+    """
+    payload = {"format": "columnar", "delta": delta, **columns}
+    if delta and columns["t"]:
+        payload["t"] = np.diff(columns["t"], prepend=0).tolist()
+    return payload
+
+
+def frame_payload(df, intraday=False):
+    """Chart payload for a yfinance history() frame."""
+    return chart_payload(frame_columns(df, intraday))
+
+
+def series_payload(series):
+    """Chart payload for a price_store series."""
+    return chart_payload(series_columns(series))
+
+
+def price_rows(company_id, dates, ohlc, volume, decimals=4):
+    """(company_id, date, open, high, low, close, volume) tuples for StockPrice bulk writes."""
+    return [
+        (company_id, *row)
+        for row in zip(dates.tolist(), *np.round(ohlc, decimals).tolist(), volume.tolist())
+    ]
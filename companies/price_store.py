@@ -0,0 +1,404 @@
+"""
+Compact daily price storage: one PriceBlock per company and calendar year.
+
+A block holds a uint16 day-offset vector plus OHLC as int32 scaled by
+10**decimals (4 decimal places like StockPrice, fewer only for prices too large
+for int32) and volume as int64. Decoding a whole history is a handful of
+``np.frombuffer`` calls rather than tens of thousands of Decimal rows.
+
+``update_prices`` always writes blocks and keeps the weekly/monthly PriceRollup
+bars current. Daily StockPrice rows are kept for the screener's SQL according to
+``settings.PRICE_ROW_DAYS``: every day (unset), only the trailing N days, or none (0).
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from companies.bulk_write import bulk_upsert
+from companies.models import PriceBlock, PriceRollup, StockPrice
+from companies.price_frames import price_rows
+
+PRICE_FIELDS = ("open", "high", "low", "close")
+ROLLUP_FREQS = {"W": "week", "M": "month"}  # PriceRollup.freq -> resample() frequency
+
+_INT32_MAX = np.iinfo(np.int32).max
+_MAX_DECIMALS = 4
+
+
+def _year_start(year):
+    return np.datetime64(f"{year:04d}-01-01", "D")
+
+
+def empty_series():
+    return {
+        "date": np.zeros(0, dtype="datetime64[D]"),
+        **{f: np.zeros(0) for f in PRICE_FIELDS},
+        "volume": np.zeros(0, dtype=np.int64),
+    }
+
+
+def encode_block(year, dates, ohlc, volume):
+    """PriceBlock field values for one year of sorted, unique dates; ohlc is float[4, n]."""
+    peak = float(np.abs(ohlc).max()) if ohlc.size else 0.0
+    decimals = _MAX_DECIMALS
+    while decimals and peak * 10 ** decimals > _INT32_MAX:
+        decimals -= 1
+    if peak * 10 ** decimals > _INT32_MAX:
+        raise ValueError(f"price {peak} too large for a price block")
+    return {
+        "days": (dates - _year_start(year)).astype(np.uint16).tobytes(),
+        "ohlc": np.rint(ohlc * 10 ** decimals).astype(np.int32).tobytes(),
+        "volume": np.asarray(volume, dtype=np.int64).tobytes(),
+        "decimals": decimals,
+    }
+
+
+def decode_block(year, days, ohlc, volume, decimals):
+    """(dates datetime64[D][n], ohlc float64[4, n], volume int64[n]) for one stored block."""
+    offsets = np.frombuffer(days, dtype=np.uint16)
+    dates = _year_start(year) + offsets.astype("timedelta64[D]")
+    prices = np.frombuffer(ohlc, dtype=np.int32).reshape(4, len(offsets)) / 10 ** decimals
+    return dates, prices, np.frombuffer(volume, dtype=np.int64)
+
+
+def _series(dates, ohlc, volume):
+    return {"date": dates, **dict(zip(PRICE_FIELDS, ohlc)), "volume": volume}
+
+
+def _rows_series(company_id, start=None, end=None):
+    """Fallback for companies whose prices predate blocks."""
+    qs = StockPrice.objects.filter(company_id=company_id)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    rows = list(qs.order_by("date").values_list("date", *PRICE_FIELDS, "volume"))
+    if not rows:
+        return empty_series()
+    dates, *ohlc, volume = zip(*rows)
+    return _series(
+        np.array(dates, dtype="datetime64[D]"),
+        np.array(ohlc, dtype=np.float64),
+        np.array(volume, dtype=np.int64),
+    )
+
+
+def load_prices(company_id, start=None, end=None):
+    """
+    Daily bars for a company as {"date", "open", "high", "low", "close", "volume"} arrays,
+    oldest first, optionally limited to start <= date <= end.
+    """
+    blocks = PriceBlock.objects.filter(company_id=company_id)
+    if start:
+        blocks = blocks.filter(year__gte=start.year)
+    if end:
+        blocks = blocks.filter(year__lte=end.year)
+    blocks = list(blocks.order_by("year").values_list("year", "days", "ohlc", "volume", "decimals"))
+    if not blocks:
+        if PriceBlock.objects.filter(company_id=company_id).exists():
+            return empty_series()
+        return _rows_series(company_id, start, end)
+
+    parts = [decode_block(*b) for b in blocks]
+    dates = np.concatenate([d for d, _, _ in parts])
+    ohlc = np.concatenate([p for _, p, _ in parts], axis=1)
+    volume = np.concatenate([v for _, _, v in parts])
+    keep = np.ones(len(dates), dtype=bool)
+    if start:
+        keep &= dates >= np.datetime64(start, "D")
+    if end:
+        keep &= dates <= np.datetime64(end, "D")
+    return _series(dates[keep], ohlc[:, keep], volume[keep])
+
+
+def iter_prices(company_id, start=None, using="default", chunk_size=2000):
+    """
+    Daily bars for a company as (date, open, high, low, close, volume) tuples, oldest
+    first, from ``start``. Unlike load_prices nothing is materialized: blocks are
+    decoded a year at a time and StockPrice rows read through a chunked cursor.
+    """
+    if PriceBlock.objects.using(using).filter(company_id=company_id).exists():
+        blocks = PriceBlock.objects.using(using).filter(company_id=company_id)
+        if start:
+            blocks = blocks.filter(year__gte=start.year)
+        blocks = blocks.order_by("year").values_list("year", "days", "ohlc", "volume", "decimals")
+        for block in blocks.iterator(chunk_size=max(chunk_size // 250, 1)):
+            dates, ohlc, volume = decode_block(*block)
+            if start:
+                keep = dates >= np.datetime64(start, "D")
+                dates, ohlc, volume = dates[keep], ohlc[:, keep], volume[keep]
+            yield from zip(dates.tolist(), *ohlc.tolist(), volume.tolist())
+        return
+
+    rows = StockPrice.objects.using(using).filter(company_id=company_id)
+    if start:
+        rows = rows.filter(date__gte=start)
+    rows = rows.order_by("date").values_list("date", *PRICE_FIELDS, "volume")
+    for day, *prices, volume in rows.iterator(chunk_size=chunk_size):
+        yield (day, *map(float, prices), volume)
+
+
+def _period_start(dates, freq):
+    if freq == "week":
+        # Day 0 (1970-01-01) was a Thursday; step back to each date's Monday.
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype("datetime64[D]")
+    if freq == "month":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"unknown frequency {freq!r}")
+
+
+def resample(series, freq):
+    """
+    Weekly ("week", labelled by Monday) or monthly ("month", labelled by the 1st) bars
+    from a daily series: first open, max high, min low, last close, summed volume.
+    "last_date" holds each bar's last trading day.
+    """
+    if not len(series["date"]):
+        return {**series, "last_date": series["date"]}
+    labels = _period_start(series["date"], freq)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+    return {
+        "date": labels[starts],
+        "open": series["open"][starts],
+        "high": np.maximum.reduceat(series["high"], starts),
+        "low": np.minimum.reduceat(series["low"], starts),
+        "close": series["close"][ends],
+        "volume": np.add.reduceat(series["volume"], starts),
+        "last_date": series["date"][ends],
+    }
+
+
+def _year_of(dates):
+    return dates.astype("datetime64[Y]").astype(int) + 1970
+
+
+def _rollup_starts(since):
+    """{PriceRollup.freq: first day of the week/month containing ``since``}."""
+    day = np.array([since], dtype="datetime64[D]")
+    return {freq: _period_start(day, name)[0] for freq, name in ROLLUP_FREQS.items()}
+
+
+def _rollup_rows(company_id, series, starts=None):
+    """PriceRollup rows for a daily series; with ``starts``, only buckets from starts[freq] on."""
+    rows = []
+    for freq, name in ROLLUP_FREQS.items():
+        daily = series
+        if starts:
+            # Only whole buckets: the other frequency's start may cut into this one's earlier bucket.
+            keep = series["date"] >= starts[freq]
+            daily = {k: v[keep] for k, v in series.items()}
+        bars = resample(daily, name)
+        rows += zip(
+            [company_id] * len(bars["date"]), [freq] * len(bars["date"]),
+            bars["date"].tolist(), bars["last_date"].tolist(),
+            *np.round([bars[f] for f in PRICE_FIELDS], 4).tolist(), bars["volume"].tolist(),
+        )
+    return rows
+
+
+def _write_rollups(rows):
+    bulk_upsert(
+        PriceRollup,
+        ["company_id", "freq", "period_start", "last_date", *PRICE_FIELDS, "volume"],
+        rows,
+        unique_fields=["company", "freq", "period_start"],
+        update_fields=["last_date", *PRICE_FIELDS, "volume"],
+    )
+
+
+def rebuild_rollups(company_id):
+    """Recompute all of a company's weekly and monthly PriceRollup bars. Returns the number written."""
+    rows = _rollup_rows(company_id, load_prices(company_id))
+    with transaction.atomic():
+        PriceRollup.objects.filter(company_id=company_id).delete()
+        _write_rollups(rows)
+    return len(rows)
+
+
+def load_rollups(company_id, freq, start=None):
+    """Stored weekly ("W") or monthly ("M") bars in load_prices() form, plus "last_date"."""
+    qs = PriceRollup.objects.filter(company_id=company_id, freq=freq)
+    if start:
+        qs = qs.filter(period_start__gte=start)
+    rows = list(qs.order_by("period_start").values_list("period_start", "last_date", *PRICE_FIELDS, "volume"))
+    if not rows:
+        return {**empty_series(), "last_date": np.zeros(0, dtype="datetime64[D]")}
+    dates, last_dates, *ohlc, volume = zip(*rows)
+    return {
+        **_series(
+            np.array(dates, dtype="datetime64[D]"),
+            np.array(ohlc, dtype=np.float64),
+            np.array(volume, dtype=np.int64),
+        ),
+        "last_date": np.array(last_dates, dtype="datetime64[D]"),
+    }
+
+
+def latest_price_dates(company_ids):
+    """{company_id: most recent stored trading day} for those of ``company_ids`` that have prices."""
+    latest_year = PriceBlock.objects.filter(company_id=OuterRef("company_id")).order_by("-year").values("year")[:1]
+    latest = {
+        company_id: date(year, 1, 1) + timedelta(days=int(np.frombuffer(days, dtype=np.uint16)[-1]))
+        for company_id, year, days in PriceBlock.objects.filter(
+            company_id__in=company_ids, year=Subquery(latest_year),
+        ).values_list("company_id", "year", "days")
+    }
+    # Companies whose prices predate blocks
+    unpacked = [c for c in company_ids if c not in latest]
+    if unpacked:
+        latest.update(
+            StockPrice.objects.filter(company_id__in=unpacked).values("company_id")
+            .annotate(latest=Max("date")).values_list("company_id", "latest").order_by()
+        )
+    return latest
+
+
+def latest_price_date(company_id):
+    """Most recent stored trading day, from blocks or (for unconverted companies) rows."""
+    return latest_price_dates([company_id]).get(company_id)
+
+
+def _merge_blocks(bars, extra_years=None):
+    """
+    Merge {company_id: (dates, ohlc, volume)} into year blocks, days already stored
+    winning, with one read and one bulk write. Returns each company's merged daily
+    series over the years written plus ``extra_years`` {company_id: {year, ...}}.
+    """
+    extra_years = extra_years or {}
+    wanted = {
+        company_id: set(_year_of(dates).tolist()) | extra_years.get(company_id, set())
+        for company_id, (dates, _, _) in bars.items()
+    }
+    existing = {
+        (company_id, year): decode_block(year, *fields)
+        for company_id, year, *fields in PriceBlock.objects.filter(
+            company_id__in=list(bars), year__in=set().union(*wanted.values()),
+        ).values_list("company_id", "year", "days", "ohlc", "volume", "decimals")
+        if year in wanted[company_id]
+    }
+
+    blocks, merged = [], {}
+    for company_id, (dates, ohlc, volume) in bars.items():
+        years = _year_of(dates)
+        parts = []
+        for year in sorted(wanted[company_id]):
+            sel = years == year
+            old = existing.get((company_id, year))
+            if not sel.any():
+                if old is not None:
+                    parts.append(old)
+                continue
+            d, p, v = dates[sel], ohlc[:, sel], volume[sel]
+            if old is not None:
+                old_d, old_p, old_v = old
+                d, p, v = np.concatenate([old_d, d]), np.concatenate([old_p, p], axis=1), np.concatenate([old_v, v])
+            # np.unique sorts and keeps each date's first occurrence, i.e. the stored one.
+            d, first = np.unique(d, return_index=True)
+            block = encode_block(year, d, p[:, first], v[first])
+            blocks.append((company_id, year, block["days"], block["ohlc"], block["volume"], block["decimals"]))
+            parts.append(decode_block(year, **block))
+        merged[company_id] = _series(
+            np.concatenate([d for d, _, _ in parts]),
+            np.concatenate([p for _, p, _ in parts], axis=1),
+            np.concatenate([v for _, _, v in parts]),
+        )
+
+    bulk_upsert(
+        PriceBlock, ["company_id", "year", "days", "ohlc", "volume", "decimals"], blocks,
+        unique_fields=["company", "year"], update_fields=["days", "ohlc", "volume", "decimals"],
+    )
+    return merged
+
+
+def _row_cutoff():
+    """Oldest day kept as a StockPrice row, or None to keep every day."""
+    if settings.PRICE_ROW_DAYS is None:
+        return None
+    return date.today() - timedelta(days=settings.PRICE_ROW_DAYS)
+
+
+def prune_price_rows(company_ids):
+    """Delete StockPrice rows older than the PRICE_ROW_DAYS window. Only call once blocks hold them."""
+    cutoff = _row_cutoff()
+    if cutoff is None:
+        return 0
+    return StockPrice.objects.filter(company_id__in=company_ids, date__lt=cutoff).delete()[0]
+
+
+def _write_rows(bars):
+    """Daily StockPrice rows inside the PRICE_ROW_DAYS window; older rows are pruned."""
+    cutoff = _row_cutoff()
+    prune_price_rows(list(bars))
+    if settings.PRICE_ROW_DAYS == 0:
+        return
+
+    def rows():
+        for company_id, (dates, ohlc, volume) in bars.items():
+            sel = np.ones(len(dates), dtype=bool) if cutoff is None else dates >= np.datetime64(cutoff, "D")
+            yield from price_rows(company_id, dates[sel], ohlc[:, sel], volume[sel])
+
+    bulk_upsert(StockPrice, ["company_id", "date", *PRICE_FIELDS, "volume"], rows(), unique_fields=["company", "date"])
+
+
+def store_prices(company_id, dates, ohlc, volume):
+    """
+    Persist daily bars (dates datetime64[D], ohlc float[4, n], volume int[n]) for one
+    company; see store_price_batch.
+    """
+    store_price_batch({company_id: (dates, ohlc, volume)})
+
+
+def store_price_batch(bars):
+    """
+    Persist daily bars for many companies, {company_id: (dates, ohlc, volume)}, in one
+    transaction with one bulk write per table. Bars that already exist are kept.
+
+    A company's first write also folds in its existing StockPrice rows, so blocks always
+    hold the full history. Weekly/monthly rollups are refreshed for the buckets the new
+    bars fall in; normally just the trailing, still-open week and month.
+    """
+    bars = {
+        company_id: (
+            np.asarray(dates, dtype="datetime64[D]"),
+            np.asarray(ohlc, dtype=np.float64).reshape(len(PRICE_FIELDS), -1),
+            np.asarray(volume, dtype=np.int64),
+        )
+        for company_id, (dates, ohlc, volume) in bars.items()
+    }
+    packed = set(PriceBlock.objects.filter(company_id__in=list(bars)).values_list("company_id", flat=True))
+    first_write = [company_id for company_id in bars if company_id not in packed]
+
+    with transaction.atomic():
+        for company_id in first_write:
+            pack_price_rows(company_id)
+        bars = {company_id: b for company_id, b in bars.items() if len(b[0])}
+        if not bars:
+            return
+
+        starts = {company_id: _rollup_starts(dates.min()) for company_id, (dates, _, _) in bars.items()}
+        # Rollups need the daily bars back to the start of the earliest touched week/month.
+        merged = _merge_blocks(bars, extra_years={
+            company_id: {int(_year_of(min(s.values())))} for company_id, s in starts.items()
+        })
+        _write_rows(bars)
+
+        rollups = []
+        for company_id in bars:
+            if company_id not in first_write:
+                rollups += _rollup_rows(company_id, merged[company_id], starts[company_id])
+        _write_rollups(rollups)
+        for company_id in first_write:
+            rebuild_rollups(company_id)
+
+
+def pack_price_rows(company_id):
+    """Copy a company's StockPrice rows into blocks. Returns the number of bars packed."""
+    rows = _rows_series(company_id)
+    if len(rows["date"]):
+        _merge_blocks({company_id: (rows["date"], np.array([rows[f] for f in PRICE_FIELDS]), rows["volume"])})
+    return len(rows["date"])
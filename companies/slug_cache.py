@@ -0,0 +1,79 @@
+"""
+Per-process cache of EXCHANGE-TICKER slug -> Company.
+
+A single company page fires a dozen AJAX calls (prices, news, discussion, chat,
+notes, follow state), each of which resolves its slug first. Rows are kept in a
+bounded LRU with a short TTL. Company save/delete signals evict entries in this
+process, and the TTL bounds staleness for writes made elsewhere (management
+commands, queryset ``update()``).
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from companies.models import Company
+
+
+class SlugCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # slug -> (expires_at, company)
+        self._lock = threading.Lock()
+
+    def get(self, slug):
+        """Return a copy of the cached company, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[slug]
+                return None
+            self._entries.move_to_end(slug)
+            return copy.copy(entry[1])
+
+    def set(self, slug, company):
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[slug] = (time.monotonic() + self.ttl, copy.copy(company))
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, company_ids, slugs=()):
+        """Evict ``slugs`` and every slug mapped to one of ``company_ids`` (covers ticker/exchange renames)."""
+        company_ids = set(company_ids)
+        with self._lock:
+            stale = [s for s, (_, c) in self._entries.items() if c.pk in company_ids]
+            for slug in [*stale, *slugs]:
+                self._entries.pop(slug, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+company_slugs = SlugCache(settings.COMPANY_SLUG_CACHE_SIZE, settings.COMPANY_SLUG_CACHE_TTL)
+
+
+def get_company_by_slug(slug):
+    """Parse an EXCHANGE-TICKER slug and return the matching Company, from the cache if possible."""
+    company = company_slugs.get(slug)
+    if company is None:
+        exchange, _, ticker = slug.partition('-')
+        company = Company.objects.get(exchange=exchange, ticker=ticker)
+        company_slugs.set(slug, company)
+    return company
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def _company_changed(sender, instance, **kwargs):
+    company_slugs.forget([instance.pk], slugs=[f"{instance.exchange}-{instance.ticker}"])
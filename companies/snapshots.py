@@ -0,0 +1,143 @@
+"""
+Derived per-period figures and ratios (CompanyMetricSnapshot).
+
+Inputs for a batch of companies are read in one query and laid out as a
+fields x (company, period) matrix; every ratio is then one array expression
+over the whole batch. Snapshots are rebuilt at ingest for just the companies
+that were written.
+"""
+from datetime import date
+
+import numpy as np
+from django.db import transaction
+
+from companies.financial_store import financial_rows
+from companies.metric_names import metric_names
+from companies.models import CompanyMetricSnapshot
+
+# Snapshot input -> (statement, raw metric names, most preferred first)
+SNAPSHOT_INPUTS = {
+    "revenue": ("IS", ["Total Revenues", "Revenue"]),
+    "gross_profit": ("IS", ["Gross Profit"]),
+    "operating_income": ("IS", ["Operating Income", "Operating Profit"]),
+    "net_income": ("IS", ["Net Income"]),
+    "shares": ("IS", ["Weighted Avg. Shares Outstanding Dil", "Weighted Avg. Shares Outstanding"]),
+    "operating_cash_flow": ("CF", ["Cash from Operations", "Cash From Operations", "Cash from Operating Activities"]),
+    "capex": ("CF", ["Capital Expenditure", "Capital Expenditures"]),
+    "total_assets": ("BS", ["Total Assets"]),
+    "total_liabilities": ("BS", ["Total Liabilities"]),
+    "total_equity": ("BS", ["Total Equity", "Total Shareholders' Equity", "Total Common Equity"]),
+}
+
+_FIELDS = list(SNAPSHOT_INPUTS)
+
+
+def _div(a, b):
+    """Elementwise a / b, NaN where undefined (missing input or zero denominator)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = a / b
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def _load_inputs(company_ids):
+    """Return (company ids, period dates, {field: values}) with one column per (company, period)."""
+    ids = {name: metric_id for metric_id, name in metric_names().items()}
+    source = {}  # (statement, metric_id) -> (field index, preference rank)
+    for f, (statement, names) in enumerate(SNAPSHOT_INPUTS.values()):
+        for rank, name in enumerate(names):
+            if name in ids:
+                source[statement, ids[name]] = (f, rank)
+
+    rows = [
+        (c, d, *source[st, m], v)
+        for c, st, m, d, v in financial_rows(company_ids, metric_ids={m for _, m in source})
+        if (st, m) in source
+    ]
+    if not rows:
+        return np.zeros(0, dtype=np.int64), [], {field: np.zeros(0) for field in _FIELDS}
+
+    companies, dates, fields, ranks, values = zip(*rows)
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(rows))
+    pairs, col = np.unique(np.array(companies, dtype=np.int64) * 1_000_000 + ordinals, return_inverse=True)
+
+    # Per (field, column) keep the most preferred source metric.
+    key = np.array(fields) * len(pairs) + col
+    order = np.lexsort((np.array(ranks), key))
+    first = np.r_[True, key[order][1:] != key[order][:-1]]
+    chosen = order[first]
+    matrix = np.full((len(_FIELDS), len(pairs)), np.nan)
+    matrix.flat[key[chosen]] = np.asarray(values, dtype=np.float64)[chosen]
+
+    pair_companies = pairs // 1_000_000
+    pair_dates = [date.fromordinal(o) for o in (pairs % 1_000_000).tolist()]
+    return pair_companies, pair_dates, dict(zip(_FIELDS, matrix))
+
+
+def compute_snapshots(company_ids):
+    """Unsaved CompanyMetricSnapshot rows for every (company, period) with any input."""
+    companies, dates, x = _load_inputs(company_ids)
+
+    fcf = x["operating_cash_flow"] - np.abs(x["capex"])
+    # Columns are sorted by (company, period), so the prior period is the previous column.
+    prior_revenue = np.r_[np.nan, x["revenue"][:-1]]
+    same_company = np.r_[False, companies[1:] == companies[:-1]]
+    prior_revenue[~same_company | (prior_revenue <= 0)] = np.nan
+
+    derived = {
+        "free_cash_flow": fcf,
+        "gross_margin": _div(x["gross_profit"], x["revenue"]),
+        "operating_margin": _div(x["operating_income"], x["revenue"]),
+        "net_margin": _div(x["net_income"], x["revenue"]),
+        "fcf_margin": _div(fcf, x["revenue"]),
+        "revenue_growth": _div(x["revenue"], prior_revenue) - 1,
+        "roe": _div(x["net_income"], np.where(x["total_equity"] > 0, x["total_equity"], np.nan)),
+        "roa": _div(x["net_income"], x["total_assets"]),
+        "liabilities_to_equity": _div(x["total_liabilities"], np.where(x["total_equity"] > 0, x["total_equity"], np.nan)),
+        "eps": _div(x["net_income"], x["shares"]),
+        "fcf_per_share": _div(fcf, x["shares"]),
+    }
+
+    amounts = {field: x[field] for field in _FIELDS}
+    amounts["free_cash_flow"] = derived.pop("free_cash_flow")
+    amount_cols = {k: [None if np.isnan(v) else int(v) for v in col.tolist()] for k, col in amounts.items()}
+    ratio_cols = {k: [None if np.isnan(v) else v for v in col.tolist()] for k, col in derived.items()}
+
+    return [
+        CompanyMetricSnapshot(
+            company_id=int(companies[j]),
+            period_end_date=dates[j],
+            **{k: col[j] for k, col in amount_cols.items()},
+            **{k: col[j] for k, col in ratio_cols.items()},
+        )
+        for j in range(len(dates))
+    ]
+
+
+def rebuild_metric_snapshots(company_ids):
+    """Replace the snapshots of the given companies. Call after writing their financials."""
+    snapshots = compute_snapshots(company_ids)
+    with transaction.atomic():
+        CompanyMetricSnapshot.objects.filter(company_id__in=company_ids).delete()
+        CompanyMetricSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+    return len(snapshots)
+
+
+# Shown on the company page, in order: (label, snapshot field)
+KEY_RATIOS = [
+    ("Revenue growth", "revenue_growth"),
+    ("Gross margin", "gross_margin"),
+    ("Operating margin", "operating_margin"),
+    ("Net margin", "net_margin"),
+    ("FCF margin", "fcf_margin"),
+    ("ROE", "roe"),
+]
+
+
+def key_ratios(company):
+    """Latest period's KEY_RATIOS as percentages: {"period": date, "ratios": [(label, pct), ...]}, or None."""
+    snapshot = CompanyMetricSnapshot.objects.filter(company=company).order_by("-period_end_date").first()
+    if snapshot is None:
+        return None
+    ratios = [(label, getattr(snapshot, field) * 100) for label, field in KEY_RATIOS if getattr(snapshot, field) is not None]
+    return {"period": snapshot.period_end_date, "ratios": ratios} if ratios else None
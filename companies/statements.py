@@ -0,0 +1,852 @@
+"""
+Financial statement display pipeline and the materialized per-company store.
+
+Statements are transformed (renames, drops, combines, exceptional items) and
+pivoted into the table dicts rendered by ``statement_table.html``. The result
+is persisted in ``CompanyStatements`` at ingest time so page loads don't have
+to re-read and re-transform every ``Financial`` row.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+
+from companies.metric_names import metric_names
+from companies.metric_taxonomy import (
+    ACTION_COMBINE,
+    ACTION_DROP,
+    ACTION_EXCEPTIONAL,
+    ACTION_KEEP,
+    ACTION_PBT,
+    EXCEPTIONAL_ITEMS_METRICS,
+    FISCAL_METRIC_RENAMES,
+    FISCAL_METRICS_COMBINE,
+    FISCAL_METRICS_DROP,
+    METRIC_RULES,
+    SUM_METRICS,
+    SUM_ROWS,
+    metric_table,
+)
+from companies.financial_store import financial_rows
+from companies.models import CompanyStatements
+from companies.page_cache import touch_companies
+
+
+METRICS_IS = [
+    "Revenue",
+    "Cost of Goods Sold",
+    "Gross Profit",
+    "Sales, General, & Administrative",
+    "Other Operating Expense",
+    "Total Operating Expenses",
+    "Operating Profit",
+    "Net Interest Income",
+    "Other Non-Operating Income",
+    "Pre-Tax Income",
+    "Income Tax",
+    "Other Non-recurring",
+    "Net Income",
+    # "EPS (Basic)",
+    # "EPS (Diluted)",
+    "Shares (Basic)",
+    "Shares (Diluted)",
+]
+METRICS_BS = [
+    "Cash & Short-Term Investments",
+    "Accounts Receivable",
+    "Inventories",
+    "Other Current Assets",
+    "Total Current Assets",
+    "Property, Plant & Equipment",
+    "Goodwill",
+    "Other Intangible Assets",
+    "Other Assets",
+    "Total Assets",
+    None,  # spacer
+    "Accounts Payable",
+    "Tax Payable",
+    "Short-Term Debt",
+    "Current Portion of Capital Leases",
+    "Other Current Liabilities",
+    "Total Current Liabilities",
+    "Long-Term Debt",
+    "Capital Leases",
+    "Pension Liabilities",
+    "Other Liabilities",
+    "Total Liabilities",
+    "Retained Earnings",
+    "Paid-in Capital",
+    "Common Stock",
+    "Other",
+    "Shareholders' Equity",
+    None,  # spacer
+    "Liabilities & Equity",
+]
+# QFS BS metrics that combine multiple DB metrics for display
+QFS_BS_COMBINE = {
+    "Cash & Short-Term Investments": ["Cash & Equivalents", "Short-Term Investments"],
+}
+# QFS BS metrics with display name different from DB name
+QFS_BS_RENAME = {
+    "Property, Plant & Equipment": "Property, Plant, & Equipment (Net)",
+}
+METRICS_CF = [
+    "Net Income",
+    "Depreciation & Amortization",
+    "Change in Working Capital",
+    "Change in Deferred Tax",
+    "Stock-Based Compensation",
+    "Other",  # (operating)
+    "Cash From Operations",
+    "Property, Plant, & Equipment",
+    "Acquisitions",
+    "Intangibles",
+    "Other",  # (investing)
+    "Cash From Investing",
+    "Net Issuance of Common Stock",
+    "Net Issuance of Debt",
+    "Other",  # (financing)
+    "Cash From Financing",
+    "Free Cash Flow",
+]
+
+# Fiscal rename / drop / combine / exceptional / sum-row rules live in companies.metric_taxonomy.
+
+
+# Fiscal BS cash lines folded into a single display row by preprocess_fiscal_bs
+FISCAL_BS_CASH_COMPONENTS = {
+    "Cash And Equivalents", "Cash and Cash Equivalents",
+    "Short Term Investments", "Short-Term Investments",
+}
+FISCAL_BS_CASH_TOTALS = {
+    "Total Cash And Short Term Investments",
+    "Total Cash and Cash Equivalents",
+}
+FISCAL_BS_CASH_TARGET = "Cash & Short-Term Investments"
+
+# PBT block is inserted before this (display) metric, or at the end if absent
+FISCAL_PBT_INSERT_BEFORE = "Income Tax Expense"
+
+
+def preprocess_fiscal_bs(items):
+    """
+    Pre-process Fiscal BS items: combine cash metrics into
+    'Cash & Short-Term Investments'. Uses the Total if available,
+    otherwise sums individual components.
+    """
+    CASH_COMPONENTS = FISCAL_BS_CASH_COMPONENTS
+    CASH_TOTALS = FISCAL_BS_CASH_TOTALS
+    TARGET = FISCAL_BS_CASH_TARGET
+
+    has_total = any(m in CASH_TOTALS for m, _, _ in items)
+
+    if has_total:
+        result = []
+        for m, d, v in items:
+            if m in CASH_TOTALS:
+                result.append((TARGET, d, v))
+            elif m in CASH_COMPONENTS:
+                continue
+            else:
+                result.append((m, d, v))
+        return result
+
+    # No total: sum individual components
+    cash_values = defaultdict(float)
+    insert_pos = None
+    result = []
+    for m, d, v in items:
+        if m in CASH_COMPONENTS:
+            cash_values[d] += float(v) if v else 0
+            if insert_pos is None:
+                insert_pos = len(result)
+        else:
+            result.append((m, d, v))
+    if cash_values:
+        cash_items = [(TARGET, d, v) for d, v in cash_values.items()]
+        result = result[:insert_pos] + cash_items + result[insert_pos:]
+    return result
+
+
+def transform_fiscal_items(items):
+    """
+    Transform Fiscal data metrics for display:
+    - Rename metrics
+    - Drop unwanted metrics
+    - Combine certain metrics
+    - Group exceptional items
+    - Insert PBT before Exceptional Items, then Exceptional Items, then Profit Before Tax
+    Returns (transformed_items, exceptional_breakdown) where:
+    - transformed_items: list of (metric, date, value) tuples
+    - exceptional_breakdown: dict of {date: [(metric, value), ...]} for exceptional items
+    """
+    from collections import defaultdict
+    from decimal import Decimal
+
+    def to_float(v):
+        if v is None:
+            return 0.0
+        if isinstance(v, Decimal):
+            return float(v)
+        return float(v) if v else 0.0
+
+    # First pass: collect values to combine, exceptional items, and PBT values
+    combine_values = defaultdict(float)  # (target_metric, date) -> sum
+    exceptional_by_date = defaultdict(list)  # date -> [(metric, value), ...]
+    exceptional_totals = defaultdict(float)  # date -> total
+    pbt_values = {}  # date -> Profit Before Tax value
+
+    for metric, date, value in items:
+        if metric in FISCAL_METRICS_COMBINE:
+            target = FISCAL_METRICS_COMBINE[metric]
+            combine_values[(target, date)] += to_float(value)
+        elif metric in EXCEPTIONAL_ITEMS_METRICS:
+            if value:
+                exceptional_by_date[date].append((metric, float(value) if value else 0))
+                exceptional_totals[date] += to_float(value)
+        elif metric == "EBT, Incl. Unusual Items":
+            pbt_values[date] = to_float(value)
+
+    # Second pass: transform items (skip Profit Before Tax, we'll add it later)
+    result = []
+    seen = set()
+    has_exceptional = bool(exceptional_totals)
+
+    for metric, date, value in items:
+        # Skip dropped metrics
+        if metric in FISCAL_METRICS_DROP:
+            continue
+
+        # Skip metrics being combined into others
+        if metric in FISCAL_METRICS_COMBINE:
+            continue
+
+        # Skip exceptional items (handled separately)
+        if metric in EXCEPTIONAL_ITEMS_METRICS:
+            continue
+
+        # Skip Profit Before Tax - we'll insert it after Exceptional Items
+        if metric == "EBT, Incl. Unusual Items":
+            continue
+
+        # Rename metric if needed
+        display_metric = FISCAL_METRIC_RENAMES.get(metric, metric)
+
+        # Add combined values if this is a target metric
+        key = (display_metric, date)
+        if key in combine_values:
+            value = to_float(value) + combine_values[key]
+            del combine_values[key]
+
+        # Avoid duplicates
+        if (display_metric, date) in seen:
+            continue
+        seen.add((display_metric, date))
+
+        result.append((display_metric, date, value))
+
+    # Build PBT items to insert before Income Tax Expense
+    pbt_items = []
+    if has_exceptional:
+        # PBT before Exceptional Items = Profit Before Tax - Exceptional Items
+        for date in pbt_values:
+            pbt = pbt_values[date]
+            exc = exceptional_totals.get(date, 0)
+            pbt_items.append(("PBT before Exceptional Items", date, pbt - exc))
+
+        # Exceptional Items
+        for date, total in exceptional_totals.items():
+            pbt_items.append(("Exceptional Items", date, total))
+
+        # Profit Before Tax
+        for date, pbt in pbt_values.items():
+            pbt_items.append(("Profit Before Tax", date, pbt))
+    else:
+        # No exceptional items - just add Profit Before Tax
+        for date, pbt in pbt_values.items():
+            pbt_items.append(("Profit Before Tax", date, pbt))
+
+    # Find position to insert (before Income Tax Expense)
+    insert_pos = len(result)
+    for i, (metric, _, _) in enumerate(result):
+        if metric == "Income Tax Expense":
+            insert_pos = i
+            break
+
+    # Insert PBT items at the right position
+    result = result[:insert_pos] + pbt_items + result[insert_pos:]
+
+    return result, dict(exceptional_by_date)
+
+# Fiscal BS metrics that become blank spacer rows
+FISCAL_BS_SPACER_METRICS = {"Liabilities", "Equity"}
+# Fiscal BS metrics after which to insert a spacer row
+FISCAL_BS_SPACER_AFTER = {
+    "Total Equity", "Total Shareholders' Equity",
+    "Total Common Shareholders' Equity", "Shareholders' Equity",
+}
+
+
+def pivot_fiscal_items(items, exceptional_breakdown=None):
+    """
+    Pivot Fiscal data items with support for expandable exceptional items.
+    """
+    if not items:
+        return {"dates": [], "rows": []}
+
+    dates = sorted({d for _, d, _ in items}, reverse=True)
+    lookup = {(m, d): v for m, d, v in items}
+
+    # Get metrics in order they appear
+    metrics = []
+    seen = set()
+    for m, _, _ in items:
+        if m not in seen:
+            metrics.append(m)
+            seen.add(m)
+
+    rows = []
+    equity_spacer_added = False
+    for m in metrics:
+        # Convert section headers to spacer rows
+        if m in FISCAL_BS_SPACER_METRICS:
+            rows.append({"spacer": True})
+            continue
+
+        values = [lookup.get((m, d)) for d in dates]
+        if any(v is not None for v in values):
+            row = {
+                "metric": m,
+                "values": values,
+                "sum_metric": m in SUM_METRICS,
+                "expandable": False,
+                "breakdown": [],
+            }
+            # Add breakdown for Exceptional Items
+            if m == "Exceptional Items" and exceptional_breakdown:
+                row["expandable"] = True
+                # Get all unique breakdown metrics across all dates
+                breakdown_metrics = {}
+                for d in dates:
+                    if d in exceptional_breakdown:
+                        for bm, bv in exceptional_breakdown[d]:
+                            if bm not in breakdown_metrics:
+                                breakdown_metrics[bm] = {}
+                            breakdown_metrics[bm][d] = bv
+                # Build breakdown rows
+                for bm in breakdown_metrics:
+                    brow = {
+                        "metric": bm,
+                        "values": [breakdown_metrics[bm].get(d) for d in dates],
+                    }
+                    row["breakdown"].append(brow)
+            rows.append(row)
+
+            # Add spacer after total equity (only once)
+            if m in FISCAL_BS_SPACER_AFTER and not equity_spacer_added:
+                rows.append({"spacer": True})
+                equity_spacer_added = True
+
+    dates = [d.strftime("%b %Y") for d in dates]
+    return {"dates": dates, "rows": rows}
+
+
+def pivot_items(items, metrics=None, combine=None, rename=None):
+    """
+    Pivot financial items into a table format.
+    items: [(metric, date, value), ...]
+    metrics: list of metrics to show in order, or None to show all available.
+             Use None entries for spacer rows.
+    combine: dict mapping display_name -> [db_metric, ...] to sum multiple DB metrics
+    rename: dict mapping display_name -> db_metric for renamed metrics
+    """
+    if not items:
+        return {"dates": [], "rows": []}
+
+    combine = combine or {}
+    rename = rename or {}
+
+    dates = sorted({d for _, d, _ in items}, reverse=True)
+    lookup = {(m, d): v for m, d, v in items}
+
+    # If no metrics specified, use all unique metrics from the data
+    if metrics is None:
+        metrics = []
+        seen = set()
+        for m, _, _ in items:
+            if m not in seen:
+                metrics.append(m)
+                seen.add(m)
+
+    rows = []
+    for m in metrics:
+        if m is None:
+            rows.append({"spacer": True})
+            continue
+
+        if m in combine:
+            # Combined metric: sum values from multiple source metrics
+            values = []
+            for d in dates:
+                total = None
+                for source in combine[m]:
+                    v = lookup.get((source, d))
+                    if v is not None:
+                        total = (total or 0) + float(v)
+                values.append(total)
+        elif m in rename:
+            # Renamed metric: look up the DB metric name
+            values = [lookup.get((rename[m], d)) for d in dates]
+        else:
+            values = [lookup.get((m, d)) for d in dates]
+
+        if any(v is not None for v in values):
+            rows.append({
+                "metric": m,
+                "values": values,
+                "sum_metric": m in SUM_METRICS
+            })
+
+    dates = [d.strftime("%b %Y") for d in dates]
+    return {"dates": dates, "rows": rows}
+
+
+# ---------------------------------------------------------------------------
+# Array engine
+#
+# Same output as preprocess_fiscal_bs -> transform_fiscal_items ->
+# pivot_fiscal_items, but each statement is held as a dense metrics x periods
+# matrix so renames, drops, combines and the exceptional-items rollup are
+# decided once per metric and applied as whole-row array operations instead
+# of per-item list scans. The tuple functions above are kept as the reference
+# implementation (see scripts/benchmark_statement_pivot.py).
+# ---------------------------------------------------------------------------
+
+_KEEP_RULE = (ACTION_KEEP, None)
+
+
+class StatementMatrix:
+    """
+    One statement as metrics x periods arrays.
+
+    values: float64 cell values
+    keys:   position of the cell in the source item list (inf = empty cell), so
+            list-order rules ("first occurrence wins", "insert before X") survive
+    floats: cells produced by arithmetic, rendered as float rather than int
+
+    Row names may repeat until rows are merged. Source items are assumed unique
+    per (metric, period), which the Financial unique constraint guarantees.
+    """
+    __slots__ = ("names", "dates", "values", "keys", "floats")
+
+    def __init__(self, names, dates, values, keys, floats):
+        self.names = names
+        self.dates = dates
+        self.values = values
+        self.keys = keys
+        self.floats = floats
+
+    @classmethod
+    def empty(cls, dates=()):
+        shape = (0, len(dates))
+        return cls([], list(dates), np.zeros(shape), np.full(shape, np.inf), np.zeros(shape, dtype=bool))
+
+    @classmethod
+    def from_items(cls, items):
+        """Build from [(metric, date, value), ...]; rows and columns follow first appearance."""
+        if not items:
+            return cls.empty()
+        metrics, dates, values = zip(*items)
+        names = list(dict.fromkeys(metrics))
+        periods = list(dict.fromkeys(dates))
+        row_of = {m: i for i, m in enumerate(names)}
+        col_of = {d: i for i, d in enumerate(periods)}
+        rows = np.fromiter(map(row_of.__getitem__, metrics), dtype=np.intp, count=len(items))
+        cols = np.fromiter(map(col_of.__getitem__, dates), dtype=np.intp, count=len(items))
+        raw = np.asarray(values)
+        is_float = raw.dtype.kind != "i"
+
+        shape = (len(names), len(periods))
+        mat = cls(names, periods, np.zeros(shape), np.full(shape, np.inf), np.zeros(shape, dtype=bool))
+        mat.values[rows, cols] = raw.astype(np.float64)
+        mat.keys[rows, cols] = np.arange(len(items), dtype=np.float64)
+        mat.floats[rows, cols] = is_float
+        return mat
+
+    @property
+    def present(self):
+        return np.isfinite(self.keys)
+
+    def take(self, rows):
+        return StatementMatrix(
+            [self.names[i] for i in rows], self.dates,
+            self.values[rows], self.keys[rows], self.floats[rows],
+        )
+
+    def append(self, names, values, keys, floats):
+        return StatementMatrix(
+            self.names + list(names), self.dates,
+            np.vstack([self.values, values]), np.vstack([self.keys, keys]), np.vstack([self.floats, floats]),
+        )
+
+
+def _rank_keys(keys):
+    """Replace cell keys with their integer rank, keeping empty cells at inf."""
+    present = np.isfinite(keys)
+    flat = keys[present]
+    ranks = np.empty(flat.size)
+    ranks[np.argsort(flat, kind="stable")] = np.arange(flat.size)
+    out = np.full(keys.shape, np.inf)
+    out[present] = ranks
+    return out
+
+
+def _merge_rows(mat, rows, last=False):
+    """Collapse rows into one: per period the first (or last) occupied cell wins."""
+    keys = mat.keys[rows]
+    if last:
+        winner = np.where(np.isfinite(keys), keys, -np.inf).argmax(axis=0)
+    else:
+        winner = keys.argmin(axis=0)
+    cols = np.arange(keys.shape[1])
+    return mat.values[rows][winner, cols], keys[winner, cols], mat.floats[rows][winner, cols]
+
+
+def preprocess_fiscal_bs_matrix(mat):
+    """Array version of preprocess_fiscal_bs."""
+    totals = {i for i, n in enumerate(mat.names) if n in FISCAL_BS_CASH_TOTALS}
+    components = [i for i, n in enumerate(mat.names) if n in FISCAL_BS_CASH_COMPONENTS]
+    others = [i for i in range(len(mat.names)) if i not in totals and i not in components]
+
+    if totals:
+        rows = sorted(totals.union(others))
+        out = mat.take(rows)
+        out.names = [FISCAL_BS_CASH_TARGET if i in totals else mat.names[i] for i in rows]
+        return out
+    if not components:
+        return mat
+
+    # No total: sum individual components into one row placed where the first component was,
+    # with its periods ordered by first occurrence (as the dict in preprocess_fiscal_bs does).
+    keys = mat.keys[components]
+    present = np.isfinite(keys)
+    cash = np.where(present, mat.values[components], 0.0).sum(axis=0)
+    cols = np.flatnonzero(present.any(axis=0))
+    cols = cols[np.argsort(keys.min(axis=0)[cols], kind="stable")]
+    cash_keys = np.full(keys.shape[1], np.inf)
+    cash_keys[cols] = keys.min() + np.arange(cols.size) / (cols.size + 1)
+
+    out = mat.take(others).append(
+        [FISCAL_BS_CASH_TARGET], cash[None, :], cash_keys[None, :], np.isfinite(cash_keys)[None, :],
+    )
+    out.keys = _rank_keys(out.keys)
+    return out
+
+
+def transform_fiscal_matrix(mat):
+    """
+    Array version of transform_fiscal_items.
+    Returns (result, exceptional): result holds the display rows plus the PBT /
+    Exceptional Items block keyed at its insertion point; exceptional is
+    (matrix, nonzero mask) of the rolled-up items, or None if there are none.
+    """
+    kept, exceptional_rows, pbt_rows = [], [], []
+    combine_rows = defaultdict(list)
+    for i, name in enumerate(mat.names):
+        action, target = METRIC_RULES.get(name, _KEEP_RULE)
+        if action == ACTION_COMBINE:
+            combine_rows[target].append(i)
+        elif action == ACTION_EXCEPTIONAL:
+            exceptional_rows.append(i)
+        elif action == ACTION_PBT:
+            pbt_rows.append(i)
+        elif action == ACTION_KEEP:
+            kept.append(i)
+
+    present = mat.present
+    n_dates = len(mat.dates)
+
+    combined = {}
+    for target, rows in combine_rows.items():
+        combined[target] = (
+            np.where(present[rows], mat.values[rows], 0.0).sum(axis=0),
+            present[rows].any(axis=0),
+        )
+
+    exc = mat.take(exceptional_rows)
+    exc_nonzero = exc.present & (exc.values != 0)
+    exc_totals = np.where(exc_nonzero, exc.values, 0.0).sum(axis=0)
+    exc_dates = exc_nonzero.any(axis=0)
+    has_exceptional = bool(exc_dates.any())
+
+    if pbt_rows:
+        pbt, pbt_keys, _ = _merge_rows(mat, pbt_rows, last=True)
+        pbt_dates = np.isfinite(pbt_keys)
+    else:
+        pbt, pbt_dates = np.zeros(n_dates), np.zeros(n_dates, dtype=bool)
+
+    # Renamed metrics sharing a display name: the first occurrence per period wins
+    groups = {}
+    for i in kept:
+        groups.setdefault(FISCAL_METRIC_RENAMES.get(mat.names[i], mat.names[i]), []).append(i)
+    display = mat.take([rows[0] for rows in groups.values()])
+    display.names = list(groups)
+    for j, rows in enumerate(groups.values()):
+        if len(rows) > 1:
+            display.values[j], display.keys[j], display.floats[j] = _merge_rows(mat, rows)
+
+    row_of = {name: j for j, name in enumerate(display.names)}
+    for target, (extra, extra_dates) in combined.items():
+        j = row_of.get(target)
+        if j is None:
+            continue
+        hit = extra_dates & np.isfinite(display.keys[j])
+        display.values[j, hit] += extra[hit]
+        display.floats[j, hit] = True
+
+    first_keys = display.keys.min(axis=1) if display.names else np.zeros(0)
+    display = display.take(np.argsort(first_keys, kind="stable").tolist())
+
+    block = []
+    if has_exceptional:
+        if pbt_dates.any():
+            block.append(("PBT before Exceptional Items", pbt - exc_totals, pbt_dates))
+        block.append(("Exceptional Items", exc_totals, exc_dates))
+    if pbt_dates.any():
+        block.append(("Profit Before Tax", pbt, pbt_dates))
+    if not block:
+        return display, None
+
+    if FISCAL_PBT_INSERT_BEFORE in row_of:
+        before = first_keys[row_of[FISCAL_PBT_INSERT_BEFORE]]
+        block_keys = [before - 1 + (k + 1) / (len(block) + 1) for k in range(len(block))]
+    else:
+        finite = mat.keys[np.isfinite(mat.keys)]
+        start = finite.max() + 1 if finite.size else 0
+        block_keys = [start + k for k in range(len(block))]
+
+    result = display.append(
+        [name for name, _, _ in block],
+        np.array([values for _, values, _ in block]),
+        np.array([np.where(dates, key, np.inf) for (_, _, dates), key in zip(block, block_keys)]),
+        np.array([dates for _, _, dates in block]),
+    )
+    return result, ((exc, exc_nonzero) if has_exceptional else None)
+
+
+def _cell_objects(values, present, floats):
+    """Object array of display values: None for empty cells, int or float otherwise."""
+    out = np.full(values.shape, None, dtype=object)
+    ints = present & ~floats
+    out[ints] = values[ints].astype(np.int64)
+    out[present & floats] = values[present & floats]
+    return out
+
+
+def pivot_fiscal_matrix(mat, exceptional=None):
+    """Array version of pivot_fiscal_items."""
+    present = mat.present
+    if not present.any():
+        return {"dates": [], "rows": []}
+
+    # Rows sharing a name (only possible when the PBT block collides with a raw metric):
+    # ordered by first occurrence, last occurrence per period wins.
+    first_keys = mat.keys.min(axis=1)
+    groups = {}
+    for i, name in enumerate(mat.names):
+        groups.setdefault(name, []).append(i)
+    if len(groups) < len(mat.names):
+        merged = mat.take([rows[0] for rows in groups.values()])
+        merged.names = list(groups)
+        first_keys = np.array([first_keys[rows].min() for rows in groups.values()])
+        for j, rows in enumerate(groups.values()):
+            if len(rows) > 1:
+                merged.values[j], merged.keys[j], merged.floats[j] = _merge_rows(mat, rows, last=True)
+        mat = merged
+        present = mat.present
+
+    cols = sorted(np.flatnonzero(present.any(axis=0)).tolist(), key=mat.dates.__getitem__, reverse=True)
+    order = np.argsort(first_keys, kind="stable")
+    cells = _cell_objects(mat.values[:, cols], present[:, cols], mat.floats[:, cols])
+    has_values = present[:, cols].any(axis=1)
+
+    rows = []
+    equity_spacer_added = False
+    for i in order.tolist():
+        m = mat.names[i]
+        if m in FISCAL_BS_SPACER_METRICS:
+            rows.append({"spacer": True})
+            continue
+        if not has_values[i]:
+            continue
+
+        row = {
+            "metric": m,
+            "values": cells[i].tolist(),
+            "sum_metric": m in SUM_ROWS,
+            "expandable": False,
+            "breakdown": [],
+        }
+        if m == "Exceptional Items" and exceptional is not None:
+            row["expandable"] = True
+            row["breakdown"] = _exceptional_breakdown(*exceptional, cols)
+        rows.append(row)
+
+        if m in FISCAL_BS_SPACER_AFTER and not equity_spacer_added:
+            rows.append({"spacer": True})
+            equity_spacer_added = True
+
+    return {"dates": [mat.dates[c].strftime("%b %Y") for c in cols], "rows": rows}
+
+
+def _exceptional_breakdown(exc, nonzero, cols):
+    """Breakdown rows in the order pivot_fiscal_items discovers them: newest period first, then item order."""
+    seen = {}
+    for c in cols:
+        rows = np.flatnonzero(nonzero[:, c])
+        for i in rows[np.argsort(exc.keys[rows, c], kind="stable")].tolist():
+            seen.setdefault(exc.names[i], i)
+    floats = np.ones(exc.values.shape, dtype=bool)
+    cells = _cell_objects(exc.values[:, cols], nonzero[:, cols], floats[:, cols])
+    return [{"metric": name, "values": cells[i].tolist()} for name, i in seen.items()]
+
+
+def build_statement_table(items, statement):
+    """Display table for one statement's [(metric, date, value), ...] items via the array engine."""
+    mat = StatementMatrix.from_items(items)
+    if statement == "BS":
+        mat = preprocess_fiscal_bs_matrix(mat)
+    result, exceptional = transform_fiscal_matrix(mat)
+    return pivot_fiscal_matrix(result, exceptional if statement == "IS" else None)
+
+
+def build_statement_tables_bulk(company_ids):
+    """
+    Run the fiscal display pipeline for several companies off one read of the financial store.
+    Returns {company_id: {"IS": table, "BS": table, "CF": table}}.
+    """
+    # metric_id only: names are resolved from the in-process dictionary, not a join.
+    items = financial_rows(company_ids)
+    names = metric_names({m for _, _, m, _, _ in items})
+    dropped = metric_table().action == ACTION_DROP
+
+    buckets = defaultdict(list)
+    for c, st, m, d, v in items:
+        if not dropped[m]:
+            buckets[c, st].append((names[m], d, v))
+
+    return {
+        c: {st: build_statement_table(buckets[c, st], st) for st in ("IS", "BS", "CF")}
+        for c in company_ids
+    }
+
+
+def build_statement_tables(company):
+    """
+    Run the fiscal display pipeline over a company's stored financials.
+    Returns {"IS": table, "BS": table, "CF": table} as produced by pivot_fiscal_items.
+    """
+    return build_statement_tables_bulk([company.pk])[company.pk]
+
+
+def rebuild_statement_tables(company, touch=True):
+    """
+    Rebuild and persist the rendered statements for a company. Call after writing its financials.
+    ``touch`` bumps the company's page cache version; read paths filling a missing store skip it.
+    """
+    tables = build_statement_tables(company)
+    CompanyStatements.objects.update_or_create(company=company, defaults={"tables": tables})
+    if touch:
+        touch_companies([company.pk])
+    return tables
+
+
+def get_statement_tables(company):
+    """
+    Return the rendered statements for a company with a single primary-key lookup,
+    building and storing them first if missing (e.g. data loaded before the store existed).
+    """
+    tables = CompanyStatements.objects.filter(company=company).values_list("tables", flat=True).first()
+    if tables is None:
+        tables = rebuild_statement_tables(company, touch=False)
+    return tables
+
+
+def get_statement_table(company, statement):
+    """
+    Return one rendered statement, extracting just that key from the store in the query
+    so the other two tables are never shipped or decoded.
+    """
+    table = (
+        CompanyStatements.objects.filter(company=company)
+        .values_list(f"tables__{statement}", flat=True)
+        .first()
+    )
+    if table is None:
+        table = rebuild_statement_tables(company, touch=False)[statement]
+    return table
+
+
+def get_statement_table_bulk(company_ids, statement):
+    """
+    One rendered statement for each of several companies: a single read of the store,
+    plus one shared build (persisted) for any companies not stored yet.
+    Returns {company_id: table}.
+    """
+    tables = dict(
+        CompanyStatements.objects.filter(company_id__in=company_ids)
+        .values_list("company_id", f"tables__{statement}")
+    )
+    missing = [c for c in company_ids if tables.get(c) is None]
+    if missing:
+        built = build_statement_tables_bulk(missing)
+        CompanyStatements.objects.bulk_create(
+            [CompanyStatements(company_id=c, tables=t) for c, t in built.items()],
+            ignore_conflicts=True,
+        )
+        tables.update((c, t[statement]) for c, t in built.items())
+    return tables
+
+
+def align_statement_tables(tables):
+    """
+    Align several statement tables on shared axes for side-by-side comparison.
+    ``tables`` is a list of tables (one per company). Returns
+    {"periods": [...], "metrics": [{"metric", "sum_metric", "values": company x period}]}
+    with periods newest first and metrics in the order the companies present them.
+    """
+    periods = sorted(
+        {d for table in tables for d in table["dates"]},
+        key=lambda d: datetime.strptime(d, "%b %Y"),
+        reverse=True,
+    )
+    col_of = {d: i for i, d in enumerate(periods)}
+
+    # Merge row orders: a metric missing so far is placed after the previous metric of its own table.
+    order, sum_metric = [], {}
+    for table in tables:
+        at = 0
+        for row in table["rows"]:
+            m = row.get("metric")
+            if m is None:
+                continue
+            if m in sum_metric:
+                at = order.index(m) + 1
+            else:
+                order.insert(at, m)
+                sum_metric[m] = row["sum_metric"]
+                at += 1
+
+    grid = {m: [[None] * len(periods) for _ in tables] for m in order}
+    for k, table in enumerate(tables):
+        cols = [col_of[d] for d in table["dates"]]
+        for row in table["rows"]:
+            if "metric" in row:
+                cells = grid[row["metric"]][k]
+                for c, v in zip(cols, row["values"]):
+                    cells[c] = v
+
+    return {
+        "periods": periods,
+        "metrics": [{"metric": m, "sum_metric": sum_metric[m], "values": grid[m]} for m in order],
+    }
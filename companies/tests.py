@@ -1,15 +1,45 @@
+import gzip
 import json
-from datetime import date
+import random
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
 from io import StringIO
 from tempfile import NamedTemporaryFile
-from unittest.mock import patch
+from unittest import skipUnless
+from unittest.mock import Mock, patch
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
 
 from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
 from django.core.management import call_command
-from django.test import RequestFactory, TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
-from companies.models import Company, Financial, FinancialMetric, Follow, Notification
-from companies.utils import normalize_exchange, yfinance_symbol
+from companies.models import (
+    Company, CompanyMetricSnapshot, CompanyStatements, Financial, FinancialMetric, Follow, Note, Notification,
+    PackedFinancial, PriceBlock, PriceRollup, StockPrice,
+)
+from companies import financial_store, price_cache, price_frames, price_store, statements
+from companies.bulk_write import bulk_upsert
+from companies.management.commands.build_revenue_prune_candidates import revenue_prune_candidates
+from companies.management.commands.partition_financials import CHANGES, COLUMNS, catch_up
+from companies.management.commands.storage_report import table_stats
+from companies.db_router import PIN_COOKIE, ReplicaRouter, read_alias, read_replica
+from companies.metric_names import RELOAD_SECONDS, bump_metric_names_version, metric_ids, metric_names
+from companies.metric_taxonomy import (
+    ACTION_COMBINE, ACTION_DROP, ACTION_EXCEPTIONAL, canonical_metric_name, metric_table,
+)
+from companies.slug_cache import company_slugs, get_company_by_slug
+from companies.snapshots import rebuild_metric_snapshots
+from companies.statements import build_statement_table, rebuild_statement_tables
+from companies.utils import SQLValidator, execute_screener_query, normalize_exchange, yfinance_symbol
 from companies.views import (
     CompanyDetailView,
     follow_company,
@@ -74,6 +104,7 @@ class CompanyDetailFiscalPipelineTests(TestCase):
         # Original fiscal name should not leak to display
         self.assertNotIn("Total Revenues", metric_names)
 
+    @override_settings(LAZY_STATEMENT_TABS=False)
     def test_detail_view_handles_empty_financials(self):
         slug = f"{self.company.exchange}-{self.company.ticker}"
         request = self.factory.get(f"/companies/{slug}/")
@@ -85,6 +116,1113 @@ class CompanyDetailFiscalPipelineTests(TestCase):
         self.assertEqual(response.context_data["BS_table"]["rows"], [])
         self.assertEqual(response.context_data["CF_table"]["rows"], [])
 
+    def test_detail_view_serves_stored_statements(self):
+        self._add_financial("IS", "Total Revenues", date(2024, 12, 31), 1000)
+        rebuild_statement_tables(self.company)
+        # Rows written without a rebuild must not show up until the store is rebuilt.
+        self._add_financial("IS", "Net Income", date(2024, 12, 31), 120)
+        slug = f"{self.company.exchange}-{self.company.ticker}"
+
+        def rendered_metrics():
+            request = self.factory.get(f"/companies/{slug}/")
+            request.user = AnonymousUser()
+            response = CompanyDetailView.as_view()(request, slug=slug)
+            response.render()
+            return [row["metric"] for row in response.context_data["IS_table"]["rows"] if "metric" in row]
+
+        self.assertEqual(rendered_metrics(), ["Revenue"])
+        rebuild_statement_tables(self.company)
+        self.assertEqual(rendered_metrics(), ["Revenue", "Net Income"])
+
+    def test_detail_view_builds_missing_store(self):
+        self._add_financial("IS", "Total Revenues", date(2024, 12, 31), 1000)
+        slug = f"{self.company.exchange}-{self.company.ticker}"
+        request = self.factory.get(f"/companies/{slug}/")
+        request.user = AnonymousUser()
+        CompanyDetailView.as_view()(request, slug=slug).render()
+
+        stored = CompanyStatements.objects.get(company=self.company)
+        self.assertEqual(stored.tables["IS"]["dates"], ["Dec 2024"])
+
+    @override_settings(LAZY_STATEMENT_TABS=True)
+    def test_lazy_tabs_render_income_statement_only(self):
+        self._add_financial("IS", "Total Revenues", date(2024, 12, 31), 1000)
+        self._add_financial("BS", "Total Assets", date(2024, 12, 31), 5000)
+        slug = f"{self.company.exchange}-{self.company.ticker}"
+        request = self.factory.get(f"/companies/{slug}/")
+        request.user = AnonymousUser()
+        response = CompanyDetailView.as_view()(request, slug=slug)
+        response.render()
+
+        self.assertEqual(response.context_data["IS_table"]["dates"], ["Dec 2024"])
+        self.assertIsNone(response.context_data["BS_table"])
+        self.assertNotIn(b"Total Assets", response.content)
+
+        fragment = self.client.get(f"/companies/{slug}/financials/BS/")
+        self.assertEqual(fragment.status_code, 200)
+        self.assertContains(fragment, "Total Assets")
+        self.assertEqual(self.client.get(f"/companies/{slug}/financials/XX/").status_code, 404)
+
+
+
+class StatementJsonApiTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc", FYE_month=12)
+        metric = FinancialMetric.objects.create(name="Total Revenues")
+        Financial.objects.create(
+            company=self.company, statement="IS", metric=metric, period_end_date=date(2024, 12, 31), value=1000,
+        )
+        rebuild_statement_tables(self.company)
+        self.url = "/companies/LSE-TEST/financials/IS.json"
+
+    def test_returns_statement_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("ETag"))
+        payload = response.json()
+        self.assertEqual(payload["dates"], ["Dec 2024"])
+        self.assertEqual(payload["rows"][0]["metric"], "Revenue")
+
+    def test_if_none_match_skips_financials_table(self):
+        etag = self.client.get(self.url)["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('"companies_financial"' in q["sql"] for q in queries.captured_queries))
+
+    def test_etag_changes_after_rebuild(self):
+        etag = self.client.get(self.url)["ETag"]
+        rebuild_statement_tables(self.company)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_first_response_without_store_has_etag(self):
+        CompanyStatements.objects.all().delete()
+        for url in (self.url, "/companies/LSE-TEST/financials/BS/"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertTrue(response.has_header("ETag"), url)
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_unknown_statement(self):
+        self.assertEqual(self.client.get("/companies/LSE-TEST/financials/XX.json").status_code, 404)
+
+
+class CompanyPageCacheTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc", FYE_month=12)
+        self.url = "/companies/LSE-TEST/"
+
+    def test_anonymous_page_served_from_cache(self):
+        self.assertContains(self.client.get(self.url), "Test Plc")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, "Test Plc")
+        self.assertFalse(any("companies_companystatements" in q["sql"] for q in queries.captured_queries))
+        self.assertNotContains(response, "follow/status/")
+
+    def test_company_write_invalidates_cached_page(self):
+        self.client.get(self.url)
+        self.company.name = "Renamed Plc"
+        self.company.save(update_fields=["name", "updated_at"])
+        self.assertContains(self.client.get(self.url), "Renamed Plc")
+
+    def test_user_specific_state_comes_from_endpoints(self):
+        user = User.objects.create_user(username="u1", password="pw")
+        other = User.objects.create_user(username="u2", password="pw")
+        Note.objects.create(user=user, company=self.company, content="mine", folder="Ideas")
+        Note.objects.create(user=other, company=self.company, content="theirs")
+        Follow.objects.create(user=user, company=self.company)
+        self.client.force_login(user)
+
+        page = self.client.get(self.url)
+        self.assertNotContains(page, "mine")
+        self.assertContains(page, 'id="follow-btn"')
+        self.assertContains(page, "/follow/status/")
+        notes = self.client.get(f"{self.url}notes/").json()
+        self.assertEqual([n["content"] for n in notes["notes"]], ["mine"])
+        self.assertEqual(notes["folders"], ["Ideas"])
+        self.assertEqual(self.client.get(f"{self.url}follow/status/").json(), {"following": True})
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        company_slugs.clear()
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc", FYE_month=12)
+        self.routed = []
+        real = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            # Record the routing decision but serve from the single test database.
+            self.routed.append(real(router, model, **hints) or "default")
+            return None
+
+        patches = [
+            patch("companies.db_router.replica_configured", return_value=True),
+            patch.object(ReplicaRouter, "db_for_read", spy),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_read_only_views_use_replica(self):
+        for url in ["/api/search/?q=Test", "/sitemap.xml", "/companies/LSE-TEST/", "/companies/LSE-TEST/discussion/threads/"]:
+            self.routed.clear()
+            self.client.cookies.clear()  # the company page may write (lazy statement build), which pins
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+            self.assertIn("replica", self.routed, url)
+            self.assertNotIn("default", self.routed, url)
+
+    def test_other_views_and_writes_use_primary(self):
+        user = User.objects.create_user(username="u1", password="pw")
+        self.client.force_login(user)
+        self.routed.clear()
+        self.assertEqual(self.client.get("/companies/LSE-TEST/follow/status/").json(), {"following": False})
+        self.assertNotIn("replica", self.routed)
+
+        response = self.client.post("/companies/LSE-TEST/follow/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        # The same client's next reads stay on the primary while the pin cookie lasts.
+        self.routed.clear()
+        self.client.get("/api/search/?q=Test")
+        self.assertNotIn("replica", self.routed)
+
+    def test_write_inside_replica_view_pins_rest_of_request(self):
+        router = ReplicaRouter()
+
+        @read_replica
+        def view(request):
+            before = read_alias()
+            self.assertEqual(router.db_for_write(Company), "default")
+            return before, read_alias()
+
+        self.assertEqual(view(RequestFactory().get("/")), ("replica", "default"))
+        self.assertEqual(read_alias(), "default")
+
+    def test_screener_sql_uses_replica_connection(self):
+        with patch("companies.utils.read_connection", return_value=connection) as read_conn:
+            results, error = execute_screener_query("SELECT id, ticker, name FROM companies_company")
+        self.assertEqual(error, "")
+        self.assertEqual(results[0]["ticker"], "TEST")
+        read_conn.assert_called_once()
+
+
+class MetricNamesTests(TestCase):
+    def test_resolves_bulk_created_and_renamed_metrics(self):
+        revenue = FinancialMetric.objects.create(name="Total Revenues")
+        self.assertEqual(metric_names([revenue.id])[revenue.id], "Total Revenues")
+
+        # bulk_create sends no signals; an unknown id triggers the reload.
+        FinancialMetric.objects.bulk_create([FinancialMetric(name="Net Income")])
+        net_income = FinancialMetric.objects.get(name="Net Income")
+        self.assertEqual(metric_names([net_income.id])[net_income.id], "Net Income")
+
+        revenue.name = "Revenue"
+        revenue.save()
+        self.assertEqual(metric_names()[revenue.id], "Revenue")
+        self.assertEqual(metric_ids(["Revenue", "Missing"]), [revenue.id])
+
+    def test_missing_names_reload_once(self):
+        revenue = FinancialMetric.objects.create(name="Total Revenues")
+        metric_ids(["Total Revenues"])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(metric_ids(["Total Revenues", "Missing"]), [revenue.id])
+            self.assertEqual(metric_ids(["Missing"]), [])
+            metric_names([10**9])
+            metric_names([10**9])
+        self.assertEqual(len(queries), 2)  # one reload for the unknown name, one for the unknown id
+
+        # Names created with bulk_create show up once the writer bumps the version.
+        FinancialMetric.objects.bulk_create([FinancialMetric(name="Missing")])
+        bump_metric_names_version()
+        self.assertEqual(len(metric_ids(["Missing"])), 1)
+
+        # Other processes' changes can't bump a per-process cache: loads expire.
+        FinancialMetric.objects.filter(pk=revenue.pk).update(name="Revenue")
+        self.assertEqual(metric_names()[revenue.id], "Total Revenues")
+        with patch("companies.metric_names.time.monotonic", return_value=time.monotonic() + RELOAD_SECONDS + 1):
+            self.assertEqual(metric_names()[revenue.id], "Revenue")
+
+    def test_statement_build_does_not_join_metrics(self):
+        company = Company.objects.create(ticker="TEST", exchange="LSE", FYE_month=12)
+        metric = FinancialMetric.objects.create(name="Total Revenues")
+        Financial.objects.create(
+            company=company, statement="IS", metric=metric, period_end_date=date(2024, 12, 31), value=1000,
+        )
+        metric_names([metric.id])
+        with CaptureQueriesContext(connection) as queries:
+            tables = statements.build_statement_tables(company)
+        self.assertEqual(tables["IS"]["rows"][0]["metric"], "Revenue")
+        self.assertFalse(any("companies_financialmetric" in q["sql"] for q in queries.captured_queries))
+
+
+class SlugCacheTests(TestCase):
+    def setUp(self):
+        company_slugs.clear()
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc")
+
+    def test_repeat_lookups_skip_database(self):
+        get_company_by_slug("LSE-TEST")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_company_by_slug("LSE-TEST").pk, self.company.pk)
+
+    def test_save_and_delete_evict(self):
+        get_company_by_slug("LSE-TEST")
+        self.company.name = "Renamed Plc"
+        self.company.save()
+        self.assertEqual(get_company_by_slug("LSE-TEST").name, "Renamed Plc")
+
+        self.company.delete()
+        with self.assertRaises(Company.DoesNotExist):
+            get_company_by_slug("LSE-TEST")
+
+
+class MetricTaxonomyTests(TestCase):
+    def test_rules_compile_to_metric_id_arrays(self):
+        ids = {
+            name: FinancialMetric.objects.create(name=name).id
+            for name in ["Total Revenues", "EBITDA", "Provision for Bad Debts", "Asset Writedown", "Net Income"]
+        }
+        table = metric_table()
+        self.assertEqual(table.target[ids["Total Revenues"]], "Revenue")
+        self.assertEqual(table.action[ids["EBITDA"]], ACTION_DROP)
+        self.assertEqual(table.action[ids["Provision for Bad Debts"]], ACTION_COMBINE)
+        self.assertEqual(table.target[ids["Provision for Bad Debts"]], "Other Operating Expenses")
+        self.assertEqual(table.action[ids["Asset Writedown"]], ACTION_EXCEPTIONAL)
+        self.assertTrue(table.sum_row[ids["Net Income"]])
+        self.assertEqual(table.ids_with(ACTION_DROP), [ids["EBITDA"]])
+
+    def test_prune_deletes_dropped_metrics_only(self):
+        company = Company.objects.create(ticker="TEST", exchange="LSE")
+        for name in ["EBITDA", "Net Income"]:
+            Financial.objects.create(
+                company=company, statement="IS", metric=FinancialMetric.objects.create(name=name),
+                period_end_date=date(2024, 12, 31), value=1,
+            )
+        call_command("prune_financial_metrics", stdout=StringIO())
+        self.assertEqual(list(Financial.objects.values_list("metric__name", flat=True)), ["Net Income"])
+
+
+class MetricAliasTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc", FYE_month=12)
+
+    def _add(self, name, period, value):
+        metric, _ = FinancialMetric.objects.get_or_create(name=name)
+        Financial.objects.create(company=self.company, statement="IS", metric=metric, period_end_date=period, value=value)
+
+    def test_canonical_metric_name(self):
+        self.assertEqual(canonical_metric_name("Gain (Loss) On Sale Of Assets"), "Gain (Loss) on Sale of Assets")
+        self.assertEqual(canonical_metric_name("Gain (Loss) on Sale of Assets, Total"), "Gain (Loss) on Sale of Assets")
+        self.assertEqual(canonical_metric_name("income (loss) on equity  invest."), "Income (Loss) on Equity Invest.")
+        # Sign-flipped line is a different item.
+        self.assertEqual(canonical_metric_name("(Income) Loss on Equity Invest."), "(Income) Loss on Equity Invest.")
+        self.assertEqual(canonical_metric_name("Some New Line"), "Some New Line")
+
+    def test_merge_command_moves_cells_and_keeps_canonical_values(self):
+        self._add("Gain (Loss) on Sale of Assets", date(2024, 12, 31), 5)
+        self._add("Gain (Loss) On Sale Of Assets", date(2024, 12, 31), 7)
+        self._add("Gain (Loss) On Sale Of Assets", date(2023, 12, 31), 3)
+        self._add("Gain (Loss) on Sale of Assets, Total", date(2022, 12, 31), 1)
+
+        call_command("merge_metric_aliases", stdout=StringIO())
+
+        self.assertEqual(
+            list(FinancialMetric.objects.filter(name__startswith="Gain (Loss)").values_list("name", flat=True)),
+            ["Gain (Loss) on Sale of Assets"],
+        )
+        values = dict(Financial.objects.filter(company=self.company).values_list("period_end_date__year", "value"))
+        self.assertEqual(values, {2024: 5, 2023: 3, 2022: 1})
+        self.assertTrue(CompanyStatements.objects.filter(company=self.company).exists())
+
+    def test_ingest_stores_canonical_metric(self):
+        self.company.pass_annual_financials({
+            "IS": [["", "2023", "2024"], ["Total Revenues", "1", "1"], ["Gain (Loss) On Sale Of Assets", "2", "3"]],
+            "CF": [["", "2023", "2024"], ["Net Income", "1", "2"]],
+        })
+        self.assertFalse(FinancialMetric.objects.filter(name="Gain (Loss) On Sale Of Assets").exists())
+        self.assertEqual(
+            Financial.objects.filter(company=self.company, metric__name="Gain (Loss) on Sale of Assets").count(), 2,
+        )
+
+
+class CompareApiTests(TestCase):
+    def setUp(self):
+        revenue = FinancialMetric.objects.create(name="Total Revenues")
+        net_income = FinancialMetric.objects.create(name="Net Income")
+        self.aaa = Company.objects.create(ticker="AAA", exchange="LSE", name="Aaa", FYE_month=12)
+        self.bbb = Company.objects.create(ticker="BBB", exchange="LSE", name="Bbb", FYE_month=3)
+        rows = [
+            (self.aaa, revenue, date(2024, 12, 31), 100),
+            (self.aaa, net_income, date(2024, 12, 31), 10),
+            (self.bbb, revenue, date(2024, 3, 31), 200),
+        ]
+        for company, metric, period, value in rows:
+            Financial.objects.create(company=company, statement="IS", metric=metric, period_end_date=period, value=value)
+        self.url = "/api/compare/?slugs=LSE-AAA,LSE-BBB&statement=IS"
+
+    def test_aligns_companies_and_periods(self):
+        with CaptureQueriesContext(connection) as queries:
+            payload = self.client.get(self.url).json()
+        self.assertEqual(sum('FROM "companies_financial"' in q["sql"] for q in queries.captured_queries), 1)
+        self.assertEqual([c["slug"] for c in payload["companies"]], ["LSE-AAA", "LSE-BBB"])
+        self.assertEqual(payload["periods"], ["Dec 2024", "Mar 2024"])
+        self.assertEqual(payload["metrics"][0], {
+            "metric": "Revenue", "sum_metric": False, "values": [[100, None], [None, 200]],
+        })
+        self.assertEqual(payload["metrics"][1]["values"], [[10, None], [None, None]])
+
+    def test_cached_until_a_company_changes(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse(any("companies_companystatements" in q["sql"] for q in queries.captured_queries))
+
+        Financial.objects.filter(company=self.bbb).update(value=300)
+        rebuild_statement_tables(self.bbb)
+        payload = self.client.get(self.url).json()
+        self.assertEqual(payload["metrics"][0]["values"][1], [None, 300])
+
+    def test_rejects_unknown_companies(self):
+        response = self.client.get("/api/compare/?slugs=LSE-AAA,LSE-ZZZ")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["slugs"], ["LSE-ZZZ"])
+
+
+class MetricSnapshotTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc", FYE_month=12)
+        figures = {
+            date(2023, 12, 31): [("IS", "Total Revenues", 800), ("IS", "Net Income", 40)],
+            date(2024, 12, 31): [
+                ("IS", "Total Revenues", 1000), ("IS", "Gross Profit", 400), ("IS", "Operating Income", 150),
+                ("IS", "Net Income", 100), ("CF", "Cash from Operations", 180), ("CF", "Capital Expenditure", -30),
+                ("BS", "Total Assets", 2000), ("BS", "Total Equity", 500), ("BS", "Total Liabilities", 1500),
+            ],
+        }
+        for period, rows in figures.items():
+            for statement, name, value in rows:
+                metric, _ = FinancialMetric.objects.get_or_create(name=name)
+                Financial.objects.create(
+                    company=self.company, statement=statement, metric=metric, period_end_date=period, value=value,
+                )
+
+    def test_ratios_per_period(self):
+        self.assertEqual(rebuild_metric_snapshots([self.company.pk]), 2)
+        prior, latest = CompanyMetricSnapshot.objects.filter(company=self.company).order_by("period_end_date")
+        self.assertIsNone(prior.revenue_growth)
+        self.assertIsNone(prior.gross_margin)
+        self.assertAlmostEqual(latest.revenue_growth, 0.25)
+        self.assertAlmostEqual(latest.gross_margin, 0.4)
+        self.assertAlmostEqual(latest.operating_margin, 0.15)
+        self.assertEqual(latest.free_cash_flow, 150)
+        self.assertAlmostEqual(latest.roe, 0.2)
+        self.assertAlmostEqual(latest.liabilities_to_equity, 3.0)
+
+        # Rebuilding replaces rather than duplicates.
+        rebuild_metric_snapshots([self.company.pk])
+        self.assertEqual(CompanyMetricSnapshot.objects.filter(company=self.company).count(), 2)
+
+    def test_inputs_resolved_without_metric_reloads(self):
+        rebuild_metric_snapshots([self.company.pk])  # most candidate names don't exist here
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_metric_snapshots([self.company.pk])
+        self.assertFalse(any("companies_financialmetric" in q["sql"] for q in queries.captured_queries))
+
+    def test_detail_page_and_screener_use_snapshots(self):
+        rebuild_metric_snapshots([self.company.pk])
+        self.assertContains(self.client.get("/companies/LSE-TEST/"), "Gross margin")
+        valid, _ = SQLValidator.validate(
+            "SELECT c.id, c.ticker, c.name FROM companies_company c "
+            "JOIN companies_companymetricsnapshot s ON s.company_id = c.id WHERE s.net_margin > 0.1"
+        )
+        self.assertTrue(valid)
+
+
+class PackedFinancialStorageTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc", FYE_month=12)
+        for statement, name, period, value in [
+            ("IS", "Total Revenues", date(2023, 12, 31), 800),
+            ("IS", "Total Revenues", date(2024, 12, 31), 1000),
+            ("IS", "Net Income", date(2024, 12, 31), -120),
+            ("BS", "Total Assets", date(2024, 12, 31), 5_000_000_000_000),
+        ]:
+            metric, _ = FinancialMetric.objects.get_or_create(name=name)
+            Financial.objects.create(
+                company=self.company, statement=statement, metric=metric, period_end_date=period, value=value,
+            )
+
+    def test_pack_round_trip_skips_empty_cells(self):
+        cells = [(7, date(2024, 12, 31), -5), (3, date(2023, 6, 30), 2**40), (3, date(2024, 12, 31), 0)]
+        self.assertCountEqual(financial_store.unpack(**financial_store.pack(cells)), cells)
+        self.assertEqual(financial_store.unpack(**financial_store.pack(cells), only_metrics={7}), [cells[0]])
+
+    def test_packed_layout_reads_like_rows(self):
+        rows = financial_store.financial_rows([self.company.pk])
+        tables = statements.build_statement_tables(self.company)
+
+        with override_settings(FINANCIAL_STORAGE="packed"):
+            call_command("pack_financials", "--delete-rows", stdout=StringIO())
+            self.assertFalse(Financial.objects.exists())
+            self.assertEqual(PackedFinancial.objects.filter(company=self.company).count(), 2)
+            self.assertCountEqual(financial_store.financial_rows([self.company.pk]), rows)
+            self.assertEqual(statements.build_statement_tables(self.company), tables)
+
+    @override_settings(FINANCIAL_STORAGE="packed")
+    def test_packed_writes_keep_existing_values(self):
+        financial_store.pack_companies([self.company.pk], delete_rows=True)
+        revenue = FinancialMetric.objects.get(name="Total Revenues")
+        financial_store.store_financials([
+            Financial(company=self.company, statement="IS", metric=revenue, period_end_date=date(2024, 12, 31), value=1),
+            Financial(company=self.company, statement="IS", metric=revenue, period_end_date=date(2025, 12, 31), value=1200),
+        ])
+        values = {
+            d: v for _, st, m, d, v in financial_store.financial_rows([self.company.pk]) if m == revenue.pk
+        }
+        self.assertEqual(values, {date(2023, 12, 31): 800, date(2024, 12, 31): 1000, date(2025, 12, 31): 1200})
+        self.assertTrue(financial_store.has_financials(self.company))
+
+    @override_settings(FINANCIAL_STORAGE="packed")
+    def test_prune_commands_read_packed_layout(self):
+        dropped = FinancialMetric.objects.create(name="EBITDA")
+        financial_store.pack_companies([self.company.pk], delete_rows=True)
+        financial_store.store_financials([
+            Financial(company=self.company, statement="IS", metric=dropped, period_end_date=date(2024, 12, 31), value=5),
+        ])
+
+        candidates, _, missing = revenue_prune_candidates(max_revenue=2000, large_cap_guard=10**12)
+        self.assertEqual(missing, 0)
+        self.assertEqual([(r["latest_revenue"], r["period_end_date"]) for r in candidates], [(1000, date(2024, 12, 31))])
+
+        out = StringIO()
+        call_command("prune_financial_metrics", stdout=out)
+        self.assertIn("Deleted 1 PackedFinancial cells", out.getvalue())
+        names = metric_names()
+        self.assertNotIn("EBITDA", {names[m] for _, _, m, _, _ in financial_store.financial_rows([self.company.pk])})
+        self.assertEqual(len(financial_store.financial_rows([self.company.pk])), 4)
+
+    def test_screener_hides_financial_rows_when_packed(self):
+        sql = (
+            "SELECT c.id, c.ticker, c.name FROM companies_company c "
+            "JOIN companies_financial f ON f.company_id = c.id"
+        )
+        self.assertTrue(SQLValidator.validate(sql)[0])
+        with override_settings(FINANCIAL_STORAGE="packed"):
+            self.assertEqual(SQLValidator.validate(sql), (False, "Table not allowed: companies_financial"))
+            self.assertTrue(SQLValidator.validate(
+                "SELECT c.id, c.ticker, c.name FROM companies_company c "
+                "JOIN companies_companymetricsnapshot s ON s.company_id = c.id WHERE s.revenue_growth > 0"
+            )[0])
+
+    def test_size_report(self):
+        out = StringIO()
+        call_command("pack_financials", "--report", stdout=out)
+        self.assertIn("4 Financial rows", out.getvalue())
+        self.assertIn("0 PackedFinancial records", out.getvalue())
+
+
+class PartitionFinancialsCommandTests(TestCase):
+    def test_sqlite_keeps_single_table(self):
+        out = StringIO()
+        call_command("partition_financials", stdout=out)
+        self.assertIn("keeps the single companies_financial table", out.getvalue())
+
+    def test_dry_run_prints_partition_plan(self):
+        out = StringIO()
+        call_command("partition_financials", "--dry-run", "--partitions", "4", stdout=out)
+        plan = out.getvalue()
+        self.assertIn("PARTITION BY HASH (company_id)", plan)
+        self.assertEqual(plan.count("PARTITION OF companies_financial_p "), 4)
+        self.assertIn("RENAME CONSTRAINT uniq_company_period_statement_metric_p TO uniq_company_period_statement_metric", plan)
+        self.assertLess(plan.index("CREATE TRIGGER"), plan.index("SELECT id, company_id"))
+        self.assertLess(plan.index("LOCK TABLE"), plan.index("DROP TRIGGER"))
+
+    def _copy_then_catch_up(self, during_copy):
+        """
+        Copy companies_financial as the batches would, apply writes, then run the catch-up.
+        SQLite triggers stand in for the PostgreSQL change-log trigger from setup_sql().
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE companies_financial_p (id integer, company_id integer, period_end_date date, "
+                "statement varchar(2), metric_id integer, value bigint, created_at datetime, "
+                "UNIQUE (company_id, period_end_date, statement, metric_id))"
+            )
+            cursor.execute(f"CREATE TABLE {CHANGES} (seq integer PRIMARY KEY AUTOINCREMENT, id integer NOT NULL)")
+            for event, ids in (("INSERT", ["NEW.id"]), ("UPDATE", ["OLD.id", "NEW.id"]), ("DELETE", ["OLD.id"])):
+                values = ", ".join(f"({i})" for i in ids)
+                cursor.execute(
+                    f"CREATE TRIGGER {CHANGES}_{event.lower()} AFTER {event} ON companies_financial "
+                    f"BEGIN INSERT INTO {CHANGES} (id) VALUES {values}; END"
+                )
+            cursor.execute(f"INSERT INTO companies_financial_p ({COLUMNS}) SELECT {COLUMNS} FROM companies_financial")
+            during_copy()
+            replayed = catch_up(cursor)
+            self.assertEqual(catch_up(cursor), 0)
+            cursor.execute(f"SELECT {COLUMNS} FROM companies_financial_p ORDER BY id")
+            copied = cursor.fetchall()
+            cursor.execute(f"SELECT {COLUMNS} FROM companies_financial ORDER BY id")
+            self.assertEqual(copied, cursor.fetchall())
+            for event in ("insert", "update", "delete"):
+                cursor.execute(f"DROP TRIGGER {CHANGES}_{event}")
+            cursor.execute(f"DROP TABLE {CHANGES}")
+            cursor.execute("DROP TABLE companies_financial_p")
+        return copied, replayed
+
+    def _financials(self):
+        company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc")
+        old, new = FinancialMetric.objects.create(name="Revenues"), FinancialMetric.objects.create(name="Revenue")
+        cell = Financial.objects.create(company=company, period_end_date=date(2024, 12, 31), statement="IS", metric=old, value=10)
+        return company, cell, new
+
+    def test_catch_up_carries_metric_changes(self):
+        company, cell, canonical = self._financials()
+        for year in range(2015, 2024):
+            Financial.objects.create(company=company, period_end_date=date(year, 12, 31), statement="IS",
+                                     metric=cell.metric, value=year)
+        copied, replayed = self._copy_then_catch_up(
+            lambda: Financial.objects.filter(pk=cell.pk).update(metric=canonical)
+        )
+        self.assertEqual(copied[0][4], canonical.pk)
+        self.assertEqual(replayed, 1)  # only the row written during the copy
+
+    def test_catch_up_keeps_reinserted_key(self):
+        company, cell, _ = self._financials()
+
+        def reinsert():
+            cell.delete()
+            Financial.objects.create(company=company, period_end_date=cell.period_end_date, statement="IS",
+                                     metric=cell.metric, value=12)
+        copied, replayed = self._copy_then_catch_up(reinsert)
+        self.assertEqual(len(copied), 1)
+        self.assertEqual(copied[0][5], 12)
+        self.assertEqual(replayed, 2)
+
+
+class StorageReportCommandTests(TestCase):
+    def setUp(self):
+        self.small = Company.objects.create(ticker="TINY", exchange="AIM", name="Tiny Plc", market_cap=1_000_000)
+        self.big = Company.objects.create(ticker="BIG", exchange="LSE", name="Big Plc", market_cap=10**10)
+        revenue = FinancialMetric.objects.create(name="Revenue")
+        dropped = FinancialMetric.objects.create(name="Weighted Average Diluted Shares Outstanding Adj.")
+        for company, value in ((self.small, 1_000), (self.big, 10**9)):
+            for year in (2022, 2023, 2024):
+                Financial.objects.create(
+                    company=company, statement="IS", metric=revenue, period_end_date=date(year, 12, 31), value=value,
+                )
+        Financial.objects.create(company=self.big, statement="IS", metric=dropped, period_end_date=date(2024, 12, 31), value=1)
+        StockPrice.objects.create(company=self.small, date=date(2020, 1, 2), open=1, high=1, low=1, close=1, volume=1)
+
+    def test_json_report_breaks_down_rows_and_prune_rules(self):
+        out = StringIO()
+        with patch("companies.management.commands.storage_report.metric_table") as table:
+            table.return_value.ids_with.return_value = list(
+                FinancialMetric.objects.filter(name__startswith="Weighted").values_list("id", flat=True)
+            )
+            call_command("storage_report", "--format", "json", "--top", "1", "--price-row-days", "30", stdout=out)
+        report = json.loads(out.getvalue())
+
+        tables = {t["table"]: t for t in report["tables"]}
+        self.assertEqual(tables["companies_financial"]["rows"], 7)
+        self.assertEqual(report["statements"], [{"statement": "IS", "rows": 7, "bytes": report["statements"][0]["bytes"]}])
+        self.assertEqual(report["metrics"]["distinct"], 2)
+        self.assertEqual([m["name"] for m in report["metrics"]["top"]], ["Revenue"])
+        self.assertEqual({e["exchange"]: e["financial_rows"] for e in report["exchanges"]}, {"LSE": 4, "AIM": 3})
+        self.assertEqual(len(report["companies"]), 1)
+
+        rules = {r["rule"]: r for r in report["prune_rules"]}
+        self.assertEqual(rules["drop_metrics"]["rows"], 1)
+        self.assertEqual(rules["low_revenue_companies"]["companies"], 1)
+        self.assertEqual(rules["low_revenue_companies"]["rows"], 4)  # 3 financial rows + 1 price row
+        self.assertEqual(rules["price_row_window"]["rows"], 1)
+
+    def test_text_report(self):
+        out = StringIO()
+        call_command("storage_report", stdout=out)
+        text = out.getvalue()
+        self.assertIn("companies_financial", text)
+        self.assertIn("Candidate prune rules", text)
+        self.assertIn("low_revenue_companies: 1 companies, 4 rows", text)
+
+    @skipUnless(connection.vendor == "postgresql", "partitions need PostgreSQL")
+    def test_partitions_counted_once_under_parent(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE TABLE report_parts (id integer, company_id integer) PARTITION BY HASH (company_id)")
+            for i in range(2):
+                cursor.execute(f"CREATE TABLE report_parts_{i} PARTITION OF report_parts FOR VALUES WITH (MODULUS 2, REMAINDER {i})")
+        names = [t["table"] for t in table_stats()]
+        self.assertIn("report_parts", names)
+        self.assertNotIn("report_parts_0", names)
+        self.assertNotIn("report_parts_1", names)
+
+
+class PriceStoreTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc")
+
+    def _bars(self, days, base=100.0):
+        dates = np.array(days, dtype="datetime64[D]")
+        close = base + np.arange(len(days), dtype=np.float64)
+        return dates, np.vstack([close - 1, close + 1, close - 2, close]), np.arange(len(days)) * 1000
+
+    def test_block_round_trip_scales_large_prices(self):
+        dates = np.array(["2024-01-02", "2024-12-31"], dtype="datetime64[D]")
+        ohlc = np.array([[12.3456, 712345.5]] * 4)
+        block = price_store.encode_block(2024, dates, ohlc, [5, 2**40])
+        self.assertEqual(block["decimals"], 3)
+        decoded_dates, decoded, volume = price_store.decode_block(2024, **block)
+        np.testing.assert_array_equal(decoded_dates, dates)
+        np.testing.assert_allclose(decoded, np.round(ohlc, 3))
+        self.assertEqual(volume.tolist(), [5, 2**40])
+
+    def test_store_folds_in_rows_and_keeps_existing_days(self):
+        StockPrice.objects.create(
+            company=self.company, date=date(2023, 12, 29), open=1, high=2, low=1, close=2, volume=10,
+        )
+        dates, ohlc, volume = self._bars(["2023-12-29", "2024-01-02", "2024-01-03"])
+        price_store.store_prices(self.company.pk, dates, ohlc, volume)
+
+        self.assertEqual(PriceBlock.objects.filter(company=self.company).count(), 2)
+        series = price_store.load_prices(self.company.pk)
+        self.assertEqual(series["close"].tolist(), [2.0, 101.0, 102.0])
+        self.assertEqual(price_store.latest_price_date(self.company.pk), date(2024, 1, 3))
+        self.assertEqual(price_store.load_prices(self.company.pk, start=date(2024, 1, 3))["volume"].tolist(), [2000])
+
+    @override_settings(PRICE_ROW_DAYS=0)
+    def test_daily_rows_optional(self):
+        StockPrice.objects.create(
+            company=self.company, date=date(2023, 12, 29), open=1, high=2, low=1, close=2, volume=10,
+        )
+        price_store.store_prices(self.company.pk, *self._bars(["2024-01-02"]))
+        self.assertFalse(StockPrice.objects.exists())
+        self.assertEqual(len(price_store.load_prices(self.company.pk)["date"]), 2)
+
+    def test_chart_served_from_blocks(self):
+        today = timezone.localdate()
+        days = [today - timezone.timedelta(days=n) for n in (40, 3, 1)]
+        price_store.store_prices(self.company.pk, *self._bars(days))
+
+        with patch("companies.views.yf.Ticker", side_effect=AssertionError("yfinance should not be called")):
+            payload = self.client.get("/companies/LSE-TEST/prices/1m/").json()
+        self.assertEqual([p["time"] for p in payload["price_data"]], [d.isoformat() for d in days[1:]])
+        self.assertEqual(payload["volume_data"][0], {"time": days[1].isoformat(), "value": 1000, "color": "#26a69a"})
+
+
+    def test_columnar_chart_format(self):
+        today = timezone.localdate()
+        days = [today - timezone.timedelta(days=n) for n in (300, *range(120, 0, -1))]
+        price_store.store_prices(self.company.pk, *self._bars(days))
+        points = self.client.get("/companies/LSE-TEST/prices/1y/").json()
+
+        response = self.client.get("/companies/LSE-TEST/prices/1y/?format=columnar&delta=1", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        columns = json.loads(gzip.decompress(response.content))
+        self.assertEqual(columns["unit"], "d")
+        self.assertEqual(columns["t"][1:], [180] + [1] * 119)
+        self.assertEqual(columns["c"][:2], [100.0, 101.0])
+
+        epoch_days = np.cumsum(columns["t"]).astype("datetime64[D]")
+        self.assertEqual([p["time"] for p in points["price_data"]], np.datetime_as_string(epoch_days).tolist())
+        self.assertEqual(price_frames.chart_payload({**columns, "t": np.cumsum(columns["t"]).tolist()}), points)
+
+    def test_streaming_export(self):
+        price_store.store_prices(self.company.pk, *self._bars(["2023-12-29", "2024-01-02", "2024-01-03"]))
+        legacy = Company.objects.create(ticker="OLD", exchange="NYSE", name="Old Inc")
+        StockPrice.objects.create(company=legacy, date=date(2024, 1, 2), open=1, high=2, low=1, close=1.5, volume=10)
+
+        self.assertEqual(self.client.get("/api/prices/export/?slugs=LSE-TEST").status_code, 302)
+        self.client.force_login(User.objects.create_user("quant", password="x"))
+        response = self.client.get("/api/prices/export/?slugs=LSE-TEST,NYSE-OLD&from=2024-01-01")
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [
+            "slug,date,open,high,low,close,volume",
+            "LSE-TEST,2024-01-02,100.0,102.0,99.0,101.0,1000",
+            "LSE-TEST,2024-01-03,101.0,103.0,100.0,102.0,2000",
+            "NYSE-OLD,2024-01-02,1.0,2.0,1.0,1.5,10",
+        ])
+
+        response = self.client.get("/api/prices/export/?slugs=NYSE-OLD&format=ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(rows, [
+            {"slug": "NYSE-OLD", "date": "2024-01-02", "open": 1.0, "high": 2.0, "low": 1.0, "close": 1.5, "volume": 10},
+        ])
+        self.assertEqual(self.client.get("/api/prices/export/?slugs=LSE-NOPE").status_code, 404)
+
+    def test_resample_weekly_and_monthly(self):
+        dates, ohlc, volume = self._bars(["2025-01-30", "2025-01-31", "2025-02-03", "2025-02-04", "2025-02-10"])
+        series = {"date": dates, **dict(zip(price_store.PRICE_FIELDS, ohlc)), "volume": volume}
+
+        weekly = price_store.resample(series, "week")
+        self.assertEqual(weekly["date"].astype(str).tolist(), ["2025-01-27", "2025-02-03", "2025-02-10"])
+        self.assertEqual(weekly["open"].tolist(), [99.0, 101.0, 103.0])
+        self.assertEqual(weekly["high"].tolist(), [102.0, 104.0, 105.0])
+        self.assertEqual(weekly["low"].tolist(), [98.0, 100.0, 102.0])
+        self.assertEqual(weekly["close"].tolist(), [101.0, 103.0, 104.0])
+        self.assertEqual(weekly["volume"].tolist(), [1000, 5000, 4000])
+
+        monthly = price_store.resample(series, "month")
+        self.assertEqual(monthly["date"].astype(str).tolist(), ["2025-01-01", "2025-02-01"])
+        self.assertEqual(monthly["close"].tolist(), [101.0, 104.0])
+        self.assertEqual(monthly["volume"].tolist(), [1000, 9000])
+
+    def test_rollups_maintained_incrementally(self):
+        price_store.store_prices(self.company.pk, *self._bars(["2025-01-30", "2025-01-31", "2025-02-03", "2025-02-04"]))
+        bars = lambda freq: list(
+            PriceRollup.objects.filter(company=self.company, freq=freq)
+            .order_by("period_start").values_list("period_start", "last_date", "close", "volume")
+        )
+        self.assertEqual(bars("W"), [
+            (date(2025, 1, 27), date(2025, 1, 31), Decimal("101"), 1000),
+            (date(2025, 2, 3), date(2025, 2, 4), Decimal("103"), 5000),
+        ])
+        self.assertEqual(len(bars("M")), 2)
+
+        with patch("companies.price_store.bulk_upsert", wraps=price_store.bulk_upsert) as upsert:
+            price_store.store_prices(self.company.pk, *self._bars(["2025-02-05"], base=110.0))
+        rollup_rows = [list(c.args[2]) for c in upsert.call_args_list if c.args[0] is PriceRollup]
+        self.assertEqual(len(rollup_rows[0]), 2)  # only the open week and month
+        self.assertEqual(bars("W")[-1], (date(2025, 2, 3), date(2025, 2, 5), Decimal("110"), 5000))
+        self.assertEqual(bars("M")[-1], (date(2025, 2, 1), date(2025, 2, 5), Decimal("110"), 5000))
+        self.assertEqual(bars("M")[0][2:], (Decimal("101"), 1000))
+
+        PriceRollup.objects.all().delete()
+        call_command("rebuild_price_rollups", stdout=StringIO())
+        self.assertEqual(PriceRollup.objects.count(), 4)
+        self.assertTrue(SQLValidator.validate(
+            "SELECT c.id, c.ticker, c.name, MAX(pr.high) AS high_52w FROM companies_company c "
+            "JOIN companies_pricerollup pr ON pr.company_id = c.id WHERE pr.freq = 'W' GROUP BY c.id"
+        )[0])
+
+    def test_long_charts_served_from_rollups(self):
+        today = timezone.localdate()
+        days = [today - timezone.timedelta(days=n) for n in (4000, 400, 1)]
+        price_store.store_prices(self.company.pk, *self._bars(days))
+        with patch("companies.views.load_prices", side_effect=AssertionError("daily prices should not be read")):
+            full = self.client.get("/companies/LSE-TEST/prices/max/").json()
+        self.assertEqual([p["close"] for p in full["price_data"]], [100.0, 101.0, 102.0])
+
+    def test_batch_update_groups_downloads_by_start(self):
+        other = Company.objects.create(ticker="OTHER", exchange="LSE", name="Other Plc")
+        fresh = Company.objects.create(ticker="NEW", exchange="NASDAQ", name="New Inc")
+        for company in (self.company, other):
+            price_store.store_prices(company.pk, *self._bars(["2024-01-02", "2024-01-03"]))
+        self.assertEqual(
+            price_store.latest_price_dates([self.company.pk, other.pk, fresh.pk]),
+            {self.company.pk: date(2024, 1, 3), other.pk: date(2024, 1, 3)},
+        )
+
+        calls = []
+
+        def download(symbols, start=None, end=None, period=None, **kwargs):
+            calls.append((sorted(symbols), start, period))
+            index = pd.to_datetime(["2024-01-04", "2024-01-05"])
+            bars = pd.DataFrame(
+                {"Open": [1.0, 2.0], "High": [2.0, 3.0], "Low": [0.5, 1.5], "Close": [1.5, 2.5], "Volume": [10, 20]},
+                index=index,
+            )
+            return pd.concat({symbol: bars for symbol in symbols}, axis=1)
+
+        with patch("companies.management.commands.update_prices.yf.download", side_effect=download):
+            call_command("update_prices", batch=True, delay=0, stdout=StringIO())
+
+        self.assertEqual(sorted(calls, key=lambda c: c[1] or ""), [
+            (["NEW"], None, "max"),
+            (["OTHER.L", "TEST.L"], "2024-01-04", None),
+        ])
+        self.assertEqual(price_store.load_prices(other.pk)["close"].tolist(), [100.0, 101.0, 1.5, 2.5])
+        self.assertEqual(price_store.latest_price_date(fresh.pk), date(2024, 1, 5))
+        self.assertTrue(PriceRollup.objects.filter(company=fresh, freq="W").exists())
+
+    def test_batch_update_continues_past_failed_batch(self):
+        other = Company.objects.create(ticker="OTHER", exchange="LSE", name="Other Plc")
+
+        def download(symbols, **kwargs):
+            bars = pd.DataFrame(
+                {"Open": [1.0], "High": [2.0], "Low": [0.5], "Close": [1.5], "Volume": [10]},
+                index=pd.to_datetime(["2024-01-04"]),
+            )
+            return pd.concat({symbol: bars for symbol in symbols}, axis=1)
+
+        def store(batch):
+            if self.company.pk in batch:
+                raise ValueError("price too large for a price block")
+            return price_store.store_price_batch(batch)
+
+        err = StringIO()
+        with patch("companies.management.commands.update_prices.yf.download", side_effect=download), \
+                patch("companies.management.commands.update_prices.store_price_batch", side_effect=store):
+            call_command("update_prices", batch=True, batch_size=1, workers=1, delay=0, stdout=StringIO(), stderr=err)
+
+        self.assertIn("storing 1 symbols from TEST.L failed", err.getvalue())
+        self.assertEqual(price_store.latest_price_date(other.pk), date(2024, 1, 4))
+        self.assertIsNone(price_store.latest_price_date(self.company.pk))
+
+    def test_batch_update_counts_symbols_without_data(self):
+        Company.objects.create(ticker="GONE", exchange="LSE", name="Delisted Plc")
+
+        def download(symbols, **kwargs):
+            bars = pd.DataFrame(
+                {"Open": [1.0], "High": [2.0], "Low": [0.5], "Close": [1.5], "Volume": [10]},
+                index=pd.to_datetime(["2024-01-04"]),
+            )
+            return pd.concat({symbol: bars for symbol in symbols if symbol != "GONE.L"}, axis=1)
+
+        out = StringIO()
+        with patch("companies.management.commands.update_prices.yf.download", side_effect=download):
+            call_command("update_prices", batch=True, delay=0, stdout=out)
+        self.assertIn("for 1 companies, 1 with no data, 0 failed, 0 up to date", out.getvalue())
+        self.assertIn("[2/2]", out.getvalue())
+
+    def test_frame_conversion(self):
+        index = pd.DatetimeIndex(["2025-06-10 00:00", "2025-06-11 00:00", "2025-06-12 00:00"], tz="America/New_York")
+        df = pd.DataFrame(
+            {"Open": [1.0, 2.0, None], "High": [2.0, 3.0, None], "Low": [0.5, 1.5, None],
+             "Close": [1.5, 1.0, None], "Volume": [10, 20, None]},
+            index=index,
+        )
+        daily = price_frames.frame_payload(df)
+        self.assertEqual(daily["price_data"][1], {"time": "2025-06-11", "open": 2.0, "high": 3.0, "low": 1.5, "close": 1.0})
+        self.assertEqual([v["color"] for v in daily["volume_data"]], ["#26a69a", "#ef5350"])
+        self.assertEqual(price_frames.frame_payload(df, intraday=True)["volume_data"][0]["time"], int(index[0].timestamp()))
+
+        dates, ohlc, volume = price_frames.frame_arrays(df)
+        self.assertEqual(
+            price_frames.price_rows(self.company.pk, dates, ohlc, volume)[0],
+            (self.company.pk, date(2025, 6, 10), 1.0, 2.0, 0.5, 1.5, 10),
+        )
+
+    def test_long_charts_served_from_stored_rows(self):
+        today = timezone.localdate()
+        days = [today - timezone.timedelta(days=n) for n in (4000, 400, 1)]
+        for d in days:
+            StockPrice.objects.create(company=self.company, date=d, open=1, high=2, low=1, close=2, volume=10)
+
+        with patch("companies.views.yf.Ticker", side_effect=AssertionError("yfinance should not be called")):
+            five_year = self.client.get("/companies/LSE-TEST/prices/5y/").json()
+            full = self.client.get("/companies/LSE-TEST/prices/max/").json()
+        monday = lambda d: (d - timezone.timedelta(days=d.weekday())).isoformat()
+        self.assertEqual([p["time"] for p in five_year["price_data"]], [monday(days[1]), monday(days[2])])
+        self.assertEqual(len(full["price_data"]), 3)
+        self.assertEqual(full["price_data"][0]["time"], days[0].replace(day=1).isoformat())
+
+
+class PriceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        company_slugs.clear()
+
+    def test_freshness_follows_market_hours(self):
+        london = ZoneInfo("Europe/London")
+        wednesday_open = datetime(2025, 6, 11, 10, 0, tzinfo=london)
+        self.assertTrue(price_cache.market_open("LSE", wednesday_open))
+        self.assertFalse(price_cache.market_open("NMS", wednesday_open))  # 05:00 in New York
+        self.assertEqual(price_cache.fresh_seconds("LSE", "1d", wednesday_open), 60)
+        # Just after the close quotes are still settling.
+        self.assertEqual(price_cache.fresh_seconds("LSE", "1d", datetime(2025, 6, 11, 16, 40, tzinfo=london)), 60)
+
+        friday_evening = datetime(2025, 6, 13, 18, 0, tzinfo=london)
+        self.assertEqual(price_cache.next_open("LSE", friday_evening), datetime(2025, 6, 16, 8, 0, tzinfo=london))
+        self.assertEqual(price_cache.fresh_seconds("LSE", "1y", friday_evening), (2 * 24 + 14) * 3600)
+
+    def test_stale_entry_served_while_refreshing(self):
+        fetch = Mock(side_effect=[{"v": 1}, {"v": 2}])
+        spawned = []
+        with patch("companies.price_cache._spawn", side_effect=spawned.append):
+            self.assertEqual(price_cache.cached_chart("TEST.L", "LSE", "1d", fetch), {"v": 1})
+            self.assertEqual(price_cache.cached_chart("TEST.L", "LSE", "1d", fetch), {"v": 1})
+            self.assertEqual(fetch.call_count, 1)
+
+            key = price_cache._key("TEST.L", "1d")
+            cache.set(key, {**cache.get(key), "fresh_until": 0})
+            self.assertEqual(price_cache.cached_chart("TEST.L", "LSE", "1d", fetch), {"v": 1})
+            self.assertEqual(price_cache.cached_chart("TEST.L", "LSE", "1d", fetch), {"v": 1})
+            self.assertEqual(len(spawned), 1)  # one refresh for both stale hits
+        spawned[0]()
+        self.assertEqual(price_cache.cached_chart("TEST.L", "LSE", "1d", fetch), {"v": 2})
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {"v": 1}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(price_cache.cached_chart("TEST.L", "LSE", "5d", fetch)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        while not calls:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"v": 1}] * 5)
+
+    def test_view_uses_cache(self):
+        Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc")
+        index = pd.DatetimeIndex(["2025-06-11 10:00", "2025-06-11 10:05"], tz="Europe/London")
+        df = pd.DataFrame({"Open": [1.0, 2.0], "High": [2.0, 3.0], "Low": [0.5, 1.5], "Close": [1.5, 1.0], "Volume": [10, 20]}, index=index)
+        with patch("companies.views.yf.Ticker") as ticker:
+            ticker.return_value.history.return_value = df
+            first = self.client.get("/companies/LSE-TEST/prices/1d/").json()
+            second = self.client.get("/companies/LSE-TEST/prices/1d/").json()
+        self.assertEqual(first, second)
+        self.assertEqual(ticker.return_value.history.call_count, 1)
+        self.assertEqual(first["volume_data"][1], {"time": int(index[1].timestamp()), "value": 20, "color": "#ef5350"})
+
+
+class BulkUpsertTests(TestCase):
+    def test_skip_or_update_conflicts(self):
+        company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc")
+        metric = FinancialMetric.objects.create(name="Total Revenues")
+        fields = ["company_id", "period_end_date", "statement", "metric_id", "value"]
+        unique = ["company", "period_end_date", "statement", "metric"]
+        rows = [(company.pk, date(2024, 12, 31), "IS", metric.pk, 1000), (company.pk, date(2023, 12, 31), "IS", metric.pk, 800)]
+
+        self.assertEqual(bulk_upsert(Financial, fields, rows, unique_fields=unique), 2)
+        self.assertTrue(all(Financial.objects.values_list("created_at", flat=True)))
+
+        restated = [(company.pk, date(2024, 12, 31), "IS", metric.pk, 1100)]
+        bulk_upsert(Financial, fields, restated, unique_fields=unique)
+        self.assertEqual(Financial.objects.get(period_end_date=date(2024, 12, 31)).value, 1000)
+        self.assertEqual(bulk_upsert(Financial, fields, restated, unique_fields=unique, update_fields=["value"]), 1)
+        self.assertEqual(Financial.objects.get(period_end_date=date(2024, 12, 31)).value, 1100)
+
+        # Unchanged rows aren't rewritten; SQLite gets its null-safe operator.
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk_upsert(Financial, fields, restated, unique_fields=unique, update_fields=["value"]), 0)
+        if connection.vendor == "sqlite":
+            upsert = next(q["sql"] for q in queries.captured_queries if "ON CONFLICT" in q["sql"])
+            self.assertIn("IS NOT EXCLUDED", upsert)
+            self.assertNotIn("DISTINCT FROM", upsert)
+
+    @skipUnless(connection.vendor == "postgresql", "COPY staging path needs PostgreSQL")
+    def test_copy_merge_on_postgres(self):
+        company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc")
+        rows = [(company.pk, date(2024, 1, d), 1.0, 2.0, 0.5, 1.5, 10 * d) for d in (2, 3)]
+        fields = ["company_id", "date", "open", "high", "low", "close", "volume"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(bulk_upsert(StockPrice, fields, rows, unique_fields=["company", "date"]), 2)
+        self.assertTrue(any("bulk_upsert_stage" in q["sql"] for q in queries.captured_queries))
+        updated = [(company.pk, date(2024, 1, 3), 1.0, 2.0, 0.5, 1.75, 30)]
+        self.assertEqual(bulk_upsert(StockPrice, fields, updated, ["company", "date"], update_fields=["close"]), 1)
+        self.assertEqual(StockPrice.objects.get(date=date(2024, 1, 3)).close, Decimal("1.75"))
+        self.assertEqual(bulk_upsert(StockPrice, fields, updated, ["company", "date"], update_fields=["close"]), 0)
+
+
+class SaveCachedFinancialsUpsertTests(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(ticker="TEST", exchange="LSE", name="Test Plc", FYE_month=12)
+
+    def _load(self, rows, *args):
+        payload = {"TEST": {"exchange": "LSE", "IS": [["Income Statement", "Dec '23", "Dec '24"], *rows]}}
+        out = StringIO()
+        with NamedTemporaryFile("w+", suffix=".json") as f:
+            json.dump(payload, f)
+            f.flush()
+            call_command("save_cached_financials", "--file", f.name, *args, stdout=out)
+        return out.getvalue()
+
+    def _values(self):
+        return {
+            (m, d.year): v
+            for m, d, v in Financial.objects.filter(company=self.company).values_list("metric__name", "period_end_date", "value")
+        }
+
+    def test_upsert_writes_only_changed_cells(self):
+        self._load([["Total Revenues", "800", "1,000"], ["Net Income", "40", "(10)"]])
+        # Without --upsert a company that already has financials is skipped.
+        self.assertIn("Already has financials", self._load([["Total Revenues", "800", "1,100"]]))
+        self.assertEqual(self._values()[("Total Revenues", 2024)], 1000)
+
+        out = self._load([["Total Revenues", "800", "1,100"], ["Net Income", "40", "(10)"]], "--upsert")
+        self.assertIn("inserted 0, updated 1, unchanged 3, deleted 0", out)
+        self.assertIn("Rows inserted: 0, updated: 1, unchanged: 3, deleted: 0", out)
+        self.assertEqual(self._values()[("Total Revenues", 2024)], 1100)
+        self.assertEqual(Financial.objects.filter(company=self.company).count(), 4)
+
+    def test_delete_missing_metrics(self):
+        self._load([["Total Revenues", "800", "1,000"], ["Net Income", "40", "(10)"]])
+        out = self._load([["Total Revenues", "800", "1,000"]], "--upsert", "--delete-missing")
+        self.assertIn("deleted 2", out)
+        self.assertEqual(set(self._values()), {("Total Revenues", 2023), ("Total Revenues", 2024)})
+
+    @override_settings(FINANCIAL_STORAGE="packed")
+    def test_upsert_packed(self):
+        self._load([["Total Revenues", "800", "1,000"]])
+        out = self._load([["Total Revenues", "900", "1,000"], ["Net Income", "40", "50"]], "--upsert")
+        self.assertIn("inserted 2, updated 1, unchanged 1", out)
+        revenue = {
+            d.year: v for _, _, m, d, v in financial_store.financial_rows([self.company.pk])
+            if m == FinancialMetric.objects.get(name="Total Revenues").pk
+        }
+        self.assertEqual(revenue, {2023: 900, 2024: 1000})
+
+
+class StatementEngineTests(TestCase):
+    def _reference(self, items, statement):
+        if statement == "BS":
+            items = statements.preprocess_fiscal_bs(items)
+        transformed, exceptional = statements.transform_fiscal_items(items)
+        if statement == "IS":
+            return statements.pivot_fiscal_items(transformed, exceptional)
+        return statements.pivot_fiscal_items(transformed)
+
+    def test_exceptional_items_rollup(self):
+        items = [
+            ("Total Revenues", date(2023, 12, 31), 900),
+            ("Total Revenues", date(2024, 12, 31), 1000),
+            ("EBT, Incl. Unusual Items", date(2024, 12, 31), 150),
+            ("Impairment of Goodwill", date(2024, 12, 31), -30),
+            ("Income Tax Expense", date(2024, 12, 31), -40),
+        ]
+        table = build_statement_table(items, "IS")
+
+        self.assertEqual(table, self._reference(items, "IS"))
+        metrics = [row["metric"] for row in table["rows"]]
+        self.assertEqual(metrics, [
+            "Revenue", "PBT before Exceptional Items", "Exceptional Items", "Profit Before Tax", "Income Tax Expense",
+        ])
+        exceptional = table["rows"][2]
+        self.assertTrue(exceptional["expandable"])
+        self.assertEqual(exceptional["breakdown"], [{"metric": "Impairment of Goodwill", "values": [-30.0, None]}])
+
+    def test_matches_reference_pipeline(self):
+        names = (
+            list(statements.FISCAL_METRIC_RENAMES) + list(statements.FISCAL_METRICS_COMBINE)
+            + statements.EXCEPTIONAL_ITEMS_METRICS[:6] + statements.FISCAL_METRICS_DROP[:4]
+            + sorted(statements.FISCAL_BS_CASH_COMPONENTS) + sorted(statements.FISCAL_BS_CASH_TOTALS)
+            + ["Income Tax Expense", "Other Operating Expenses", "Liabilities", "Total Equity", "Net Income"]
+        )
+        for seed in range(50):
+            rng = random.Random(seed)
+            dates = [date(2000 + y, 12, 31) for y in rng.sample(range(30), 5)]
+            items = [
+                (m, d, rng.choice([0, rng.randint(-10**6, 10**6)]))
+                for m in rng.sample(names, 20) for d in dates if rng.random() < 0.8
+            ]
+            rng.shuffle(items)
+            for statement in ("IS", "BS", "CF"):
+                # Compare serialized output so int vs float values must match too.
+                self.assertEqual(
+                    json.dumps(build_statement_table(list(items), statement)),
+                    json.dumps(self._reference(list(items), statement)),
+                    msg=f"seed={seed} statement={statement}",
+                )
 
 
 class AddCompaniesByCsvTests(TestCase):
@@ -8,9 +8,13 @@ urlpatterns = [
     path("notifications/<int:notification_id>/read/", views.notification_mark_read, name="notification-mark-read"),
     path("<str:slug>/", views.CompanyDetailView.as_view(), name="company-detail"),
     path("<str:slug>/follow/", views.follow_company, name="follow-company"),
+    path("<str:slug>/follow/status/", views.follow_status, name="follow-status"),
     path("<str:slug>/unfollow/", views.unfollow_company, name="unfollow-company"),
     path("<str:slug>/alerts/", views.alert_preferences, name="alert-preferences"),
+    path("<str:slug>/financials/<str:statement>.json", views.statement_json, name="statement-json"),
+    path("<str:slug>/financials/<str:statement>/", views.statement_fragment, name="statement-fragment"),
     path("<str:slug>/prices/<str:period>/", views.intraday_prices, name="intraday-prices"),
+    path("<str:slug>/notes/", views.company_notes, name="company-notes"),
     path("<str:slug>/notes/add/", views.add_note, name="add-note"),
     path("<str:slug>/news/", views.regulatory_newsfeed, name="regulatory-newsfeed"),
     path("<str:slug>/discussion/threads/", views.discussion_threads, name="discussion-threads"),
@@ -3,7 +3,9 @@ import datetime as dt
 import os
 import re
 import requests
-from django.db import connection
+from django.conf import settings
+
+from companies.db_router import read_connection
 
 
 YF_SUFFIX_BY_EXCHANGE = {
@@ -79,7 +81,14 @@ class SQLValidator:
     ALLOWED_TABLES = {
         "companies_company",
         "companies_financial",
+        "companies_companymetricsnapshot",
         "companies_stockprice",
+        "companies_pricerollup",
+    }
+
+    # Not queryable with FINANCIAL_STORAGE=packed: values live in PackedFinancial blobs and these rows go stale.
+    ROW_STORAGE_TABLES = {
+        "companies_financial",
     }
 
     BLOCKED_KEYWORDS = [
@@ -127,7 +136,7 @@ class SQLValidator:
         cte_names = {name.lower() for name in re.findall(cte_name_pattern, sql_upper)}
 
         # Build set of allowed names (tables + CTEs)
-        allowed_names = {t.lower() for t in cls.ALLOWED_TABLES} | cte_names
+        allowed_names = {t.lower() for t in cls.allowed_tables()} | cte_names
 
         # Verify only allowed tables/CTEs are referenced in FROM/JOIN
         table_pattern = r'\b(FROM|JOIN|INTO)\s+([a-zA-Z_][a-zA-Z0-9_]*)'
@@ -138,6 +147,12 @@ class SQLValidator:
 
         return True, ""
 
+    @classmethod
+    def allowed_tables(cls) -> set[str]:
+        if settings.FINANCIAL_STORAGE == "packed":
+            return cls.ALLOWED_TABLES - cls.ROW_STORAGE_TABLES
+        return set(cls.ALLOWED_TABLES)
+
 
 def execute_screener_query(sql: str, limit: int = 100) -> tuple[list[dict], str]:
     """
@@ -162,7 +177,7 @@ def execute_screener_query(sql: str, limit: int = 100) -> tuple[list[dict], str]
                 sql = re.sub(r'LIMIT\s+\d+', f'LIMIT 500', sql, flags=re.IGNORECASE)
 
     try:
-        with connection.cursor() as cursor:
+        with read_connection().cursor() as cursor:
             cursor.execute(sql)
             columns = [col[0] for col in cursor.description]
             results = []
@@ -198,7 +213,8 @@ Table: companies_company (alias: c)
 - market_cap: BIGINT - Market capitalization in local currency
 - shares_outstanding: BIGINT - Number of shares outstanding
 - FYE_month: SMALLINT - Fiscal year end month (1-12)
-
+"""
+    financial_rows_schema = """
 Table: companies_financialmetric (alias: m)
 - id: SMALLINT PRIMARY KEY
 - name: VARCHAR(255) - Name of the financial metric
@@ -241,6 +257,19 @@ Key Cash Flow (CF) metrics:
 - 'Depreciation & Amortization' or 'Depreciation & Amortization, Total'
 - 'Stock-Based Compensation'
 - 'Free Cash Flow' (may not exist for all companies)
+"""
+    schema_tail = """
+Table: companies_companymetricsnapshot (alias: s) - PRECOMPUTED per-period figures and ratios; prefer this over joining companies_financial
+- company_id: INTEGER FOREIGN KEY -> companies_company.id
+- period_end_date: DATE - One row per company and financial period
+- revenue, gross_profit, operating_income, net_income, operating_cash_flow, capex, free_cash_flow,
+  total_assets, total_liabilities, total_equity, shares: BIGINT - Raw figures (thousands of local currency), NULL if unavailable
+- gross_margin, operating_margin, net_margin, fcf_margin: REAL - Fractions of revenue (0.25 = 25%)
+- revenue_growth: REAL - Revenue vs the company's previous period (0.10 = +10%)
+- roe, roa: REAL - Net income / total equity, net income / total assets
+- liabilities_to_equity: REAL - Total liabilities / total equity
+- eps, fcf_per_share: REAL - Per weighted average diluted share
+- Ratios are NULL when undefined (missing input, zero or negative denominator)
 
 Table: companies_stockprice (alias: sp)
 - id: INTEGER PRIMARY KEY
@@ -249,29 +278,52 @@ Table: companies_stockprice (alias: sp)
 - open, high, low, close: DECIMAL
 - volume: BIGINT
 
+Table: companies_pricerollup (alias: pr) - PRECOMPUTED weekly/monthly bars; prefer this over companies_stockprice for multi-week ranges
+- company_id: INTEGER FOREIGN KEY -> companies_company.id
+- freq: 'W' (weekly) or 'M' (monthly)
+- period_start: DATE - Monday of the week / 1st of the month
+- last_date: DATE - Last trading day in the bar (the latest bar may be partial)
+- open, high, low, close: DECIMAL
+- volume: BIGINT
+
 IMPORTANT NOTES:
 - Banks and insurance companies may not have 'Gross Profit' or 'Cost of Goods Sold, Total'
 - Use LEFT JOIN when querying metrics that may not exist for all companies
 - Use NULLIF to avoid division by zero
 
-Common calculations:
-- Operating Margin = Operating Income / Total Revenues (or use 'Operating Margin' metric directly)
-- Net Margin = Net Income / Total Revenues
-- Gross Margin = Gross Profit / Total Revenues (or use 'Gross Profit Margin' metric directly)
-- Revenue Growth = (Current Revenue - Prior Revenue) / Prior Revenue
+Common calculations (already precomputed in companies_companymetricsnapshot):
+- Operating Margin = Operating Income / Total Revenues -> s.operating_margin
+- Net Margin = Net Income / Total Revenues -> s.net_margin
+- Gross Margin = Gross Profit / Total Revenues -> s.gross_margin
+- Revenue Growth = (Current Revenue - Prior Revenue) / Prior Revenue -> s.revenue_growth
 
 Rules:
 1. ALWAYS return these columns: c.id, c.ticker, c.name
 2. Include computed values as named columns
-3. Use table aliases: c for company, f for financial, sp for stockprice
+3. Use table aliases: c for company, f for financial, s for metric snapshot, sp for stockprice, pr for pricerollup
 4. Use CTEs (WITH clause) for complex period comparisons
 5. Only use SELECT statements - no INSERT, UPDATE, DELETE, etc.
 6. IMPORTANT: This is SQLite - use CAST(value AS REAL) for division to avoid integer division
 7. Return ONLY the SQL query, no explanation
 8. If the input is not a financial screening request (e.g. a greeting, unrelated question), respond with exactly: NOT_A_SCREENER_QUERY
 """
+    packed = settings.FINANCIAL_STORAGE == "packed"
+    if packed:
+        # Statement values are stored as packed blobs (companies.financial_store), not SQL rows.
+        schema_description += schema_tail + (
+            "\n- companies_financial and companies_financialmetric are NOT available; "
+            "screen on companies_companymetricsnapshot figures and ratios only\n"
+        )
+    else:
+        schema_description += financial_rows_schema + schema_tail
+    if settings.PRICE_ROW_DAYS is not None:
+        # Older daily prices live only in packed price blocks (companies.price_store), not in SQL.
+        schema_description += (
+            f"\n- companies_stockprice only holds the last {settings.PRICE_ROW_DAYS} days of prices; "
+            f"use companies_pricerollup for longer ranges\n"
+        )
 
-    few_shot_examples = """
+    revenue_growth_example = """
 Example 1: "Companies with positive revenue growth last year"
 WITH revenue AS (
   SELECT f.company_id, f.period_end_date, f.value,
@@ -288,20 +340,56 @@ FROM companies_company c
 JOIN revenue r1 ON c.id = r1.company_id AND r1.rn = 1
 JOIN revenue r2 ON c.id = r2.company_id AND r2.rn = 2
 WHERE r1.value > r2.value
+"""
+    gross_profit_example = """
+Example 4: "Companies with positive gross profit (excludes banks/insurance that don't have this metric)"
+WITH gross AS (
+  SELECT f.company_id, f.period_end_date, f.value,
+         ROW_NUMBER() OVER (PARTITION BY f.company_id ORDER BY f.period_end_date DESC) as rn
+  FROM companies_financial f
+  JOIN companies_financialmetric m ON f.metric_id = m.id
+  WHERE m.name = 'Gross Profit' AND f.statement = 'IS'
+)
+SELECT c.id, c.ticker, c.name, c.sector, g.value as gross_profit
+FROM companies_company c
+JOIN gross g ON c.id = g.company_id AND g.rn = 1
+WHERE g.value > 0
+"""
+    if packed:
+        revenue_growth_example = """
+Example 1: "Companies with positive revenue growth last year"
+WITH latest AS (
+  SELECT s.company_id, s.revenue, s.revenue_growth,
+         ROW_NUMBER() OVER (PARTITION BY s.company_id ORDER BY s.period_end_date DESC) as rn
+  FROM companies_companymetricsnapshot s
+)
+SELECT c.id, c.ticker, c.name,
+       l.revenue as latest_revenue,
+       ROUND(l.revenue_growth * 100, 2) as revenue_growth_pct
+FROM companies_company c
+JOIN latest l ON c.id = l.company_id AND l.rn = 1
+WHERE l.revenue_growth > 0
+"""
+        gross_profit_example = """
+Example 4: "Companies with positive gross profit (excludes banks/insurance that don't have this metric)"
+WITH gross AS (
+  SELECT s.company_id, s.gross_profit,
+         ROW_NUMBER() OVER (PARTITION BY s.company_id ORDER BY s.period_end_date DESC) as rn
+  FROM companies_companymetricsnapshot s
+)
+SELECT c.id, c.ticker, c.name, c.sector, g.gross_profit
+FROM companies_company c
+JOIN gross g ON c.id = g.company_id AND g.rn = 1
+WHERE g.gross_profit > 0
+"""
 
+    few_shot_examples = revenue_growth_example + """
 Example 2: "Stocks where average operating margin last 3 years exceeds prior 5 years"
 WITH margins AS (
-  SELECT f1.company_id, f1.period_end_date,
-         CAST(f1.value AS REAL) / NULLIF(f2.value, 0) as op_margin,
-         ROW_NUMBER() OVER (PARTITION BY f1.company_id ORDER BY f1.period_end_date DESC) as rn
-  FROM companies_financial f1
-  JOIN companies_financialmetric m1 ON f1.metric_id = m1.id
-  JOIN companies_financial f2 ON f1.company_id = f2.company_id
-    AND f1.period_end_date = f2.period_end_date
-    AND f2.statement = 'IS'
-  JOIN companies_financialmetric m2 ON f2.metric_id = m2.id
-  WHERE m1.name = 'Operating Income' AND f1.statement = 'IS'
-    AND m2.name = 'Total Revenues'
+  SELECT s.company_id, s.operating_margin as op_margin,
+         ROW_NUMBER() OVER (PARTITION BY s.company_id ORDER BY s.period_end_date DESC) as rn
+  FROM companies_companymetricsnapshot s
+  WHERE s.operating_margin IS NOT NULL
 ),
 recent AS (
   SELECT company_id, AVG(op_margin) as avg_margin
@@ -323,20 +411,7 @@ Example 3: "Companies in the Technology sector with market cap over 100 million"
 SELECT c.id, c.ticker, c.name, c.sector, c.market_cap
 FROM companies_company c
 WHERE c.sector = 'Technology' AND c.market_cap > 100000000
-
-Example 4: "Companies with positive gross profit (excludes banks/insurance that don't have this metric)"
-WITH gross AS (
-  SELECT f.company_id, f.period_end_date, f.value,
-         ROW_NUMBER() OVER (PARTITION BY f.company_id ORDER BY f.period_end_date DESC) as rn
-  FROM companies_financial f
-  JOIN companies_financialmetric m ON f.metric_id = m.id
-  WHERE m.name = 'Gross Profit' AND f.statement = 'IS'
-)
-SELECT c.id, c.ticker, c.name, c.sector, g.value as gross_profit
-FROM companies_company c
-JOIN gross g ON c.id = g.company_id AND g.rn = 1
-WHERE g.value > 0
-"""
+""" + gross_profit_example
 
     try:
         from openai import OpenAI
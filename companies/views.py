@@ -1,21 +1,42 @@
 from django.shortcuts import render, redirect
 from django.views.generic import DetailView
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST, condition
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth import login, logout as auth_logout
 from django.contrib import messages
-from collections import defaultdict
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from django.core.cache import cache
+from datetime import date
 from xml.sax.saxutils import escape
 import csv
+import hashlib
 import json
 import yfinance as yf
 import requests
 
 import os
-from companies.models import Company, Financial, StockPrice, Note, EmailVerificationToken, SavedScreen, Follow, AlertPreference, Notification
+from companies.db_router import read_alias, read_replica
+from companies.models import Company, CompanyStatements, Financial, Note, EmailVerificationToken, SavedScreen, Follow, AlertPreference, Notification
+from companies.page_cache import company_page_version, get_cached_page, set_cached_page
+from companies.price_cache import cached_chart
+from companies.price_frames import chart_payload, columnar_payload, frame_columns, series_columns
+from companies.price_store import ROLLUP_FREQS, iter_prices, load_prices, load_rollups, resample
+from companies.slug_cache import company_slugs, get_company_by_slug
+from companies.snapshots import key_ratios
 from companies.utils import send_verification_email, execute_screener_query, generate_screener_sql, yfinance_symbol
+from companies.statements import (
+    align_statement_tables,
+    get_statement_table,
+    get_statement_table_bulk,
+    get_statement_tables,
+    rebuild_statement_tables,
+)
 from django.db.models import Q
 from django.utils import timezone
 from django.db.models import Count, Q as DQ
@@ -24,9 +45,8 @@ from companies.models import DiscussionThread, DiscussionMessage, ChatSession, C
 
 
 def _get_company_by_slug(slug):
-    """Parse an EXCHANGE-TICKER slug and return the matching Company."""
-    exchange, _, ticker = slug.partition('-')
-    return Company.objects.get(exchange=exchange, ticker=ticker)
+    """Parse an EXCHANGE-TICKER slug and return the matching Company (served from the slug cache)."""
+    return get_company_by_slug(slug)
 
 
 ROBOTS_TXT = """\
@@ -41,6 +61,7 @@ def robots_txt(request):
     return HttpResponse(ROBOTS_TXT, content_type="text/plain")
 
 
+@read_replica
 def sitemap_xml(request):
     def add_url(path, lastmod=None, changefreq=None, priority=None):
         loc = escape(request.build_absolute_uri(path))
@@ -90,6 +111,7 @@ def home(request):
     return render(request, 'companies/home.html')
 
 
+@read_replica
 def search_api(request):
     q = request.GET.get('q', '').strip()
     if not q:
@@ -139,6 +161,18 @@ def follow_company(request, slug):
     return JsonResponse({"ok": True, "following": True})
 
 
+@login_required
+def follow_status(request, slug):
+    """Whether the current user follows a company (kept out of the cached page)."""
+    try:
+        company = _get_company_by_slug(slug)
+    except Company.DoesNotExist:
+        return JsonResponse({"error": "Company not found"}, status=404)
+
+    following = Follow.objects.filter(user=request.user, company=company).exists()
+    return JsonResponse({"following": following})
+
+
 @login_required
 @require_POST
 def unfollow_company(request, slug):
@@ -399,524 +433,238 @@ def regulatory_newsfeed(request, slug):
     })
 
 
-METRICS_IS = [
-    "Revenue",
-    "Cost of Goods Sold",
-    "Gross Profit",
-    "Sales, General, & Administrative",
-    "Other Operating Expense",
-    "Total Operating Expenses",
-    "Operating Profit",
-    "Net Interest Income",
-    "Other Non-Operating Income",
-    "Pre-Tax Income",
-    "Income Tax",
-    "Other Non-recurring",
-    "Net Income",
-    # "EPS (Basic)",
-    # "EPS (Diluted)",
-    "Shares (Basic)",
-    "Shares (Diluted)",
-]
-METRICS_BS = [
-    "Cash & Short-Term Investments",
-    "Accounts Receivable",
-    "Inventories",
-    "Other Current Assets",
-    "Total Current Assets",
-    "Property, Plant & Equipment",
-    "Goodwill",
-    "Other Intangible Assets",
-    "Other Assets",
-    "Total Assets",
-    None,  # spacer
-    "Accounts Payable",
-    "Tax Payable",
-    "Short-Term Debt",
-    "Current Portion of Capital Leases",
-    "Other Current Liabilities",
-    "Total Current Liabilities",
-    "Long-Term Debt",
-    "Capital Leases",
-    "Pension Liabilities",
-    "Other Liabilities",
-    "Total Liabilities",
-    "Retained Earnings",
-    "Paid-in Capital",
-    "Common Stock",
-    "Other",
-    "Shareholders' Equity",
-    None,  # spacer
-    "Liabilities & Equity",
-]
-# QFS BS metrics that combine multiple DB metrics for display
-QFS_BS_COMBINE = {
-    "Cash & Short-Term Investments": ["Cash & Equivalents", "Short-Term Investments"],
-}
-# QFS BS metrics with display name different from DB name
-QFS_BS_RENAME = {
-    "Property, Plant & Equipment": "Property, Plant, & Equipment (Net)",
-}
-METRICS_CF = [
-    "Net Income",
-    "Depreciation & Amortization",
-    "Change in Working Capital",
-    "Change in Deferred Tax",
-    "Stock-Based Compensation",
-    "Other",  # (operating)
-    "Cash From Operations",
-    "Property, Plant, & Equipment",
-    "Acquisitions",
-    "Intangibles",
-    "Other",  # (investing)
-    "Cash From Investing",
-    "Net Issuance of Common Stock",
-    "Net Issuance of Debt",
-    "Other",  # (financing)
-    "Cash From Financing",
-    "Free Cash Flow",
-]
-
-SUM_METRICS = [
-    "Gross Profit",
-    "Operating Profit",
-    "Pre-Tax Income",
-    "Net Income",
-    "Total Current Assets",
-    "Total Assets",
-    "Total Current Liabilities",
-    "Total Liabilities",
-    "Shareholders' Equity",
-    "Total Shareholders' Equity",
-    "Total Common Equity",
-    "Total Common Shareholders' Equity",
-    "Liabilities & Equity",
-    "Total Liabilities And Equity",
-    "Total Liabilities and Shareholders' Equity",
-    "Cash From Operations",
-    "Cash From Investing",
-    "Cash From Financing",
-]
-
-# Fiscal data display transformations (display only, not stored)
-FISCAL_METRIC_RENAMES = {
-    "Total Revenues": "Revenue",
-    "Cost of Goods Sold, Total": "Cost of Goods Sold",
-    "Amort. of Goodwill & Intang. Assets": "Amortization",
-    "Amortization of Goodwill and Intangible Assets": "Amortization",
-    "Selling, General & Administrative Expenses": "SG&A",
-    "Selling General & Admin Expenses, Total": "SG&A",
-    "Other Operating Expenses, Total": "Other Operating Expenses",
-    "Net Interest Expenses": "Net Interest Expense",
-    "EBT, Incl. Unusual Items": "Profit Before Tax",
-    "Weighted Avg. Shares Outstanding": "Basic Avg. Shares Outstanding",
-    "Weighted Avg. Shares Outstanding Dil": "Diluted Avg. Shares Outstanding",
-    "Net Property Plant And Equipment": "Property, Plant & Equipment",
-    "Net Property, Plant & Equipment": "Property, Plant & Equipment",
-}
+@method_decorator(read_replica, name="dispatch")
+class CompanyDetailView(DetailView):
+    model = Company
+    template_name = "companies/company_detail.html"
+    context_object_name = "company"
 
-FISCAL_METRICS_DROP = [
-    "Total Revenues % Chg.",
-    "Total Revenues %Chg",
-    "Operating Margin",
-    "Interest Expense",
-    "Interest Expense, Total",
-    "Interest And Invest. Income",
-    "Interest And Investment Income",
-    "Interest and Investment Income",
-    "Gross Profit Margin",
-    "Earnings From Continuing Operations",
-    "Net Income to Common Excl. Extra Items",
-    "Net Income to Common Incl Extra Items",
-    "Total Shares Outstanding",
-    "EBT, Excl. Unusual Items",
-    "Basic EPS",
-    "Diluted EPS",
-    "EPS",
-    "EPS Diluted",
-    "Basic Weighted Average Shares Outstanding",
-    "Diluted Weighted Average Shares Outstanding",
-    "EBITDA",
-    "Effective Tax Rate",
-    "Gross Property Plant And Equipment",
-    "Accumulated Depreciation",
-]
-
-# Metrics to combine into other metrics (source -> target)
-FISCAL_METRICS_COMBINE = {
-    "Provision for Bad Debts": "Other Operating Expenses",
-    # Equity investment income into Other Non Operating
-    "(Income) Loss on Equity Invest.": "Other Non Operating Income (Expenses)",
-    "Income (Loss) On Equity Invest.": "Other Non Operating Income (Expenses)",
-    "Income (Loss) on Equity Invest.": "Other Non Operating Income (Expenses)",
-}
+    def get_object(self, queryset=None):
+        # Always read the row fresh: its updated_at is the page cache version. Seed the
+        # slug cache so the page's own AJAX calls don't have to look it up again.
+        slug = self.kwargs["slug"]
+        exchange, _, ticker = slug.partition('-')
+        company = Company.objects.get(exchange=exchange, ticker=ticker)
+        company_slugs.set(slug, company)
+        return company
+
+    def get(self, request, *args, **kwargs):
+        # Anonymous visitors (and crawlers) all see the same page: serve it from the
+        # versioned cache. Notes and follow state are fetched by the page itself.
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        self.object = self.get_object()
+        content = get_cached_page(self.object)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = self.render_to_response(self.get_context_data(object=self.object))
+        response.render()
+        set_cached_page(self.object, response.content)
+        return response
 
-# Metrics that roll up into "Exceptional Items" (expandable)
-EXCEPTIONAL_ITEMS_METRICS = [
-    "Restructuring Charges",
-    "Merger & Related Restructuring Charges",
-    "Total Merger & Related Restructuring Charges",
-    "Impairment of Goodwill",
-    "Impairment of Oil, Gas & Mineral Properties",
-    "Gain (Loss) On Sale Of Assets",
-    "Gain (Loss) on Sale of Assets",
-    "Gain (Loss) on Sale of Assets, Total",
-    "Asset Writedown",
-    "Other Unusual Items",
-    "Legal Settlements",
-    "In Process R&D Expenses",
-    "Gain (Loss) On Sale Of Investments",
-    "Gain (Loss) on Sale of Investments",
-    "Gain (Loss) on Sale of Investments, Total",
-    "Gain (Loss) on Sale of Invest. & Securities",
-    "Gain (Loss) on Sale of Investment, Total",
-]
-
-
-def preprocess_fiscal_bs(items):
-    """
-    Pre-process Fiscal BS items: combine cash metrics into
-    'Cash & Short-Term Investments'. Uses the Total if available,
-    otherwise sums individual components.
-    """
-    CASH_COMPONENTS = {
-        "Cash And Equivalents", "Cash and Cash Equivalents",
-        "Short Term Investments", "Short-Term Investments",
-    }
-    CASH_TOTALS = {
-        "Total Cash And Short Term Investments",
-        "Total Cash and Cash Equivalents",
-    }
-    TARGET = "Cash & Short-Term Investments"
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        company = self.object
+        ctx["page_version"] = company_page_version(company)
+        ctx["page_cache_seconds"] = settings.COMPANY_PAGE_CACHE_SECONDS
+
+        ctx["key_ratios"] = SimpleLazyObject(lambda: key_ratios(company))
+
+        # Tables are resolved lazily so a cached statements fragment skips the store read.
+        if settings.LAZY_STATEMENT_TABS:
+            # Only the default tab is rendered up front; BS/CF load via statement_fragment.
+            ctx["lazy_statements"] = True
+            ctx["IS_table"] = SimpleLazyObject(lambda: get_statement_table(company, "IS"))
+            ctx["BS_table"] = None
+            ctx["CF_table"] = None
+        else:
+            tables = SimpleLazyObject(lambda: get_statement_tables(company))
+            ctx["IS_table"] = SimpleLazyObject(lambda: tables["IS"])
+            ctx["BS_table"] = SimpleLazyObject(lambda: tables["BS"])
+            ctx["CF_table"] = SimpleLazyObject(lambda: tables["CF"])
 
-    has_total = any(m in CASH_TOTALS for m, _, _ in items)
+        # Chart data is fetched by the page from intraday_prices.
 
-    if has_total:
-        result = []
-        for m, d, v in items:
-            if m in CASH_TOTALS:
-                result.append((TARGET, d, v))
-            elif m in CASH_COMPONENTS:
-                continue
-            else:
-                result.append((m, d, v))
-        return result
-
-    # No total: sum individual components
-    cash_values = defaultdict(float)
-    insert_pos = None
-    result = []
-    for m, d, v in items:
-        if m in CASH_COMPONENTS:
-            cash_values[d] += float(v) if v else 0
-            if insert_pos is None:
-                insert_pos = len(result)
-        else:
-            result.append((m, d, v))
-    if cash_values:
-        cash_items = [(TARGET, d, v) for d, v in cash_values.items()]
-        result = result[:insert_pos] + cash_items + result[insert_pos:]
-    return result
+        # Notes are loaded client-side from company_notes so the page itself is user-agnostic.
+        return ctx
 
 
-def transform_fiscal_items(items):
+def _statement_etag(request, slug, statement):
     """
-    Transform Fiscal data metrics for display:
-    - Rename metrics
-    - Drop unwanted metrics
-    - Combine certain metrics
-    - Group exceptional items
-    - Insert PBT before Exceptional Items, then Exceptional Items, then Profit Before Tax
-    Returns (transformed_items, exceptional_breakdown) where:
-    - transformed_items: list of (metric, date, value) tuples
-    - exceptional_breakdown: dict of {date: [(metric, value), ...]} for exceptional items
+    ETag from the stored statements' build time; a primary-key read of the store, never
+    companies_financial once it exists. A missing store is built here, so the first
+    response after a load or rebuild already carries the validator.
     """
-    from collections import defaultdict
-    from decimal import Decimal
-
-    def to_float(v):
-        if v is None:
-            return 0.0
-        if isinstance(v, Decimal):
-            return float(v)
-        return float(v) if v else 0.0
-
-    # First pass: collect values to combine, exceptional items, and PBT values
-    combine_values = defaultdict(float)  # (target_metric, date) -> sum
-    exceptional_by_date = defaultdict(list)  # date -> [(metric, value), ...]
-    exceptional_totals = defaultdict(float)  # date -> total
-    pbt_values = {}  # date -> Profit Before Tax value
-
-    for metric, date, value in items:
-        if metric in FISCAL_METRICS_COMBINE:
-            target = FISCAL_METRICS_COMBINE[metric]
-            combine_values[(target, date)] += to_float(value)
-        elif metric in EXCEPTIONAL_ITEMS_METRICS:
-            if value:
-                exceptional_by_date[date].append((metric, float(value) if value else 0))
-                exceptional_totals[date] += to_float(value)
-        elif metric == "EBT, Incl. Unusual Items":
-            pbt_values[date] = to_float(value)
-
-    # Second pass: transform items (skip Profit Before Tax, we'll add it later)
-    result = []
-    seen = set()
-    has_exceptional = bool(exceptional_totals)
-
-    for metric, date, value in items:
-        # Skip dropped metrics
-        if metric in FISCAL_METRICS_DROP:
-            continue
-
-        # Skip metrics being combined into others
-        if metric in FISCAL_METRICS_COMBINE:
-            continue
-
-        # Skip exceptional items (handled separately)
-        if metric in EXCEPTIONAL_ITEMS_METRICS:
-            continue
-
-        # Skip Profit Before Tax - we'll insert it after Exceptional Items
-        if metric == "EBT, Incl. Unusual Items":
-            continue
-
-        # Rename metric if needed
-        display_metric = FISCAL_METRIC_RENAMES.get(metric, metric)
-
-        # Add combined values if this is a target metric
-        key = (display_metric, date)
-        if key in combine_values:
-            value = to_float(value) + combine_values[key]
-            del combine_values[key]
-
-        # Avoid duplicates
-        if (display_metric, date) in seen:
-            continue
-        seen.add((display_metric, date))
-
-        result.append((display_metric, date, value))
-
-    # Build PBT items to insert before Income Tax Expense
-    pbt_items = []
-    if has_exceptional:
-        # PBT before Exceptional Items = Profit Before Tax - Exceptional Items
-        for date in pbt_values:
-            pbt = pbt_values[date]
-            exc = exceptional_totals.get(date, 0)
-            pbt_items.append(("PBT before Exceptional Items", date, pbt - exc))
-
-        # Exceptional Items
-        for date, total in exceptional_totals.items():
-            pbt_items.append(("Exceptional Items", date, total))
-
-        # Profit Before Tax
-        for date, pbt in pbt_values.items():
-            pbt_items.append(("Profit Before Tax", date, pbt))
-    else:
-        # No exceptional items - just add Profit Before Tax
-        for date, pbt in pbt_values.items():
-            pbt_items.append(("Profit Before Tax", date, pbt))
-
-    # Find position to insert (before Income Tax Expense)
-    insert_pos = len(result)
-    for i, (metric, _, _) in enumerate(result):
-        if metric == "Income Tax Expense":
-            insert_pos = i
-            break
-
-    # Insert PBT items at the right position
-    result = result[:insert_pos] + pbt_items + result[insert_pos:]
-
-    return result, dict(exceptional_by_date)
-
-# Fiscal BS metrics that become blank spacer rows
-FISCAL_BS_SPACER_METRICS = {"Liabilities", "Equity"}
-# Fiscal BS metrics after which to insert a spacer row
-FISCAL_BS_SPACER_AFTER = {
-    "Total Equity", "Total Shareholders' Equity",
-    "Total Common Shareholders' Equity", "Shareholders' Equity",
-}
+    if statement not in Financial.STATEMENT_CHOICES:
+        return None
+    try:
+        company = _get_company_by_slug(slug)
+    except Company.DoesNotExist:
+        return None
+    store = CompanyStatements.objects.filter(company_id=company.pk).values_list("built_at", flat=True)
+    built_at = store.first()
+    if built_at is None:
+        rebuild_statement_tables(company, touch=False)
+        built_at = store.first()
+    return f"{slug}-{statement}-{built_at.timestamp():.6f}"
 
 
-def pivot_fiscal_items(items, exceptional_breakdown=None):
-    """
-    Pivot Fiscal data items with support for expandable exceptional items.
-    """
-    if not items:
-        return {"dates": [], "rows": []}
-
-    dates = sorted({d for _, d, _ in items}, reverse=True)
-    lookup = {(m, d): v for m, d, v in items}
-
-    # Get metrics in order they appear
-    metrics = []
-    seen = set()
-    for m, _, _ in items:
-        if m not in seen:
-            metrics.append(m)
-            seen.add(m)
-
-    rows = []
-    equity_spacer_added = False
-    for m in metrics:
-        # Convert section headers to spacer rows
-        if m in FISCAL_BS_SPACER_METRICS:
-            rows.append({"spacer": True})
-            continue
-
-        values = [lookup.get((m, d)) for d in dates]
-        if any(v is not None for v in values):
-            row = {
-                "metric": m,
-                "values": values,
-                "sum_metric": m in SUM_METRICS,
-                "expandable": False,
-                "breakdown": [],
-            }
-            # Add breakdown for Exceptional Items
-            if m == "Exceptional Items" and exceptional_breakdown:
-                row["expandable"] = True
-                # Get all unique breakdown metrics across all dates
-                breakdown_metrics = {}
-                for d in dates:
-                    if d in exceptional_breakdown:
-                        for bm, bv in exceptional_breakdown[d]:
-                            if bm not in breakdown_metrics:
-                                breakdown_metrics[bm] = {}
-                            breakdown_metrics[bm][d] = bv
-                # Build breakdown rows
-                for bm in breakdown_metrics:
-                    brow = {
-                        "metric": bm,
-                        "values": [breakdown_metrics[bm].get(d) for d in dates],
-                    }
-                    row["breakdown"].append(brow)
-            rows.append(row)
-
-            # Add spacer after total equity (only once)
-            if m in FISCAL_BS_SPACER_AFTER and not equity_spacer_added:
-                rows.append({"spacer": True})
-                equity_spacer_added = True
-
-    dates = [d.strftime("%b %Y") for d in dates]
-    return {"dates": dates, "rows": rows}
-
-
-def pivot_items(items, metrics=None, combine=None, rename=None):
+@condition(etag_func=_statement_etag)
+def statement_json(request, slug, statement):
+    """One financial statement as JSON, as rendered on the company page. Supports If-None-Match."""
+    if statement not in Financial.STATEMENT_CHOICES:
+        return JsonResponse({"error": "Unknown statement"}, status=404)
+
+    try:
+        company = _get_company_by_slug(slug)
+    except Company.DoesNotExist:
+        return JsonResponse({"error": "Company not found"}, status=404)
+
+    table = get_statement_table(company, statement)
+    response = JsonResponse({
+        "ticker": company.ticker,
+        "exchange": company.exchange,
+        "statement": statement,
+        "dates": table["dates"],
+        "rows": table["rows"],
+    })
+    # Let clients keep their copy but revalidate every time (cheap 304 via the ETag).
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
+
+
+@condition(etag_func=_statement_etag)
+def statement_fragment(request, slug, statement):
+    """One statement table as an HTML fragment, for lazily loaded tabs on the company page."""
+    if statement not in Financial.STATEMENT_CHOICES:
+        raise Http404("Unknown statement")
+
+    try:
+        company = _get_company_by_slug(slug)
+    except Company.DoesNotExist:
+        raise Http404("Company not found")
+
+    response = render(request, "companies/statement_table.html", {
+        "table": get_statement_table(company, statement),
+    })
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
+
+
+MAX_COMPARE_COMPANIES = 20
+
+
+def compare_api(request):
     """
-    Pivot financial items into a table format.
-    items: [(metric, date, value), ...]
-    metrics: list of metrics to show in order, or None to show all available.
-             Use None entries for spacer rows.
-    combine: dict mapping display_name -> [db_metric, ...] to sum multiple DB metrics
-    rename: dict mapping display_name -> db_metric for renamed metrics
+    One statement for several companies side by side: ?slugs=LSE-AAA,LSE-BBB&statement=IS.
+    Cached by the companies' data versions, so any write to one of them yields a fresh result.
     """
-    if not items:
-        return {"dates": [], "rows": []}
-
-    combine = combine or {}
-    rename = rename or {}
-
-    dates = sorted({d for _, d, _ in items}, reverse=True)
-    lookup = {(m, d): v for m, d, v in items}
-
-    # If no metrics specified, use all unique metrics from the data
-    if metrics is None:
-        metrics = []
-        seen = set()
-        for m, _, _ in items:
-            if m not in seen:
-                metrics.append(m)
-                seen.add(m)
-
-    rows = []
-    for m in metrics:
-        if m is None:
-            rows.append({"spacer": True})
-            continue
-
-        if m in combine:
-            # Combined metric: sum values from multiple source metrics
-            values = []
-            for d in dates:
-                total = None
-                for source in combine[m]:
-                    v = lookup.get((source, d))
-                    if v is not None:
-                        total = (total or 0) + float(v)
-                values.append(total)
-        elif m in rename:
-            # Renamed metric: look up the DB metric name
-            values = [lookup.get((rename[m], d)) for d in dates]
-        else:
-            values = [lookup.get((m, d)) for d in dates]
+    statement = request.GET.get("statement", "IS")
+    if statement not in Financial.STATEMENT_CHOICES:
+        return JsonResponse({"error": "Unknown statement"}, status=400)
+
+    slugs = list(dict.fromkeys(s.strip() for s in request.GET.get("slugs", "").split(",") if s.strip()))
+    if not slugs:
+        return JsonResponse({"error": "No companies given"}, status=400)
+    if len(slugs) > MAX_COMPARE_COMPANIES:
+        return JsonResponse({"error": f"At most {MAX_COMPARE_COMPANIES} companies"}, status=400)
+
+    # One fresh read for all companies: their updated_at stamps key the cache.
+    pairs = Q()
+    for slug in slugs:
+        exchange, _, ticker = slug.partition('-')
+        pairs |= Q(exchange=exchange, ticker=ticker)
+    by_slug = {f"{c.exchange}-{c.ticker}": c for c in Company.objects.filter(pairs)}
+    unknown = [slug for slug in slugs if slug not in by_slug]
+    if unknown:
+        return JsonResponse({"error": "Company not found", "slugs": unknown}, status=404)
+    companies = [by_slug[slug] for slug in slugs]
+
+    versions = ",".join(f"{c.pk}:{company_page_version(c)}" for c in companies)
+    cache_key = f"compare:{statement}:{hashlib.sha1(versions.encode()).hexdigest()}"
+    payload = cache.get(cache_key)
+    if payload is None:
+        tables = get_statement_table_bulk([c.pk for c in companies], statement)
+        payload = {
+            "statement": statement,
+            "companies": [
+                {"slug": slug, "ticker": c.ticker, "exchange": c.exchange, "name": c.name, "currency": c.currency}
+                for slug, c in zip(slugs, companies)
+            ],
+            **align_statement_tables([tables[c.pk] for c in companies]),
+        }
+        cache.set(cache_key, payload, settings.COMPANY_PAGE_CACHE_SECONDS)
+    return JsonResponse(payload)
 
-        if any(v is not None for v in values):
-            rows.append({
-                "metric": m,
-                "values": values,
-                "sum_metric": m in SUM_METRICS
-            })
 
-    dates = [d.strftime("%b %Y") for d in dates]
-    return {"dates": dates, "rows": rows}
 
+MAX_EXPORT_COMPANIES = 500
+EXPORT_FIELDS = ["slug", "date", "open", "high", "low", "close", "volume"]
 
-class CompanyDetailView(DetailView):
-    model = Company
-    template_name = "companies/company_detail.html"
-    context_object_name = "company"
 
-    def get_object(self, queryset=None):
-        return _get_company_by_slug(self.kwargs["slug"])
+class _Echo:
+    """File-like object whose write() hands back the line, for csv.writer in a streamed response."""
 
-    def get_context_data(self, **kwargs):
-        ctx = super().get_context_data(**kwargs)
+    def write(self, value):
+        return value
 
-        items = list(
-            Financial.objects.filter(company=self.object).values_list("statement", "metric__name", "period_end_date", "value")
-        )
 
-        buckets = defaultdict(list)
-        for st, m, d, v in items:
-            buckets[st].append((m, d, v))
-
-        # Fiscal-only pipeline: transform for display (renames, drops, combines, exceptional items)
-        is_items, is_exceptional = transform_fiscal_items(buckets["IS"])
-        bs_raw = preprocess_fiscal_bs(buckets["BS"])
-        bs_items, _ = transform_fiscal_items(bs_raw)
-        cf_items, _ = transform_fiscal_items(buckets["CF"])
-        ctx["IS_table"] = pivot_fiscal_items(is_items, is_exceptional)
-        ctx["BS_table"] = pivot_fiscal_items(bs_items)
-        ctx["CF_table"] = pivot_fiscal_items(cf_items)
-
-        # Price data for chart — now fetched live via API (see intraday_prices view)
-        # (Previously loaded from StockPrice DB records — kept for reference)
-        # prices = StockPrice.objects.filter(company=self.object).order_by('date')
-        # price_data = [
-        #     {"time": p.date.isoformat(), "open": float(p.open), "high": float(p.high),
-        #      "low": float(p.low), "close": float(p.close)}
-        #     for p in prices
-        # ]
-        # volume_data = [
-        #     {"time": p.date.isoformat(), "value": p.volume,
-        #      "color": "#26a69a" if p.close >= p.open else "#ef5350"}
-        #     for p in prices
-        # ]
-        # ctx["price_data_json"] = json.dumps(price_data)
-        # ctx["volume_data_json"] = json.dumps(volume_data)
-
-        # Notes for logged-in users
-        if self.request.user.is_authenticated:
-            notes = Note.objects.filter(user=self.request.user, company=self.object)
-            ctx["notes"] = notes
-            ctx["note_folders"] = sorted({n.folder for n in notes if n.folder})
-        else:
-            ctx["notes"] = []
-            ctx["note_folders"] = []
+def _export_lines(companies, start, fmt, using):
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+    for company in companies:
+        slug = f"{company.exchange}-{company.ticker}"
+        for day, o, h, l, c, v in iter_prices(company.pk, start=start, using=using):
+            if fmt == "csv":
+                yield writer.writerow((slug, day.isoformat(), o, h, l, c, v))
+            else:
+                yield json.dumps(dict(zip(EXPORT_FIELDS, (slug, day.isoformat(), o, h, l, c, v)))) + "\n"
 
-        return ctx
 
+@login_required
+@read_replica
+def price_export(request):
+    """
+    Daily price history for many companies: ?slugs=LSE-AAA,LSE-BBB[&from=YYYY-MM-DD][&format=csv|ndjson].
+    Streamed company by company, so memory stays flat however many rows are requested.
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in ("csv", "ndjson"):
+        return JsonResponse({"error": "format must be csv or ndjson"}, status=400)
+
+    start = None
+    if request.GET.get("from"):
+        try:
+            start = date.fromisoformat(request.GET["from"])
+        except ValueError:
+            return JsonResponse({"error": "from must be YYYY-MM-DD"}, status=400)
+
+    slugs = list(dict.fromkeys(s.strip() for s in request.GET.get("slugs", "").split(",") if s.strip()))
+    if not slugs:
+        return JsonResponse({"error": "No companies given"}, status=400)
+    if len(slugs) > MAX_EXPORT_COMPANIES:
+        return JsonResponse({"error": f"At most {MAX_EXPORT_COMPANIES} companies"}, status=400)
+
+    pairs = Q()
+    for slug in slugs:
+        exchange, _, ticker = slug.partition('-')
+        pairs |= Q(exchange=exchange, ticker=ticker)
+    by_slug = {f"{c.exchange}-{c.ticker}": c for c in Company.objects.filter(pairs).only("id", "exchange", "ticker")}
+    unknown = [slug for slug in slugs if slug not in by_slug]
+    if unknown:
+        return JsonResponse({"error": "Company not found", "slugs": unknown}, status=404)
+
+    # The body is generated after the view returns, outside read_replica's routing: pin the alias now.
+    lines = _export_lines([by_slug[slug] for slug in slugs], start, fmt, read_alias())
+    if fmt == "csv":
+        response = StreamingHttpResponse(lines, content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="prices.csv"'
+    else:
+        response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+    return response
 
 def _window_start(window):
     now = timezone.now()
@@ -929,6 +677,7 @@ def _window_start(window):
     return None
 
 
+@read_replica
 def discussion_threads(request, slug):
     """List discussion threads for a company."""
     try:
@@ -965,6 +714,7 @@ def discussion_threads(request, slug):
     return JsonResponse({"threads": threads})
 
 
+@read_replica
 def discussion_messages(request, slug):
     """List all discussion messages for a company."""
     try:
@@ -989,6 +739,7 @@ def discussion_messages(request, slug):
     return JsonResponse({"messages": items})
 
 
+@read_replica
 def discussion_thread_messages(request, slug, thread_id):
     """List messages for a single thread."""
     try:
@@ -1246,66 +997,96 @@ def chat_session_delete(request, slug, session_id):
     return JsonResponse({"ok": True})
 
 
-def intraday_prices(request, slug, period):
-    """Fetch prices from yfinance for all chart periods."""
-    try:
-        company = _get_company_by_slug(slug)
-    except Company.DoesNotExist:
-        return JsonResponse({"error": "Company not found"}, status=404)
+# Chart periods answered from stored prices: (calendar days back or None for all,
+# PriceRollup.freq for weekly/monthly bars or None for daily)
+STORED_CHARTS = {
+    "1m": (31, None),
+    "6m": (183, None),
+    "1y": (366, None),
+    "5y": (5 * 366, "W"),
+    "max": (None, "M"),
+}
+# Stored prices older than this (days) are treated as not maintained; yfinance is used instead.
+STORED_PRICES_MAX_AGE = 4
+
+
+def _stored_chart(company, period):
+    """Chart columns from stored daily prices or weekly/monthly rollups if the store is current, else None."""
+    if period not in STORED_CHARTS:
+        return None
+    days, freq = STORED_CHARTS[period]
+    today = timezone.localdate()
+    start = today - timezone.timedelta(days=days) if days else None
+    if freq is None:
+        series = load_prices(company.pk, start=start)
+        latest = series["date"]
+    else:
+        series = load_rollups(company.pk, freq, start=start)
+        if not len(series["date"]):
+            # Rollups not built yet for this company (see rebuild_price_rollups).
+            series = resample(load_prices(company.pk, start=start), ROLLUP_FREQS[freq])
+        latest = series["last_date"]
+    if not len(latest) or latest[-1].item() < today - timezone.timedelta(days=STORED_PRICES_MAX_AGE):
+        return None
+    return series_columns(series)
+
+
+# Map period to yfinance parameters.
+# Intraday periods use Unix timestamps; daily/weekly/monthly use date strings.
+PERIOD_CONFIG = {
+    "1d":  {"period": "1d",   "interval": "5m",  "intraday": True},
+    "5d":  {"period": "5d",   "interval": "15m", "intraday": True},
+    "1m":  {"period": "1mo",  "interval": "1d",  "intraday": False},
+    "6m":  {"period": "6mo",  "interval": "1d",  "intraday": False},
+    "1y":  {"period": "1y",   "interval": "1d",  "intraday": False},
+    "5y":  {"period": "5y",   "interval": "1wk", "intraday": False},
+    "max": {"period": "max",  "interval": "1mo", "intraday": False},
+}
 
-    yf_ticker = yf.Ticker(yfinance_symbol(company.ticker, company.exchange))
-
-    # Map period to yfinance parameters.
-    # Intraday periods use Unix timestamps; daily/weekly/monthly use date strings.
-    period_config = {
-        "1d":  {"period": "1d",   "interval": "5m",  "intraday": True},
-        "5d":  {"period": "5d",   "interval": "15m", "intraday": True},
-        "1m":  {"period": "1mo",  "interval": "1d",  "intraday": False},
-        "6m":  {"period": "6mo",  "interval": "1d",  "intraday": False},
-        "1y":  {"period": "1y",   "interval": "1d",  "intraday": False},
-        "5y":  {"period": "5y",   "interval": "1wk", "intraday": False},
-        "max": {"period": "max",  "interval": "1mo", "intraday": False},
-    }
 
-    if period not in period_config:
-        return JsonResponse({"error": "Invalid period"}, status=400)
+def _yfinance_chart(symbol, period):
+    """Chart columns fetched live from yfinance."""
+    config = PERIOD_CONFIG[period]
+    df = yf.Ticker(symbol).history(period=config["period"], interval=config["interval"])
+    if df.empty:
+        return {"unit": "s" if config["intraday"] else "d", "t": [], "o": [], "h": [], "l": [], "c": [], "v": []}
+    return frame_columns(df, intraday=config["intraday"])
 
-    config = period_config[period]
 
-    try:
-        df = yf_ticker.history(period=config["period"], interval=config["interval"])
+def _chart_response(request, columns):
+    if request.GET.get("format") == "columnar":
+        return JsonResponse(columnar_payload(columns, delta=request.GET.get("delta") == "1"))
+    return JsonResponse(chart_payload(columns))
 
-        if df.empty:
-            return JsonResponse({"price_data": [], "volume_data": []})
 
-        price_data = []
-        volume_data = []
+@gzip_page
+def intraday_prices(request, slug, period):
+    """
+    Chart prices: 1m-1y from stored daily prices and 5y/max from the weekly/monthly
+    rollups when current; intraday periods, or a stale store, from yfinance through
+    the price cache.
 
-        for idx, row in df.iterrows():
-            if config["intraday"]:
-                time_val = int(idx.timestamp())
-            else:
-                # Date string for daily/weekly/monthly (Lightweight Charts accepts "YYYY-MM-DD")
-                time_val = idx.date().isoformat() if hasattr(idx, 'date') else str(idx)[:10]
-
-            price_data.append({
-                "time": time_val,
-                "open": float(row["Open"]),
-                "high": float(row["High"]),
-                "low": float(row["Low"]),
-                "close": float(row["Close"]),
-            })
+    ``?format=columnar`` returns parallel t/o/h/l/c/v arrays instead of point dicts
+    (``&delta=1`` delta-encodes t); see companies.price_frames. Responses are gzipped.
+    """
+    try:
+        company = _get_company_by_slug(slug)
+    except Company.DoesNotExist:
+        return JsonResponse({"error": "Company not found"}, status=404)
 
-            volume_data.append({
-                "time": time_val,
-                "value": int(row["Volume"]),
-                "color": "#26a69a" if row["Close"] >= row["Open"] else "#ef5350"
-            })
+    stored = _stored_chart(company, period)
+    if stored is not None:
+        return _chart_response(request, stored)
 
-        return JsonResponse({"price_data": price_data, "volume_data": volume_data})
+    if period not in PERIOD_CONFIG:
+        return JsonResponse({"error": "Invalid period"}, status=400)
 
+    symbol = yfinance_symbol(company.ticker, company.exchange)
+    try:
+        columns = cached_chart(symbol, company.exchange, period, lambda: _yfinance_chart(symbol, period))
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
+    return _chart_response(request, columns)
 
 
 @login_required
@@ -1349,6 +1130,30 @@ def add_note(request, slug):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+@login_required
+def company_notes(request, slug):
+    """The current user's notes on a company, newest first, for the notes card."""
+    try:
+        company = _get_company_by_slug(slug)
+    except Company.DoesNotExist:
+        return JsonResponse({"error": "Company not found"}, status=404)
+
+    notes = Note.objects.filter(user=request.user, company=company)
+    return JsonResponse({
+        "notes": [
+            {
+                "id": note.id,
+                "title": note.title,
+                "content": note.content,
+                "folder": note.folder,
+                "created_at": note.created_at.strftime("%d/%m/%Y, %I:%M %p"),
+            }
+            for note in notes
+        ],
+        "folders": sorted({n.folder for n in notes if n.folder}),
+    })
+
+
 @login_required
 def notes_home(request):
     note_company_ids = set(NoteCompany.objects.filter(user=request.user).values_list("company_id", flat=True))
@@ -1615,6 +1420,7 @@ def _apply_basic_filters(results, basic_filters):
 
 
 @require_POST
+@read_replica
 def screener_run(request):
     """Execute a screener query with basic filters and/or natural language."""
     try:
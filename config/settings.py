@@ -61,6 +61,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'companies.db_router.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -109,6 +110,27 @@ else:
         }
     }
 
+# Optional read replica for read-only views (see companies.db_router). Locally, two SQLite
+# files work: copy db.sqlite3 to replica.sqlite3 and set REPLICA_DATABASE_URL=sqlite:///replica.sqlite3
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+if REPLICA_DATABASE_URL:
+    if dj_database_url:
+        DATABASES["replica"] = dj_database_url.parse(
+            REPLICA_DATABASE_URL, conn_max_age=600, conn_health_checks=True,
+        )
+    else:
+        DATABASES["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": REPLICA_DATABASE_URL.removeprefix("sqlite:///"),
+        }
+    # Tests read and write a single test database.
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+
+DATABASE_ROUTERS = ["companies.db_router.ReplicaRouter"]
+
+# Seconds a client's reads stay on the primary after one of its requests wrote
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "5"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -152,6 +174,29 @@ CSRF_TRUSTED_ORIGINS = [
     origin.strip() for origin in csrf_trusted_env.split(",") if origin.strip()
 ]
 
+# Company page: render only the income statement up front, fetch BS/CF tabs on demand
+LAZY_STATEMENT_TABS = os.getenv("LAZY_STATEMENT_TABS", "True").lower() in {"1", "true", "yes", "on"}
+
+# Company page cache lifetime (seconds) for anonymous pages and shared fragments; 0 disables.
+# Entries are keyed by the company's data version, so writes invalidate them immediately.
+COMPANY_PAGE_CACHE_SECONDS = int(os.getenv("COMPANY_PAGE_CACHE_SECONDS", "600"))
+
+# Per-process slug -> Company cache used by the company endpoints (entries, seconds)
+COMPANY_SLUG_CACHE_SIZE = int(os.getenv("COMPANY_SLUG_CACHE_SIZE", "2048"))
+COMPANY_SLUG_CACHE_TTL = int(os.getenv("COMPANY_SLUG_CACHE_TTL", "60"))
+
+# Financial statement storage: "rows" (one Financial row per value) or "packed"
+# (one PackedFinancial matrix per company and statement; see companies.financial_store)
+FINANCIAL_STORAGE = os.getenv("FINANCIAL_STORAGE", "rows").lower()
+
+# Daily prices always go to PriceBlock (per company-year arrays). StockPrice rows, which the
+# screener queries in SQL, are kept for the trailing PRICE_ROW_DAYS days; unset keeps all, 0 none.
+PRICE_ROW_DAYS = int(os.environ["PRICE_ROW_DAYS"]) if os.getenv("PRICE_ROW_DAYS") else None
+
+# yfinance chart payloads (companies.price_cache) are served this long past their
+# market-hours freshness while a background refresh runs
+PRICE_CACHE_STALE_SECONDS = int(os.getenv("PRICE_CACHE_STALE_SECONDS", "86400"))
+
 # Authentication
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
@@ -28,6 +28,8 @@ urlpatterns = [
     path('', home, name='home'),
     path('api/search/', search_api, name='search_api'),
     path('api/newsfeed/', company_views.newsfeed_api, name='newsfeed_api'),
+    path('api/compare/', company_views.compare_api, name='compare_api'),
+    path('api/prices/export/', company_views.price_export, name='price_export'),
     path('notes/', company_views.notes_home, name='notes_home'),
     path('notes/add-company/', company_views.notes_add_company, name='notes_add_company'),
     path('notes/<str:slug>/', company_views.notes_company, name='notes_company'),
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark the loaders' write path: Django bulk_create (model instances) vs
+companies.bulk_write.bulk_upsert (COPY + merge on Postgres, executemany on SQLite)
+for Financial and StockPrice rows, against the configured database.
+
+Everything runs inside one transaction that is rolled back, so the database is left untouched.
+
+Usage:
+    python scripts/benchmark_bulk_write.py
+    DATABASE_URL=postgres://... python scripts/benchmark_bulk_write.py --rows 20000 50000 --repeat 3
+"""
+import argparse
+import datetime as dt
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+
+from companies.bulk_write import bulk_upsert  # noqa: E402
+from companies.models import Company, Financial, FinancialMetric, StockPrice  # noqa: E402
+
+
+def financial_rows(rng, company, metrics, n_rows):
+    periods = [dt.date(2025 - i, 12, 31) for i in range(n_rows // (len(metrics) * 3) + 1)]
+    rows = []
+    for d in periods:
+        for st in ("IS", "BS", "CF"):
+            for m in metrics:
+                rows.append((company.pk, d, st, m.pk, rng.randint(-10**9, 10**9)))
+                if len(rows) == n_rows:
+                    return rows
+    return rows
+
+
+def price_rows(rng, company, n_rows):
+    start = dt.date(1990, 1, 1)
+    rows = []
+    for i in range(n_rows):
+        close = round(rng.uniform(1, 500), 4)
+        rows.append((company.pk, start + dt.timedelta(days=i), close, close + 1, close - 1, close, rng.randint(0, 10**7)))
+    return rows
+
+
+def via_bulk_create(model, fields, rows):
+    model.objects.bulk_create([model(**dict(zip(fields, row))) for row in rows], ignore_conflicts=True, batch_size=1000)
+
+
+def via_bulk_upsert(model, fields, rows, unique_fields):
+    bulk_upsert(model, fields, rows, unique_fields=unique_fields)
+
+
+def time_it(fn, model, company, repeat):
+    best = None
+    for _ in range(repeat):
+        model.objects.filter(company=company).delete()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark bulk_create vs bulk_upsert write paths")
+    ap.add_argument("--rows", type=int, nargs="+", default=[5000, 20000])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"Database: {connection.vendor}")
+    print(f"{'table':>12} {'rows':>8} {'bulk_create rows/s':>19} {'bulk_upsert rows/s':>19} {'speedup':>8}")
+
+    with transaction.atomic():
+        company = Company.objects.create(ticker="ZZBENCH", exchange="BENCH", name="Bulk write benchmark")
+        FinancialMetric.objects.bulk_create(
+            [FinancialMetric(name=f"Benchmark Metric {i}") for i in range(60)], ignore_conflicts=True,
+        )
+        metrics = list(FinancialMetric.objects.filter(name__startswith="Benchmark Metric "))
+        fin_fields = ["company_id", "period_end_date", "statement", "metric_id", "value"]
+        price_fields = ["company_id", "date", "open", "high", "low", "close", "volume"]
+
+        for n_rows in args.rows:
+            cases = [
+                ("financial", Financial, fin_fields, financial_rows(rng, company, metrics, n_rows),
+                 ["company", "period_end_date", "statement", "metric"]),
+                ("stockprice", StockPrice, price_fields, price_rows(rng, company, n_rows), ["company", "date"]),
+            ]
+            for name, model, fields, rows, unique in cases:
+                orm = time_it(lambda: via_bulk_create(model, fields, rows), model, company, args.repeat)
+                new = time_it(lambda: via_bulk_upsert(model, fields, rows, unique), model, company, args.repeat)
+                print(f"{name:>12} {len(rows):>8} {len(rows) / orm:>19,.0f} {len(rows) / new:>19,.0f} {orm / new:>7.1f}x")
+
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark price DataFrame conversion: the old iterrows() loops (chart payload in
+intraday_prices, StockPrice instances in update_prices) vs the column-array
+conversion in companies.price_frames, on synthetic yfinance-shaped frames:
+10 years of daily bars and a "max"-period daily history.
+
+No database access; StockPrice instances are built but not saved.
+
+Usage:
+    python scripts/benchmark_price_frames.py
+    python scripts/benchmark_price_frames.py --max-years 60 --repeat 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from companies.models import Company, StockPrice  # noqa: E402
+from companies.price_frames import frame_arrays, frame_payload, price_rows  # noqa: E402
+
+
+def make_frame(rng, years, tz="America/New_York"):
+    """Business-day OHLCV frame ending today, indexed like yfinance history()."""
+    index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=int(years * 252), tz=tz)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(index))))
+    spread = close * rng.uniform(0.001, 0.02, len(index))
+    open_ = close + rng.normal(0, 1, len(index)) * spread
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) + spread,
+            "Low": np.minimum(open_, close) - spread,
+            "Close": close,
+            "Volume": rng.integers(0, 10**7, len(index)),
+        },
+        index=index,
+    )
+
+
+def legacy_payload(df, intraday):
+    """intraday_prices' former row loop."""
+    price_data = []
+    volume_data = []
+    for idx, row in df.iterrows():
+        if intraday:
+            time_val = int(idx.timestamp())
+        else:
+            time_val = idx.date().isoformat() if hasattr(idx, 'date') else str(idx)[:10]
+        price_data.append({
+            "time": time_val,
+            "open": float(row["Open"]),
+            "high": float(row["High"]),
+            "low": float(row["Low"]),
+            "close": float(row["Close"]),
+        })
+        volume_data.append({
+            "time": time_val,
+            "value": int(row["Volume"]),
+            "color": "#26a69a" if row["Close"] >= row["Open"] else "#ef5350"
+        })
+    return {"price_data": price_data, "volume_data": volume_data}
+
+
+def legacy_records(company, df):
+    """update_prices' former row loop."""
+    records = []
+    for idx, row in df.iterrows():
+        price_date = idx.date() if hasattr(idx, 'date') else idx
+        records.append(StockPrice(
+            company=company,
+            date=price_date,
+            open=row['Open'],
+            high=row['High'],
+            low=row['Low'],
+            close=row['Close'],
+            volume=int(row['Volume'])
+        ))
+    return records
+
+
+def array_rows(company, df):
+    return price_rows(company.pk, *frame_arrays(df))
+
+
+def time_it(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark iterrows vs column-array price conversion")
+    ap.add_argument("--max-years", type=float, default=45, help="Length of the max-period frame (default: 45)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    company = Company(pk=1, ticker="ZZBENCH", exchange="BENCH", name="Price frame benchmark")
+    frames = [("10y daily", make_frame(rng, 10)), (f"max daily ({args.max_years:g}y)", make_frame(rng, args.max_years))]
+
+    print(f"{'frame':>22} {'rows':>7} {'conversion':>16} {'iterrows ms':>12} {'arrays ms':>10} {'speedup':>8}")
+    for label, df in frames:
+        for name, old, new in (
+            ("chart payload", lambda: legacy_payload(df, False), lambda: frame_payload(df)),
+            ("intraday payload", lambda: legacy_payload(df, True), lambda: frame_payload(df, intraday=True)),
+            ("price rows", lambda: legacy_records(company, df), lambda: array_rows(company, df)),
+        ):
+            if name != "price rows":
+                assert json.dumps(old()) == json.dumps(new()), f"{name} output differs"
+            before = time_it(old, args.repeat)
+            after = time_it(new, args.repeat)
+            print(f"{label:>22} {len(df):>7} {name:>16} {before * 1000:>12.1f} {after * 1000:>10.1f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
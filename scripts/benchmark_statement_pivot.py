@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark the statement display pipeline: tuple-list reference implementation
+(preprocess_fiscal_bs / transform_fiscal_items / pivot_fiscal_items) vs the
+array engine (build_statement_table) on synthetic companies.
+
+Usage:
+    python scripts/benchmark_statement_pivot.py
+    python scripts/benchmark_statement_pivot.py --companies 50 --periods 20 40 --metrics 150 --repeat 5
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import django
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from companies import statements as S  # noqa: E402
+
+STATEMENTS = ("IS", "BS", "CF")
+
+
+def metric_pool(n_metrics):
+    """Real pipeline metric names (renames, drops, combines, exceptional, cash) padded with generic lines."""
+    names = (
+        list(S.FISCAL_METRIC_RENAMES)
+        + list(S.FISCAL_METRICS_DROP)
+        + list(S.FISCAL_METRICS_COMBINE)
+        + list(S.EXCEPTIONAL_ITEMS_METRICS)
+        + sorted(S.FISCAL_BS_CASH_COMPONENTS)
+        + ["Income Tax Expense", "Other Operating Expenses", "Net Income", "Liabilities", "Equity", "Total Equity"]
+    )
+    names = list(dict.fromkeys(names))
+    names += [f"Line Item {i}" for i in range(max(0, n_metrics - len(names)))]
+    return names
+
+
+def make_company(rng, n_periods, n_metrics):
+    """{statement: [(metric, date, value), ...]} with ~n_metrics raw metrics across the three statements."""
+    dates = [dt.date(2025 - i // 2, 6 if i % 2 else 12, 30 if i % 2 else 31) for i in range(n_periods)]
+    names = metric_pool(n_metrics)
+    rng.shuffle(names)
+    buckets = {st: [] for st in STATEMENTS}
+    for i, name in enumerate(names):
+        st = STATEMENTS[i % 3]
+        for d in dates:
+            if rng.random() < 0.9:
+                buckets[st].append((name, d, rng.randint(-10**9, 10**9)))
+    return buckets
+
+
+def run_reference(buckets):
+    is_items, is_exceptional = S.transform_fiscal_items(buckets["IS"])
+    bs_items, _ = S.transform_fiscal_items(S.preprocess_fiscal_bs(buckets["BS"]))
+    cf_items, _ = S.transform_fiscal_items(buckets["CF"])
+    return {
+        "IS": S.pivot_fiscal_items(is_items, is_exceptional),
+        "BS": S.pivot_fiscal_items(bs_items),
+        "CF": S.pivot_fiscal_items(cf_items),
+    }
+
+
+def run_engine(buckets):
+    return {st: S.build_statement_table(buckets[st], st) for st in STATEMENTS}
+
+
+def time_it(fn, companies, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for buckets in companies:
+            fn(buckets)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(companies)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark tuple-list vs array statement pivot")
+    ap.add_argument("--companies", type=int, default=30)
+    ap.add_argument("--periods", type=int, nargs="+", default=[20, 30, 40])
+    ap.add_argument("--metrics", type=int, default=160, help="Raw metrics per company across IS/BS/CF")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'periods':>8} {'metrics':>8} {'rows':>7} {'reference ms':>13} {'engine ms':>10} {'speedup':>8}")
+    for n_periods in args.periods:
+        companies = [make_company(rng, n_periods, args.metrics) for _ in range(args.companies)]
+        for buckets in companies:
+            if json.dumps(run_reference(buckets)) != json.dumps(run_engine(buckets)):
+                sys.exit(f"Output mismatch at {n_periods} periods")
+
+        n_rows = sum(len(items) for b in companies for items in b.values()) // len(companies)
+        ref = time_it(run_reference, companies, args.repeat)
+        eng = time_it(run_engine, companies, args.repeat)
+        print(f"{n_periods:>8} {args.metrics:>8} {n_rows:>7} {ref * 1000:>13.2f} {eng * 1000:>10.2f} {ref / eng:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -349,7 +349,7 @@ def generate_summaries_for_ticker(ticker, categories=None, overwrite=False, mode
         elif category == "writeups":
             company.writeups = result
 
-        company.save(update_fields=[category])
+        company.save(update_fields=[category, "updated_at"])
         updated[category] = result
         print(f"Saved {category} for {ticker}")
 